@@ -0,0 +1,22 @@
+import asyncio
+import sys
+from datetime import date
+from src.database import async_session
+from src.services.archive import archive_before
+from src.services.query_cache import get_stats_cache
+
+async def archive(before: date):
+    print(f"Archiving closed months before {before} to Parquet...")
+    async with async_session() as db:
+        months = await archive_before(db, before)
+    await get_stats_cache().clear()
+    for month, counts in months.items():
+        print(f"  {month}: {counts}")
+    print(f"Done: {len(months)} months archived.")
+
+if __name__ == "__main__":
+    # python archive_history.py 2025-06-01  — выгрузить в архив и удалить из БД месяцы до даты
+    if len(sys.argv) != 2:
+        print("Usage: python archive_history.py YYYY-MM-DD")
+        sys.exit(1)
+    asyncio.run(archive(date.fromisoformat(sys.argv[1])))
@@ -0,0 +1,178 @@
+"""
+Бенчмарк индексов и секционирования ble_logs на синтетических данных (только PostgreSQL).
+
+Создаёт отдельную таблицу bench_ble_logs (рабочие таблицы не трогаются),
+заполняет её generate_series и снимает EXPLAIN (ANALYZE, BUFFERS) типовых
+запросов трижды: без индексов, с индексами из модели BleLog и (с --partitioned)
+на секционированной по месяцам копии.
+
+Запуск из backend/:
+    python -m benchmarks.ble_logs_indexes --rows 50000000
+    python -m benchmarks.ble_logs_indexes --rows 1000000 --partitioned --json result.json
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date, timedelta
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from src.config import get_settings
+from src.models import BleLog
+from src.services.schema import months_between, next_month
+
+TABLE = "bench_ble_logs"
+START_DAY = date(2025, 1, 1)
+
+# Запросы, повторяющие фильтры /api/stats, /api/employees, пересчёта rollups и перезаписи файла
+QUERIES = {
+    "zone_minutes_by_day": f"""
+        SELECT shift_day, zone_id, count(*) FROM {TABLE}
+        WHERE shift_day BETWEEN :day_from AND :day_to AND zone_id IN (1, 5)
+        GROUP BY shift_day, zone_id
+    """,
+    "employee_history": f"""
+        SELECT shift_day, count(*) FROM {TABLE}
+        WHERE employee_id = :employee_id AND shift_day BETWEEN :day_from AND :day_to
+        GROUP BY shift_day
+    """,
+    "file_rollup_source": f"""
+        SELECT shift_day, employee_id, zone_id, count(*) FROM {TABLE}
+        WHERE processed_file_id = :file_id AND shift_day BETWEEN :day_from AND :day_to
+        GROUP BY shift_day, employee_id, zone_id
+    """,
+    "overwrite_delete": f"DELETE FROM {TABLE} WHERE processed_file_id = :file_id",
+}
+
+
+def _index_ddl(table: str) -> list[str]:
+    """Те же индексы, что объявлены в модели BleLog, но на бенчмарк-таблице"""
+    return [
+        f"CREATE INDEX IF NOT EXISTS {index.name.replace('ble_logs', table)} ON {table} "
+        f"({', '.join(col.name for col in index.columns)})"
+        for index in BleLog.__table__.indexes
+        if index.name != "ix_ble_logs_id"
+    ]
+
+
+async def _fill(conn, table: str, rows: int, employees: int, days: int, files: int, partitioned: bool):
+    await conn.execute(text(f"DROP TABLE IF EXISTS {table} CASCADE"))
+    columns = """
+        id BIGINT NOT NULL,
+        employee_id INTEGER NOT NULL,
+        processed_file_id INTEGER,
+        shift_day DATE NOT NULL,
+        time_only TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        ble_tag INTEGER NOT NULL,
+        zone_id INTEGER
+    """
+    if partitioned:
+        await conn.execute(text(f"CREATE TABLE {table} ({columns}) PARTITION BY RANGE (shift_day)"))
+        for month in months_between(START_DAY, START_DAY + timedelta(days=days - 1)):
+            await conn.execute(text(
+                f"CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+            ))
+    else:
+        await conn.execute(text(f"CREATE TABLE {table} ({columns})"))
+
+    # Один файл = один объект за ~месяц: строки файла лежат в своём диапазоне дней
+    await conn.execute(text(f"""
+        INSERT INTO {table}
+        SELECT g,
+               1 + (g % CAST(:employees AS bigint)),
+               1 + ((g / CAST(:file_rows AS bigint)) % CAST(:files AS bigint)),
+               DATE '{START_DAY}' + CAST((g / CAST(:day_rows AS bigint)) % CAST(:days AS bigint) AS int),
+               TIMESTAMP '{START_DAY}'
+                   + ((g / CAST(:day_rows AS bigint)) % CAST(:days AS bigint)) * INTERVAL '1 day'
+                   + (g % 1440) * INTERVAL '1 minute',
+               1000 + (g % 500),
+               g % 14
+        FROM generate_series(0, CAST(:rows AS bigint) - 1) AS g
+    """), {
+        "rows": rows,
+        "employees": employees,
+        "files": files,
+        "days": days,
+        "day_rows": max(rows // days, 1),
+        "file_rows": max(rows // files, 1),
+    })
+    await conn.execute(text(f"ANALYZE {table}"))
+
+
+async def _explain(conn, params: dict) -> dict:
+    plans = {}
+    for name, sql in QUERIES.items():
+        # DELETE выполняется внутри savepoint и откатывается
+        savepoint = await conn.begin_nested()
+        started = time.perf_counter()
+        result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params)
+        elapsed = time.perf_counter() - started
+        plan = [row[0] for row in result]
+        await savepoint.rollback()
+        plans[name] = {"seconds": round(elapsed, 4), "plan": plan}
+        print(f"  {name}: {elapsed:.3f}s")
+    return plans
+
+
+async def run(args) -> dict:
+    engine = create_async_engine(args.database_url or get_settings().database_url)
+    params = {
+        "day_from": START_DAY + timedelta(days=args.days // 2),
+        "day_to": START_DAY + timedelta(days=args.days // 2 + 6),
+        "employee_id": 42,
+        "file_id": args.files // 2,
+    }
+    report = {"rows": args.rows, "params": {k: str(v) for k, v in params.items()}, "runs": {}}
+
+    variants = [("heap", False)] + ([("partitioned", True)] if args.partitioned else [])
+    for label, partitioned in variants:
+        async with engine.begin() as conn:
+            print(f"[{label}] заполнение {args.rows} строк...")
+            started = time.perf_counter()
+            await _fill(conn, TABLE, args.rows, args.employees, args.days, args.files, partitioned)
+            report["runs"][f"{label}_fill_seconds"] = round(time.perf_counter() - started, 2)
+
+            if not partitioned:
+                print(f"[{label}] без индексов")
+                report["runs"][f"{label}_no_indexes"] = await _explain(conn, params)
+
+            for ddl in _index_ddl(TABLE):
+                await conn.execute(text(ddl))
+            await conn.execute(text(f"ANALYZE {TABLE}"))
+            print(f"[{label}] с индексами")
+            report["runs"][f"{label}_indexed"] = await _explain(conn, params)
+
+            if not args.keep:
+                await conn.execute(text(f"DROP TABLE {TABLE} CASCADE"))
+
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000_000)
+    parser.add_argument("--employees", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--files", type=int, default=120)
+    parser.add_argument("--partitioned", action="store_true", help="Дополнительно прогнать секционированный вариант")
+    parser.add_argument("--keep", action="store_true", help="Не удалять таблицу после прогона")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--json", default=None, help="Сохранить планы и тайминги в файл")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        for run_name, plans in report["runs"].items():
+            if isinstance(plans, dict):
+                for query, result in plans.items():
+                    print(f"\n=== {run_name} / {query} ({result['seconds']}s)")
+                    print("\n".join(result["plan"]))
+
+
+if __name__ == "__main__":
+    main()
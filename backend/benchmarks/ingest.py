@@ -0,0 +1,126 @@
+"""
+Сквозной бенчмарк загрузки отчётов: синтетический xlsx -> ReportParser.parse_and_save.
+
+Для каждого типа отчёта печатает (и сохраняет с --json) строки/сек, пиковый
+RSS процесса и время по стадиям ReportParser.timings:
+read, normalize, resolve, insert, rollups, commit.
+
+По умолчанию пишет во временную SQLite-базу; для PostgreSQL передайте
+--database-url отдельной (не рабочей!) базы — с --reset её таблицы пересоздаются.
+
+Пример:
+    python -m benchmarks.ingest --employees 200 --days 7 --json ingest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from src.database import Base
+from src.services.report_parser import ReportParser
+from benchmarks.synthetic_reports import GENERATORS, SyntheticConfig, generate_report
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def run(args) -> dict:
+    database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'ingest.db')}"
+    engine = create_async_engine(database_url)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        if args.reset:
+            await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    cfg = SyntheticConfig(
+        employees=args.employees, days=args.days, night_share=args.night_share,
+        zones=args.zones, seed=args.seed,
+    )
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "params": {
+            "employees": cfg.employees, "days": cfg.days, "night_share": cfg.night_share,
+            "zones": cfg.zones, "seed": cfg.seed, "chunk_size": args.chunk_size,
+        },
+        "reports": [],
+    }
+
+    for report_type in args.reports.split(","):
+        filename, content = generate_report(report_type, cfg)
+        async with session_factory() as db:
+            parser = ReportParser(db)
+            started = time.perf_counter()
+            result = await parser.parse_and_save(
+                content, filename, report_type=report_type, sync_refs=False, chunk_size=args.chunk_size,
+            )
+            elapsed = time.perf_counter() - started
+
+        rows = result["records_count"]
+        entry = {
+            "report_type": report_type,
+            "file_mb": round(len(content) / (1024 * 1024), 2),
+            "rows": rows,
+            "rejected": result.get("rejected", {}).get("total", 0),
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(rows / elapsed) if elapsed else None,
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": result.get("timings", {}),
+        }
+        report["reports"].append(entry)
+        print(
+            f"{report_type}: {rows} строк за {entry['seconds']}s ({entry['rows_per_sec']} строк/с), "
+            f"RSS {entry['peak_rss_mb']} MB, стадии {entry['stages']}",
+            file=sys.stderr,
+        )
+
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--night-share", type=float, default=0.3)
+    parser.add_argument("--zones", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reports", default=",".join(GENERATORS))
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--database-url", default=None, help="По умолчанию — временная SQLite")
+    parser.add_argument("--reset", action="store_true", help="Пересоздать таблицы перед прогоном")
+    parser.add_argument("--json", default=None, help="Файл для результата (иначе JSON в stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Генератор синтетических отчётов 8/10/11 в формате выгрузки WorkWatch.
+
+Книга из двух листов (данные — на втором, как в реальных отчётах),
+русские заголовки, которые распознаёт report_schema.
+Поддерживаются ночные смены (переход через полночь), несколько зон
+и сотрудников. Генерация детерминирована при фиксированном seed.
+
+Пример:
+    python -m benchmarks.synthetic_reports --employees 200 --days 7 --out /tmp/reports
+"""
+import argparse
+import io
+import os
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterator
+from openpyxl import Workbook
+
+REPORT8_HEADERS = [
+    "ТН", "ФИО", "date", "date_begin", "date_end",
+    "full_go", "full_idle", "full_work",
+    "full_go_seconds", "full_idle_seconds", "full_work_seconds",
+]
+REPORT10_HEADERS = ["ТН", "ФИО", "Начало простоя", "Конец простоя", "Длительность", "chosen_ble_tag_number"]
+REPORT11_HEADERS = ["ТН", "ФИО", "День смены", "Время на объекте", "Metka", "Zona"]
+
+# Доли времени смены по зонам (id из справочника зон)
+ZONE_WEIGHTS = {1: 60, 2: 8, 4: 5, 5: 12, 7: 3, 10: 2, 0: 10}
+
+
+@dataclass
+class SyntheticConfig:
+    employees: int = 100
+    days: int = 7
+    start_day: date = date(2025, 1, 6)
+    shift_hours: int = 12
+    night_share: float = 0.3  # Доля сотрудников в ночную смену (20:00 -> 08:00)
+    zones: int = len(ZONE_WEIGHTS)
+    downtimes_per_shift: int = 3
+    object_name: str = "BENCH_OBJECT"
+    seed: int = 42
+    first_tn: int = 100000
+
+    def shifts(self) -> Iterator[tuple[int, str, date, datetime, datetime]]:
+        """(tn, ФИО, день смены, начало, конец) для каждого сотрудника и дня"""
+        night_count = int(self.employees * self.night_share)
+        for day_offset in range(self.days):
+            day = self.start_day + timedelta(days=day_offset)
+            for i in range(self.employees):
+                start_hour = 20 if i < night_count else 8
+                begin = datetime.combine(day, datetime.min.time()) + timedelta(hours=start_hour)
+                yield self.first_tn + i, f"Сотрудник {i:05d}", day, begin, begin + timedelta(hours=self.shift_hours)
+
+
+def _workbook(headers: list[str], rows) -> bytes:
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet("Сводка")
+    summary.append(["Синтетический отчёт"])
+    data = wb.create_sheet("Данные")
+    data.append(headers)
+    for row in rows:
+        data.append(row)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def _zones(cfg: SyntheticConfig) -> tuple[list[int], list[int]]:
+    items = list(ZONE_WEIGHTS.items())[:cfg.zones]
+    return [z for z, _ in items], [w for _, w in items]
+
+
+def report8_rows(cfg: SyntheticConfig) -> Iterator[list]:
+    rnd = random.Random(cfg.seed)
+    for tn, name, day, begin, end in cfg.shifts():
+        work, idle = rnd.uniform(50, 80), rnd.uniform(5, 25)
+        go = max(100 - work - idle, 0)
+        total = cfg.shift_hours * 3600
+        yield [
+            tn, name, day.strftime("%d.%m.%Y"), begin, end,
+            round(go, 2), round(idle, 2), round(work, 2),
+            int(total * go / 100), int(total * idle / 100), int(total * work / 100),
+        ]
+
+
+def report10_rows(cfg: SyntheticConfig) -> Iterator[list]:
+    rnd = random.Random(cfg.seed + 10)
+    for tn, name, _, begin, _ in cfg.shifts():
+        for _ in range(cfg.downtimes_per_shift):
+            start = begin + timedelta(minutes=rnd.randrange(0, cfg.shift_hours * 60 - 60))
+            duration = rnd.randint(5, 45)
+            yield [tn, name, start, start + timedelta(minutes=duration), duration, rnd.randint(1000, 1500)]
+
+
+def report11_rows(cfg: SyntheticConfig) -> Iterator[list]:
+    """Одна строка на минуту смены; зона и ближайшая метка меняются блоками по 5-30 минут"""
+    rnd = random.Random(cfg.seed + 11)
+    zone_ids, weights = _zones(cfg)
+    for tn, name, day, begin, end in cfg.shifts():
+        minute, zone, tag, left = begin, 1, 0, 0
+        while minute < end:
+            if left == 0:
+                zone, left = rnd.choices(zone_ids, weights)[0], rnd.randint(5, 30)
+                tag = 1000 + zone * 10 + rnd.randint(0, 9) if zone else 0
+            yield [tn, name, day.strftime("%d.%m.%Y"), minute, tag, zone]
+            minute += timedelta(minutes=1)
+            left -= 1
+
+
+GENERATORS = {
+    "report8": (REPORT8_HEADERS, report8_rows, "8_отчет по сменам"),
+    "report10": (REPORT10_HEADERS, report10_rows, "10_отчет по простоям"),
+    "report11": (REPORT11_HEADERS, report11_rows, "11_отчет по АА_BLE со склейкой"),
+}
+
+
+def generate_report(report_type: str, cfg: SyntheticConfig) -> tuple[str, bytes]:
+    """(имя файла, содержимое xlsx) синтетического отчёта"""
+    headers, rows, prefix = GENERATORS[report_type]
+    # Без "_" после цифр: _detect_report_type ищет маркеры вида "8_"
+    filename = f"{prefix}_{cfg.object_name}_{cfg.days}d-{cfg.seed}.xlsx"
+    return filename, _workbook(headers, rows(cfg))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=100)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--night-share", type=float, default=0.3)
+    parser.add_argument("--zones", type=int, default=len(ZONE_WEIGHTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reports", default="report8,report10,report11")
+    parser.add_argument("--out", default=".")
+    args = parser.parse_args()
+
+    cfg = SyntheticConfig(
+        employees=args.employees, days=args.days, night_share=args.night_share,
+        zones=args.zones, seed=args.seed,
+    )
+    os.makedirs(args.out, exist_ok=True)
+    for report_type in args.reports.split(","):
+        filename, content = generate_report(report_type, cfg)
+        with open(os.path.join(args.out, filename), "wb") as f:
+            f.write(content)
+        print(f"{filename}: {len(content) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import asyncio
+import sys
+from datetime import date
+from src.database import engine, async_session
+from src.services.schema import detach_ble_logs_partitions, partition_ble_logs
+
+async def partition():
+    print("Partitioning ble_logs by shift_day (monthly)...")
+    async with engine.begin() as conn:
+        created = await partition_ble_logs(conn)
+    print(f"Done: {created} partitions created. Running API workers pick up the new layout within 5 minutes.")
+
+async def detach(before: date):
+    print(f"Detaching ble_logs partitions before {before}...")
+    async with async_session() as db:
+        names = await detach_ble_logs_partitions(db, before)
+    print(f"Detached: {', '.join(names) or 'nothing'}")
+
+if __name__ == "__main__":
+    # python partition_ble_logs.py                    — перевести ble_logs в секционированную таблицу
+    # python partition_ble_logs.py detach 2025-01-01  — отсоединить секции месяцев до даты
+    if len(sys.argv) == 3 and sys.argv[1] == "detach":
+        asyncio.run(detach(date.fromisoformat(sys.argv[2])))
+    else:
+        asyncio.run(partition())
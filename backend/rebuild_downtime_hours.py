@@ -0,0 +1,14 @@
+import asyncio
+from src.database import async_session
+from src.services.downtime_hours import rebuild_all_downtime_hours
+from src.services.query_cache import get_stats_cache
+
+async def rebuild():
+    print("Splitting downtimes into hourly buckets...")
+    async with async_session() as db:
+        rows = await rebuild_all_downtime_hours(db)
+    await get_stats_cache().clear()
+    print(f"Done: {rows} downtime_hours rows.")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
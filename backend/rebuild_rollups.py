@@ -0,0 +1,12 @@
+import asyncio
+from src.database import async_session
+from src.services.rollups import rebuild_all_rollups
+
+async def rebuild():
+    print("Rebuilding daily rollups...")
+    async with async_session() as db:
+        rows = await rebuild_all_rollups(db)
+    print(f"Done: {rows} rollup rows.")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
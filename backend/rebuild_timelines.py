@@ -0,0 +1,12 @@
+import asyncio
+from src.database import async_session
+from src.services.timeline import rebuild_all_timelines
+
+async def rebuild():
+    print("Rebuilding shift timelines from ble_logs...")
+    async with async_session() as db:
+        intervals = await rebuild_all_timelines(db)
+    print(f"Done: {intervals} timeline intervals.")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -1,38 +1,106 @@
-from fastapi import APIRouter, Depends, Query
+from datetime import date, timedelta
+from typing import Optional
+import pandas as pd
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from src.database import get_db
-from src.models import Employee, Shift, Downtime
+from sqlalchemy import func, or_, select
+from src.database import get_read_db
+from src.models import BleTag, DailyRollup, Employee, ProcessedFile, Shift, Downtime, ROLLUP_NO_ZONE
+from src.services.analytics import average, rollup_totals
+from src.services.pagination import MAX_PAGE_SIZE, escape_like, fetch_page, ndjson_response, page_or_list
+from src.services.query_cache import cached
+from src.services.rollups import METRIC_COLUMNS
+from src.services.timeline import get_shift_timeline
 
 router = APIRouter()
 
+SUMMARY_DAYS = 30
+# Размер страницы, если limit не передан (тогда ответ — прежний массив строк)
+EMPLOYEES_PAGE = 100
+SHIFTS_PAGE = 30
+DOWNTIMES_PAGE = 50
+TOP_DOWNTIME_TAGS = 5
+
+
+async def _employee_id(db: AsyncSession, tn_number: int) -> int:
+    employee_id = (await db.execute(
+        select(Employee.id).where(Employee.tn_number == tn_number)
+    )).scalar_one_or_none()
+    if employee_id is None:
+        raise HTTPException(status_code=404, detail="Сотрудник не найден")
+    return employee_id
+
+
+def _pct(frame: pd.DataFrame, name: str) -> list:
+    """Средний процент смен по строкам frame (None — нет смен), округлённый до 0.1"""
+    return [None if pd.isna(v) else round(float(v), 1) for v in average(frame, f"{name}_sum", f"{name}_count")]
+
+
+def _summary_scope(params: dict):
+    today = date.today()
+    return (
+        params.get("object_name"),
+        params.get("date_from") or today - timedelta(days=SUMMARY_DAYS),
+        params.get("date_to") or today,
+    )
+
+
+def _employee_dict(e) -> dict:
+    return {
+        "id": e.id,
+        "tn_number": e.tn_number,
+        "name": e.name,
+        "department": e.department,
+    }
+
 
 @router.get("/")
 async def list_employees(
-    limit: int = 100,
-    offset: int = 0,
-    db: AsyncSession = Depends(get_db),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = None,
+    department: Optional[str] = None,
+    object_name: Optional[str] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Список сотрудников"""
-    stmt = select(Employee).offset(offset).limit(limit)
-    result = await db.execute(stmt)
-    employees = result.scalars().all()
+    """
+    Справочник сотрудников по алфавиту, страницами по курсору:
+    {"items": [...], "next_cursor": ...}; следующая страница — ?cursor=next_cursor.
+    Без cursor и limit — прежний ответ: массив первых EMPLOYEES_PAGE сотрудников.
+    q — поиск по ФИО, отделу или табельному номеру, department — отдел,
+    object_name — сотрудники с данными на объекте.
+    format=ndjson — поток всех строк после cursor (по строке JSON на сотрудника).
+    """
+    stmt = select(Employee.id, Employee.tn_number, Employee.name, Employee.department)
+    if q:
+        pattern = f"%{escape_like(q.strip())}%"
+        condition = or_(
+            Employee.name.ilike(pattern, escape="\\"), Employee.department.ilike(pattern, escape="\\"),
+        )
+        if q.strip().isdigit():
+            condition = or_(condition, Employee.tn_number == int(q.strip()))
+        stmt = stmt.where(condition)
+    if department:
+        stmt = stmt.where(Employee.department == department)
+    if object_name:
+        stmt = stmt.where(
+            select(DailyRollup.id)
+            .where(DailyRollup.employee_id == Employee.id, DailyRollup.object_name == object_name)
+            .exists()
+        )
 
-    return [
-        {
-            "id": e.id,
-            "tn_number": e.tn_number,
-            "name": e.name,
-            "department": e.department,
-        }
-        for e in employees
-    ]
+    keys = [Employee.name, Employee.id]
+    if format == "ndjson":
+        return ndjson_response(stmt, keys, cursor, MAX_PAGE_SIZE, _employee_dict)
+    page = await fetch_page(db, stmt, keys, cursor, limit or EMPLOYEES_PAGE, _employee_dict)
+    return page_or_list(page, cursor, limit)
 
 
 @router.get("/{tn_number}")
 async def get_employee(
     tn_number: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Информация о сотруднике"""
     stmt = select(Employee).where(Employee.tn_number == tn_number)
@@ -50,59 +118,181 @@ async def get_employee(
     }
 
 
+def _shift_dict(s) -> dict:
+    return {
+        "date": s.date.isoformat(),
+        "date_begin": s.date_begin.isoformat(),
+        "date_end": s.date_end.isoformat(),
+        "full_go_percent": s.full_go_percent,
+        "full_idle_percent": s.full_idle_percent,
+        "full_work_percent": s.full_work_percent,
+    }
+
+
 @router.get("/{tn_number}/shifts")
 async def get_employee_shifts(
     tn_number: int,
-    limit: int = 30,
-    db: AsyncSession = Depends(get_db),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Смены сотрудника"""
-    stmt = (
-        select(Shift)
-        .join(Employee)
-        .where(Employee.tn_number == tn_number)
-        .order_by(Shift.date.desc())
-        .limit(limit)
-    )
-    result = await db.execute(stmt)
-    shifts = result.scalars().all()
+    """Смены сотрудника, от новых к старым, страницами по курсору (без cursor и limit — массив)"""
+    employee_id = await _employee_id(db, tn_number)
+    stmt = select(
+        Shift.id, Shift.date, Shift.date_begin, Shift.date_end,
+        Shift.full_go_percent, Shift.full_idle_percent, Shift.full_work_percent,
+    ).where(Shift.employee_id == employee_id)
 
-    return [
-        {
-            "date": s.date.isoformat(),
-            "date_begin": s.date_begin.isoformat(),
-            "date_end": s.date_end.isoformat(),
-            "full_go_percent": s.full_go_percent,
-            "full_idle_percent": s.full_idle_percent,
-            "full_work_percent": s.full_work_percent,
-        }
-        for s in shifts
-    ]
+    keys = [Shift.date, Shift.id]
+    if format == "ndjson":
+        return ndjson_response(stmt, keys, cursor, MAX_PAGE_SIZE, _shift_dict, descending=True)
+    page = await fetch_page(db, stmt, keys, cursor, limit or SHIFTS_PAGE, _shift_dict, descending=True)
+    return page_or_list(page, cursor, limit)
+
+
+def _downtime_dict(d) -> dict:
+    return {
+        "dt_start": d.dt_start.isoformat(),
+        "dt_end": d.dt_end.isoformat(),
+        "duration_minutes": d.duration_minutes,
+        "ble_tag_id": d.ble_tag_id,
+    }
 
 
 @router.get("/{tn_number}/downtimes")
 async def get_employee_downtimes(
     tn_number: int,
-    limit: int = 50,
-    db: AsyncSession = Depends(get_db),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Простои сотрудника, от новых к старым, страницами по курсору (без cursor и limit — массив)"""
+    employee_id = await _employee_id(db, tn_number)
+    stmt = select(
+        Downtime.id, Downtime.dt_start, Downtime.dt_end, Downtime.duration_minutes, Downtime.ble_tag_id,
+    ).where(Downtime.employee_id == employee_id)
+
+    keys = [Downtime.dt_start, Downtime.id]
+    if format == "ndjson":
+        return ndjson_response(stmt, keys, cursor, MAX_PAGE_SIZE, _downtime_dict, descending=True)
+    page = await fetch_page(db, stmt, keys, cursor, limit or DOWNTIMES_PAGE, _downtime_dict, descending=True)
+    return page_or_list(page, cursor, limit)
+
+
+@router.get("/{tn_number}/timeline")
+async def get_employee_timeline(
+    tn_number: int,
+    day: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db),
 ):
-    """Простои сотрудника"""
-    stmt = (
-        select(Downtime)
-        .join(Employee)
-        .where(Employee.tn_number == tn_number)
-        .order_by(Downtime.dt_start.desc())
-        .limit(limit)
+    """
+    Таймлайн смены: интервалы по зонам с фактическим временем (ночные смены
+    склеены через полночь), длительностью по правилу 0.51 и проверками
+    (минуты с меткой 0, разрывы данных). day — день смены, по умолчанию последняя.
+    """
+    employee_id = await _employee_id(db, tn_number)
+    timeline = await get_shift_timeline(db, employee_id, day)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail="Нет данных BLE за смену")
+    return {"tn_number": tn_number, **timeline}
+
+
+@router.get("/{tn_number}/summary")
+@cached("employee_summary", scope=_summary_scope)
+async def get_employee_summary(
+    tn_number: int,
+    date_from: date = Query(default=None),
+    date_to: date = Query(default=None),
+    object_name: str = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Сводка для карточки сотрудника за период (по умолчанию 30 дней): KPI,
+    динамика по дням, минуты по зонам и метки с наибольшими простоями.
+    KPI, дни и зоны — один сгруппированный запрос к daily_rollups
+    (включая архив), метки — один запрос к downtimes по индексу сотрудника.
+    """
+    if not date_from:
+        date_from = date.today() - timedelta(days=SUMMARY_DAYS)
+    if not date_to:
+        date_to = date.today()
+    employee_id = await _employee_id(db, tn_number)
+
+    frame = await rollup_totals(
+        db, date_from, date_to, object_name, by=["day", "zone_id"], employee_id=employee_id,
     )
-    result = await db.execute(stmt)
-    downtimes = result.scalars().all()
-
-    return [
-        {
-            "dt_start": d.dt_start.isoformat(),
-            "dt_end": d.dt_end.isoformat(),
-            "duration_minutes": d.duration_minutes,
-            "ble_tag_id": d.ble_tag_id,
-        }
-        for d in downtimes
-    ]
+    totals = frame[METRIC_COLUMNS].sum().to_frame().T
+    days = frame.groupby("day", as_index=False)[METRIC_COLUMNS].sum().sort_values("day")
+    zones = frame[frame.zone_id != ROLLUP_NO_ZONE].groupby("zone_id", as_index=False)["log_minutes"].sum()
+
+    tags_stmt = (
+        select(
+            Downtime.ble_tag_id,
+            BleTag.description,
+            func.count(Downtime.id).label("count"),
+            func.sum(Downtime.duration_minutes).label("minutes"),
+        )
+        .outerjoin(BleTag, BleTag.tag_number == Downtime.ble_tag_id)
+        .where(
+            Downtime.employee_id == employee_id,
+            Downtime.dt_start >= date_from,
+            Downtime.dt_start < date_to + timedelta(days=1),
+        )
+        .group_by(Downtime.ble_tag_id, BleTag.description)
+        .order_by(func.sum(Downtime.duration_minutes).desc())
+        .limit(TOP_DOWNTIME_TAGS)
+    )
+    if object_name:
+        tags_stmt = tags_stmt.join(ProcessedFile, Downtime.processed_file_id == ProcessedFile.id).where(
+            ProcessedFile.object_name == object_name
+        )
+    tags = (await db.execute(tags_stmt)).all()
+
+    return {
+        "tn_number": tn_number,
+        "period": {
+            "from": date_from.isoformat(),
+            "to": date_to.isoformat(),
+        },
+        "kpi": {
+            "shifts": int(totals.shifts_count.iloc[0]),
+            "work_percent": _pct(totals, "work_pct")[0],
+            "idle_percent": _pct(totals, "idle_pct")[0],
+            "go_percent": _pct(totals, "go_pct")[0],
+            "work_seconds": int(totals.work_seconds.iloc[0]),
+            "idle_seconds": int(totals.idle_seconds.iloc[0]),
+            "go_seconds": int(totals.go_seconds.iloc[0]),
+            "downtime_count": int(totals.downtime_count.iloc[0]),
+            "downtime_minutes": int(totals.downtime_minutes.iloc[0]),
+            "log_minutes": int(totals.log_minutes.iloc[0]),
+        },
+        "daily": [
+            {
+                "date": day.isoformat(),
+                "work_percent": work,
+                "idle_percent": idle,
+                "go_percent": go,
+                "downtime_minutes": int(downtime),
+                "log_minutes": int(minutes),
+            }
+            for day, work, idle, go, downtime, minutes in zip(
+                days.day, _pct(days, "work_pct"), _pct(days, "idle_pct"), _pct(days, "go_pct"),
+                days.downtime_minutes, days.log_minutes,
+            )
+        ],
+        "zones": [
+            {"zone_id": int(zone_id), "minutes": int(minutes)}
+            for zone_id, minutes in zip(zones.zone_id, zones.log_minutes)
+        ],
+        "downtime_tags": [
+            {
+                "ble_tag_id": row.ble_tag_id,
+                "description": row.description,
+                "count": row.count,
+                "minutes": int(row.minutes or 0),
+            }
+            for row in tags
+        ],
+    }
@@ -0,0 +1,32 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db
+from src.models import IngestJob
+from src.services.jobs import job_to_dict
+
+router = APIRouter()
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Статус и прогресс фоновой задачи: stage, rows_processed, result / error"""
+    job = await db.get(IngestJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job_to_dict(job)
+
+
+@router.get("")
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_db),
+):
+    """Последние задачи (фильтр по статусу: queued, running, succeeded, failed)"""
+    stmt = select(IngestJob).order_by(IngestJob.id.desc()).limit(limit)
+    if status:
+        stmt = stmt.where(IngestJob.status == status)
+    jobs = (await db.execute(stmt)).scalars().all()
+    return [job_to_dict(job) for job in jobs]
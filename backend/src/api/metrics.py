@@ -0,0 +1,54 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from src.core.metrics import REGISTRY, gauge
+from src.database import ENGINES
+from src.services.employee_resolver import get_employee_resolver
+from src.services.query_cache import get_stats_cache
+
+router = APIRouter()
+
+STATS_CACHE = gauge("workwatch_stats_cache", "Счётчики кеша /api/stats на момент опроса", ("counter",))
+
+
+def _collect_stats_cache():
+    stats = get_stats_cache().stats()
+    for name in ("hits", "misses", "invalidated", "stale_skips", "entries", "evictions"):
+        if name in stats:
+            STATS_CACHE.set(stats[name], counter=name)
+
+
+EMPLOYEE_CACHE = gauge("workwatch_employee_cache", "Счётчики кеша сотрудников загрузки на момент опроса", ("counter",))
+
+
+def _collect_employee_cache():
+    for name, value in get_employee_resolver().stats().items():
+        EMPLOYEE_CACHE.set(value, counter=name)
+
+
+DB_POOL = gauge(
+    "workwatch_db_pool_connections",
+    "Соединения пулов БД: in_use — выдано, idle — свободно, overflow — сверх pool_size, capacity — максимум",
+    ("pool", "state"),
+)
+
+
+def _collect_db_pools():
+    for name, pool_engine in ENGINES.items():
+        pool = pool_engine.sync_engine.pool
+        if not hasattr(pool, "checkedout"):
+            continue  # NullPool/StaticPool (SQLite) без счётчиков
+        DB_POOL.set(pool.checkedout(), pool=name, state="in_use")
+        DB_POOL.set(pool.checkedin(), pool=name, state="idle")
+        DB_POOL.set(max(pool.overflow(), 0), pool=name, state="overflow")
+        DB_POOL.set(pool.size() + getattr(pool, "_max_overflow", 0), pool=name, state="capacity")
+
+
+REGISTRY.register_collector(_collect_stats_cache)
+REGISTRY.register_collector(_collect_employee_cache)
+REGISTRY.register_collector(_collect_db_pools)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import get_db
-from src.services.report_parser import ReportParser
+from src.services.jobs import enqueue_upload, notify_job_runner
 
 router = APIRouter()
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def upload_report(
     file: UploadFile = File(...),
     report_type: str = "auto",
@@ -15,23 +15,22 @@ async def upload_report(
     """
     Загрузка отчёта вручную.
     report_type: auto, report8, report10, report11
+
+    Файл ставится в очередь ingest_jobs, ответ возвращается сразу;
+    прогресс и результат — GET /api/jobs/{job_id}.
     """
     if not file.filename.endswith((".xlsx", ".xls")):
         raise HTTPException(status_code=400, detail="Только Excel файлы (.xlsx, .xls)")
 
     content = await file.read()
-    parser = ReportParser(db)
-
-    try:
-        result = await parser.parse_and_save(content, file.filename, report_type)
-        return {
-            "success": True,
-            "filename": file.filename,
-            "report_type": result["report_type"],
-            "records_inserted": result["records_count"],
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    job = await enqueue_upload(db, content, file.filename, report_type)
+    notify_job_runner()
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "filename": file.filename,
+    }
 
 
 @router.get("/processed")
@@ -1,19 +1,31 @@
+from types import SimpleNamespace
+from typing import Optional
+import pandas as pd
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from datetime import date, timedelta
-from src.database import get_db
-from src.models import Employee, Shift, Downtime, BleLog, ProcessedFile
+from src.database import get_read_db
+from src.models import BleTag, DowntimeHour, Employee, ProcessedFile, Zone, ZoneTransition
+from src.services.analytics import average, rollup_totals
+from src.services.query_cache import cached, get_stats_cache
+from src.services.rollups import METRIC_COLUMNS
 
 router = APIRouter()
 
 
+def _value(value) -> Optional[float]:
+    """numpy-значение -> float для JSON; NaN (нет данных) -> None"""
+    return None if pd.isna(value) else float(value)
+
+
 @router.get("/overview")
+@cached("overview")
 async def get_overview_stats(
     date_from: date = Query(default=None),
     date_to: date = Query(default=None),
     object_name: str = Query(default=None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Общая статистика"""
     if not date_from:
@@ -24,26 +36,7 @@ async def get_overview_stats(
     employees_count = await db.execute(select(func.count(Employee.id)))
     total_employees = employees_count.scalar()
 
-    shifts_query = select(func.count(Shift.id)).join(ProcessedFile, Shift.processed_file_id == ProcessedFile.id).where(
-        Shift.date.between(date_from, date_to)
-    )
-    if object_name:
-        shifts_query = shifts_query.where(ProcessedFile.object_name == object_name)
-    
-    shifts_count = await db.execute(shifts_query)
-    total_shifts = shifts_count.scalar()
-
-    downtimes_query = select(
-        func.count(Downtime.id),
-        func.sum(Downtime.duration_minutes),
-    ).join(ProcessedFile, Downtime.processed_file_id == ProcessedFile.id).where(
-        func.date(Downtime.dt_start).between(date_from, date_to)
-    )
-    if object_name:
-        downtimes_query = downtimes_query.where(ProcessedFile.object_name == object_name)
-
-    downtime_result = await db.execute(downtimes_query)
-    downtime_row = downtime_result.one()
+    totals = (await rollup_totals(db, date_from, date_to, object_name)).iloc[0]
 
     return {
         "period": {
@@ -51,18 +44,19 @@ async def get_overview_stats(
             "to": date_to.isoformat(),
         },
         "total_employees": total_employees,
-        "total_shifts": total_shifts,
-        "total_downtimes": downtime_row[0] or 0,
-        "total_downtime_minutes": downtime_row[1] or 0,
+        "total_shifts": int(totals.shifts_count),
+        "total_downtimes": int(totals.downtime_count),
+        "total_downtime_minutes": int(totals.downtime_minutes),
     }
 
 
 @router.get("/activity")
+@cached("activity")
 async def get_activity_stats(
     date_from: date = Query(default=None),
     date_to: date = Query(default=None),
     object_name: str = Query(default=None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Статистика активности"""
     if not date_from:
@@ -70,48 +64,27 @@ async def get_activity_stats(
     if not date_to:
         date_to = date.today()
 
-    # Base Shift Aggregates
-    stmt_shifts = select(
-        func.count(Shift.id).label("total_shifts"),
-        func.avg(Shift.full_work_percent).label("avg_work_pct"),
-        func.avg(Shift.full_idle_percent).label("avg_idle_pct"),
-        func.avg(Shift.full_go_percent).label("avg_go_pct"),
-        func.sum(Shift.full_work_seconds).label("sum_work_sec"),
-        func.sum(Shift.full_idle_seconds).label("sum_idle_sec"),
-        func.sum(Shift.full_go_seconds).label("sum_go_sec"),
-    ).join(ProcessedFile, Shift.processed_file_id == ProcessedFile.id).where(Shift.date.between(date_from, date_to))
-
-    if object_name:
-        stmt_shifts = stmt_shifts.where(ProcessedFile.object_name == object_name)
+    # Shift aggregates + log minutes (1 row = 1 minute) in Work Zone (id=1) and Rest Zone (id=5)
+    by_zone = await rollup_totals(db, date_from, date_to, object_name, by=["zone_id"])
+    totals = by_zone[METRIC_COLUMNS].sum().to_frame().T
+    row_shifts = SimpleNamespace(
+        total_shifts=int(totals.shifts_count.iloc[0]),
+        avg_work_pct=_value(average(totals, "work_pct_sum", "work_pct_count").iloc[0]),
+        avg_idle_pct=_value(average(totals, "idle_pct_sum", "idle_pct_count").iloc[0]),
+        avg_go_pct=_value(average(totals, "go_pct_sum", "go_pct_count").iloc[0]),
+        sum_work_sec=int(totals.work_seconds.iloc[0]),
+        sum_idle_sec=int(totals.idle_seconds.iloc[0]),
+        sum_go_sec=int(totals.go_seconds.iloc[0]),
+        work_logs=int(by_zone.loc[by_zone.zone_id == 1, "log_minutes"].sum()),
+        rest_logs=int(by_zone.loc[by_zone.zone_id == 5, "log_minutes"].sum()),
+    )
 
-    result_shifts = await db.execute(stmt_shifts)
-    row_shifts = result_shifts.one()
-    
     total_shifts = row_shifts.total_shifts or 1
     if total_shifts == 0:
         total_shifts = 1
 
-    # Raw Log Counts (1 row = 1 minute)
-    # Work Zone (id=1)
-    # Work Zone (id=1)
-    stmt_work_logs = select(func.count(BleLog.id)).join(ProcessedFile, BleLog.processed_file_id == ProcessedFile.id).where(
-        BleLog.shift_day.between(date_from, date_to),
-        BleLog.zone_id == 1
-    )
-    if object_name:
-        stmt_work_logs = stmt_work_logs.where(ProcessedFile.object_name == object_name)
-    
-    work_logs_count = (await db.execute(stmt_work_logs)).scalar() or 0
-
-    # Rest Zone (id=5)
-    stmt_rest_logs = select(func.count(BleLog.id)).join(ProcessedFile, BleLog.processed_file_id == ProcessedFile.id).where(
-        BleLog.shift_day.between(date_from, date_to),
-        BleLog.zone_id == 5
-    )
-    if object_name:
-        stmt_rest_logs = stmt_rest_logs.where(ProcessedFile.object_name == object_name)
-    
-    rest_logs_count = (await db.execute(stmt_rest_logs)).scalar() or 0
+    work_logs_count = row_shifts.work_logs or 0
+    rest_logs_count = row_shifts.rest_logs or 0
 
     # Calculate Averages (Minutes per Shift)
     avg_work_min_logs = round(work_logs_count / total_shifts)
@@ -161,45 +134,36 @@ async def get_activity_stats(
 
 
 @router.get("/daily")
+@cached("daily", scope=lambda p: (p["object_name"], date.today() - timedelta(days=p["days"]), date.today()))
 async def get_daily_stats(
     days: int = 7,
     object_name: str = Query(default=None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Статистика по дням"""
     date_from = date.today() - timedelta(days=days)
 
-    stmt = (
-        select(
-            Shift.date,
-            func.count(Shift.id).label("shifts_count"),
-            func.avg(Shift.full_work_percent).label("avg_work"),
-            func.avg(Shift.full_idle_percent).label("avg_idle"),
-        )
-        .join(ProcessedFile, Shift.processed_file_id == ProcessedFile.id)
-        .where(Shift.date >= date_from)
-    )
-
-    if object_name:
-        stmt = stmt.where(ProcessedFile.object_name == object_name)
-
-    stmt = stmt.group_by(Shift.date).order_by(Shift.date)
-
-    result = await db.execute(stmt)
-    rows = result.all()
+    by_day = await rollup_totals(db, date_from, date.today(), object_name, by=["day"])
+    by_day = by_day[by_day.shifts_count > 0].sort_values("day")
 
     return [
         {
-            "date": row.date.isoformat(),
-            "shifts_count": row.shifts_count,
-            "avg_work_percent": round(row.avg_work or 0, 2),
-            "avg_idle_percent": round(row.avg_idle or 0, 2),
+            "date": day.isoformat(),
+            "shifts_count": int(shifts_count),
+            "avg_work_percent": round(_value(avg_work) or 0, 2),
+            "avg_idle_percent": round(_value(avg_idle) or 0, 2),
         }
-        for row in rows
+        for day, shifts_count, avg_work, avg_idle in zip(
+            by_day.day,
+            by_day.shifts_count,
+            average(by_day, "work_pct_sum", "work_pct_count"),
+            average(by_day, "idle_pct_sum", "idle_pct_count"),
+        )
     ]
 
 
 @router.get("/top-performers")
+@cached("top-performers")
 async def get_top_performers(
     date_from: date = Query(default=None),
     date_to: date = Query(default=None),
@@ -207,7 +171,7 @@ async def get_top_performers(
     metric: str = Query(default="work", regex="^(work|idle|rest)$"),
     limit: int = Query(default=5),
     object_name: str = Query(default=None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Топ сотрудников по эффективности, простою или отдыху"""
     if not date_from:
@@ -217,40 +181,37 @@ async def get_top_performers(
 
     # Select column based on metric
     if metric == "idle":
-        target_col = func.avg(Shift.full_idle_percent).label("value_pct")
+        sum_col, count_col = "idle_pct_sum", "idle_pct_count"
     elif metric == "rest":
-        target_col = func.avg(Shift.full_go_percent).label("value_pct")
+        sum_col, count_col = "go_pct_sum", "go_pct_count"
     else:
-        target_col = func.avg(Shift.full_work_percent).label("value_pct")
+        sum_col, count_col = "work_pct_sum", "work_pct_count"
 
-    # Calculate average percent per employee
-    stmt = (
-        select(
-            Employee.id,
-            Employee.name,
-            Employee.department,
-            target_col
-        )
-        .join(Shift, Shift.employee_id == Employee.id)
-        .join(ProcessedFile, Shift.processed_file_id == ProcessedFile.id)
-        .where(Shift.date.between(date_from, date_to))
+    # Calculate average percent per employee (только сотрудники, у которых есть смены в периоде)
+    by_employee = await rollup_totals(db, date_from, date_to, object_name, by=["employee_id"])
+    by_employee = by_employee[by_employee.shifts_count > 0].assign(
+        value_pct=lambda f: average(f, sum_col, count_col)
     )
 
-    if object_name:
-        stmt = stmt.where(ProcessedFile.object_name == object_name)
-
-    stmt = stmt.group_by(Employee.id, Employee.name, Employee.department)
-
     # Sort
-    if order == "asc":
-        stmt = stmt.order_by(target_col.asc())
-    else:
-        stmt = stmt.order_by(target_col.desc())
-
-    stmt = stmt.limit(limit)
+    top = by_employee.sort_values("value_pct", ascending=(order == "asc"), na_position="last").head(limit)
 
-    result = await db.execute(stmt)
-    rows = result.all()
+    employees = {
+        e.id: e
+        for e in (await db.execute(
+            select(Employee).where(Employee.id.in_(top.employee_id.tolist()))
+        )).scalars()
+    }
+    rows = [
+        SimpleNamespace(
+            id=int(employee_id),
+            name=employees[employee_id].name,
+            department=employees[employee_id].department,
+            value_pct=_value(value_pct),
+        )
+        for employee_id, value_pct in zip(top.employee_id, top.value_pct)
+        if employee_id in employees
+    ]
 
     return [
         {
@@ -263,3 +224,178 @@ async def get_top_performers(
         }
         for row in rows
     ]
+
+
+def _downtime_hours_select(stmt, date_from: date, date_to: date, object_name: Optional[str]):
+    """Фильтр почасовых простоев по периоду и объекту"""
+    stmt = stmt.where(DowntimeHour.day.between(date_from, date_to))
+    if object_name:
+        stmt = stmt.join(ProcessedFile, DowntimeHour.processed_file_id == ProcessedFile.id).where(
+            ProcessedFile.object_name == object_name
+        )
+    return stmt
+
+
+@router.get("/downtime/heatmap")
+@cached("downtime-heatmap")
+async def get_downtime_heatmap(
+    date_from: date = Query(default=None),
+    date_to: date = Query(default=None),
+    mode: str = Query(default="weekday", pattern="^(weekday|day)$"),
+    limit: int = Query(default=5, ge=1, le=100),
+    object_name: str = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Тепловая карта простоев: минуты по (день недели × час) или (дата × час),
+    худшие сотрудники по минутам простоя и разбивка по меткам.
+    Считается по downtime_hours (простои, уже разложенные по часам).
+    """
+    if not date_from:
+        date_from = date.today() - timedelta(days=7)
+    if not date_to:
+        date_to = date.today()
+
+    seconds = func.sum(DowntimeHour.seconds)
+    cells = (await db.execute(_downtime_hours_select(
+        select(DowntimeHour.day, DowntimeHour.hour, seconds.label("seconds"))
+        .group_by(DowntimeHour.day, DowntimeHour.hour),
+        date_from, date_to, object_name,
+    ))).all()
+    cells = pd.DataFrame(cells, columns=["day", "hour", "seconds"])
+    cells["day"] = pd.to_datetime(cells["day"])
+
+    if mode == "weekday":
+        rows = list(range(7))
+        cells["row"] = cells["day"].dt.weekday
+        labels = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+    else:
+        rows = list(pd.date_range(date_from, date_to, freq="D"))
+        cells["row"] = cells["day"]
+        labels = [day.date().isoformat() for day in rows]
+    matrix = (
+        cells.groupby(["row", "hour"])["seconds"].sum().unstack("hour")
+        .reindex(index=rows, columns=range(24)).fillna(0) / 60
+    ).round(1)
+
+    worst = (await db.execute(_downtime_hours_select(
+        select(Employee.id, Employee.tn_number, Employee.name, Employee.department, seconds.label("seconds"))
+        .join(Employee, DowntimeHour.employee_id == Employee.id)
+        .group_by(Employee.id, Employee.tn_number, Employee.name, Employee.department)
+        .order_by(seconds.desc())
+        .limit(limit),
+        date_from, date_to, object_name,
+    ))).all()
+
+    tags = (await db.execute(_downtime_hours_select(
+        select(DowntimeHour.ble_tag_id, BleTag.description, seconds.label("seconds"))
+        .outerjoin(BleTag, BleTag.tag_number == DowntimeHour.ble_tag_id)
+        .group_by(DowntimeHour.ble_tag_id, BleTag.description)
+        .order_by(seconds.desc()),
+        date_from, date_to, object_name,
+    ))).all()
+
+    return {
+        "mode": mode,
+        "rows": labels,
+        "hours": list(range(24)),
+        "minutes": matrix.values.tolist(),
+        "worst_performers": [
+            {
+                "id": row.id,
+                "tn_number": row.tn_number,
+                "name": row.name,
+                "department": row.department,
+                "downtime_minutes": round(row.seconds / 60, 1),
+            }
+            for row in worst
+        ],
+        "tags": [
+            {
+                "ble_tag_id": row.ble_tag_id,
+                "description": row.description,
+                "downtime_minutes": round(row.seconds / 60, 1),
+            }
+            for row in tags
+        ],
+    }
+
+
+@router.get("/movement")
+@cached("movement")
+async def get_movement_stats(
+    date_from: date = Query(default=None),
+    date_to: date = Query(default=None),
+    limit: int = Query(default=10, ge=1, le=100),
+    object_name: str = Query(default=None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Перемещения за период: матрица переходов между зонами (matrix[from][to]),
+    самые частые маршруты и среднее время пребывания в зоне.
+    Один сгруппированный запрос к zone_transitions.
+    """
+    if not date_from:
+        date_from = date.today() - timedelta(days=7)
+    if not date_to:
+        date_to = date.today()
+
+    stmt = (
+        select(
+            ZoneTransition.from_zone,
+            ZoneTransition.to_zone,
+            func.sum(ZoneTransition.visits).label("visits"),
+            func.sum(ZoneTransition.minutes).label("minutes"),
+            func.count(func.distinct(ZoneTransition.employee_id)).label("employees"),
+        )
+        .where(ZoneTransition.shift_day.between(date_from, date_to))
+        .group_by(ZoneTransition.from_zone, ZoneTransition.to_zone)
+    )
+    if object_name:
+        stmt = stmt.join(ProcessedFile, ZoneTransition.processed_file_id == ProcessedFile.id).where(
+            ProcessedFile.object_name == object_name
+        )
+    moves = pd.DataFrame(
+        (await db.execute(stmt)).all(), columns=["from_zone", "to_zone", "visits", "minutes", "employees"],
+    )
+    names = dict((await db.execute(select(Zone.zone_id, Zone.name))).all())
+
+    routes = moves[moves.to_zone.notna()].astype({"to_zone": "int64"})
+    zones = sorted(set(moves.from_zone) | set(routes.to_zone))
+    matrix = (
+        routes.pivot_table(index="from_zone", columns="to_zone", values="visits", aggfunc="sum")
+        .reindex(index=zones, columns=zones).fillna(0).astype("int64")
+    )
+    top = routes.sort_values("visits", ascending=False).head(limit)
+    dwell = moves.groupby("from_zone")[["visits", "minutes"]].sum()
+
+    return {
+        "zones": [{"zone_id": int(zone_id), "name": names.get(zone_id)} for zone_id in zones],
+        "matrix": matrix.values.tolist(),
+        "top_routes": [
+            {
+                "from_zone": int(row.from_zone),
+                "to_zone": int(row.to_zone),
+                "from_name": names.get(row.from_zone),
+                "to_name": names.get(row.to_zone),
+                "transitions": int(row.visits),
+                "employees": int(row.employees),
+            }
+            for row in top.itertuples()
+        ],
+        "dwell": [
+            {
+                "zone_id": int(zone_id),
+                "name": names.get(zone_id),
+                "visits": int(row.visits),
+                "avg_minutes": round(row.minutes / row.visits, 1),
+            }
+            for zone_id, row in dwell.iterrows()
+        ],
+    }
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """Счётчики кеша статистики (попадания, промахи, сброшенные записи)"""
+    return get_stats_cache().stats()
@@ -1,59 +1,24 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.core import metrics
 from src.database import get_db
-from src.gdrive import DriveService
 from src.services.report_parser import ReportParser
+from src.services.jobs import enqueue_drive_sync, notify_job_runner
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 
 
-@router.post("/drive")
+@router.post("/drive", status_code=202)
 async def sync_from_drive(db: AsyncSession = Depends(get_db)):
     """
     Синхронизация файлов с Google Drive.
     Скачивает все Excel-файлы из указанных папок и загружает в БД.
+    Ставит задачу в очередь (если синхронизация уже идёт — возвращает её);
+    прогресс — GET /api/jobs/{job_id}.
     """
-    drive = DriveService()
-    parser = ReportParser(db)
-    
-    results = []
-    errors = []
-    
-    try:
-        files = drive.list_excel_files()
-    except Exception as e:
-        return {"success": False, "error": f"Ошибка доступа к Google Drive: {str(e)}"}
-    
-    for file_info in files:
-        file_id = file_info["id"]
-        filename = file_info["name"]
-        
-        try:
-            content = drive.download_file(file_id)
-            result = await parser.parse_and_save(content, filename, drive_file_id=file_id, sync_refs=False)
-            results.append({
-                "filename": filename,
-                "report_type": result["report_type"],
-                "records": result["records_count"],
-                "status": result.get("status", "unknown")
-            })
-        except Exception as e:
-            # КРИТИЧНО: rollback чтобы следующий файл мог обработаться
-            await db.rollback()
-            errors.append({"filename": filename, "error": str(e)})
-    
-    # Синхронизация справочников один раз в конце
-    try:
-        await parser.sync_reference_data()
-    except Exception as e:
-        errors.append({"action": "sync_reference_data", "error": str(e)})
-    
-    return {
-        "success": True,
-        "processed": len(results),
-        "files": results,
-        "errors": errors
-    }
+    job = await enqueue_drive_sync(db)
+    notify_job_runner()
+    return {"success": True, "job_id": job.id, "status": job.status}
 
 
 @router.post("/references")
@@ -64,7 +29,8 @@ async def sync_references_only(db: AsyncSession = Depends(get_db)):
     parser = ReportParser(db)
     
     try:
-        await parser.sync_reference_data()
-        return {"success": True, "message": "Справочники синхронизированы"}
+        counts = await parser.sync_reference_data()
+        return {"success": True, "message": "Справочники синхронизированы", "counts": counts}
     except Exception as e:
+        metrics.SYNC_RUNS.inc(kind="references", status="error")
         return {"success": False, "error": str(e)}
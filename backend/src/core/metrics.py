@@ -0,0 +1,239 @@
+"""
+Метрики приложения в текстовом формате Prometheus (без внешних зависимостей).
+
+Counter / Gauge / Histogram с метками хранятся в процессе и отдаются
+эндпоинтом /metrics. Значения, которые дешевле посчитать в момент опроса
+(например, счётчики кеша статистики), подключаются через register_collector.
+"""
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+# Границы бакетов по умолчанию: от 5 мс до 10 минут
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        """Контекстный менеджер: наблюдает длительность блока в секундах"""
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self._header()
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Функция, обновляющая Gauge-значения непосредственно перед отдачей метрик"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Метрики приложения ---
+
+HTTP_REQUESTS = counter(
+    "workwatch_http_requests_total", "HTTP-запросы по маршруту и статусу", ("method", "route", "status")
+)
+HTTP_LATENCY = histogram(
+    "workwatch_http_request_duration_seconds", "Длительность HTTP-запросов", ("method", "route")
+)
+
+DRIVE_DOWNLOAD_BYTES = counter("workwatch_drive_download_bytes_total", "Скачано байт из Google Drive")
+DRIVE_DOWNLOAD_SECONDS = histogram("workwatch_drive_download_seconds", "Длительность скачивания файла из Drive")
+
+INGEST_ROWS = counter(
+    "workwatch_ingest_rows_total",
+    "Строки отчётов: read — прочитано, accepted — загружено, rejected — отклонено",
+    ("report_type", "outcome"),
+)
+INGEST_FILES = counter("workwatch_ingest_files_total", "Обработанные файлы отчётов", ("report_type", "status"))
+INGEST_STAGE_SECONDS = histogram(
+    "workwatch_ingest_stage_seconds", "Время стадии обработки одного файла", ("report_type", "stage")
+)
+
+SYNC_RUNS = counter("workwatch_sync_runs_total", "Запуски синхронизации", ("kind", "status"))
+SYNC_SECONDS = histogram("workwatch_sync_duration_seconds", "Длительность синхронизации", ("kind",))
+SYNC_FILES = counter("workwatch_sync_files_total", "Файлы Drive по результату синхронизации", ("outcome",))
+
+
+def observe_stage_timings(report_type: str, timings: dict):
+    for stage, seconds in timings.items():
+        INGEST_STAGE_SECONDS.observe(seconds, report_type=report_type, stage=stage)
+
+
+# --- HTTP middleware ---
+
+def _route_path(scope) -> Optional[str]:
+    """
+    Шаблон пути маршрута (/api/employees/{tn_number}), чтобы не плодить метки по значениям.
+    Восстанавливается из фактического пути и path_params — так не зависит от того,
+    как версия FastAPI раскладывает вложенные роутеры.
+    """
+    if scope.get("endpoint") is None:
+        return None
+    segments = scope["path"].split("/")
+    for name, value in scope.get("path_params", {}).items():
+        for i in range(len(segments) - 1, -1, -1):
+            if segments[i] == str(value):
+                segments[i] = "{" + name + "}"
+                break
+    return "/".join(segments)
+
+
+class MetricsMiddleware:
+    """ASGI middleware: счётчик и гистограмма латентности HTTP-запросов по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_path(scope) or "unmatched"
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status["code"]))
@@ -1,27 +1,63 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import asyncio
+import time
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
 from src.config import get_settings
 
 
 settings = get_settings()
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    future=True,
-    # Supabase Pooler (pgbouncer) не поддерживает prepared statements
-    connect_args={
-        "statement_cache_size": 0,
-        "prepared_statement_cache_size": 0,
-    },
+
+def _create_engine(url: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    kwargs = {
+        "echo": settings.db_echo,
+        "future": True,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+    }
+    if make_url(url).get_backend_name() != "sqlite":
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+    if make_url(url).get_driver_name() == "asyncpg":
+        # Supabase Pooler (pgbouncer) не поддерживает prepared statements
+        kwargs["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+        }
+    return create_async_engine(url, **kwargs)
+
+
+# Основной пул: загрузка отчётов, синхронизация, фоновые задачи, все записи
+engine = _create_engine(
+    settings.database_url, settings.db_pool_size, settings.db_max_overflow,
 )
 
+# Отдельный пул для read-only эндпоинтов (stats, employees, objects): на реплику,
+# если задан DATABASE_REPLICA_URL, иначе на основную БД. Дашборды и загрузка
+# не отнимают друг у друга соединения.
+read_engine = _create_engine(
+    settings.database_replica_url or settings.database_url,
+    settings.db_read_pool_size,
+    settings.db_read_max_overflow,
+)
+
+# Имя пула -> движок (для метрик заполнения пулов)
+ENGINES = {"primary": engine, "read": read_engine}
+
 async_session = async_sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
 
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -30,3 +66,46 @@ class Base(DeclarativeBase):
 async def get_db() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def get_read_db() -> AsyncSession:
+    """Сессия для эндпоинтов, которые только читают (реплика или отдельный пул основной БД)"""
+    async with read_session() as session:
+        yield session
+
+
+# Интервал опроса реплики при ожидании commit (wait_for_replica)
+REPLICA_POLL_SECONDS = 0.5
+
+
+async def primary_wal_position(session: AsyncSession) -> Optional[str]:
+    """
+    Позиция WAL основной БД после commit сессии — или None, если реплики нет
+    (read-only пул читает основную БД, ждать нечего).
+    """
+    if not settings.database_replica_url or session.bind.dialect.name != "postgresql":
+        return None
+    return (await session.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+
+
+async def wait_for_replica(position: str, timeout: float) -> bool:
+    """
+    Ждёт, пока реплика проиграет WAL до position. False — не дождались за timeout
+    (или реплика не физическая и позицию не сообщает — тогда ждём весь timeout).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        async with read_engine.connect() as conn:
+            replayed = (await conn.execute(
+                text("SELECT pg_last_wal_replay_lsn() >= CAST(CAST(:position AS text) AS pg_lsn)"), {"position": position}
+            )).scalar()
+        if replayed:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(REPLICA_POLL_SECONDS)
+
+
+async def dispose_engines():
+    for pool_engine in ENGINES.values():
+        await pool_engine.dispose()
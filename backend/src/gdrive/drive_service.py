@@ -1,9 +1,11 @@
 import io
+import time
 from typing import Optional
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from src.config import get_settings
+from src.core import metrics
 import pandas as pd
 
 
@@ -20,34 +22,44 @@ class DriveService:
 
     def _get_service(self):
         if self._service is None:
-            settings = get_settings()
-            creds = None
-            
-            # Пробуем загрузить токен (OAuth2 User flow)
-            import os
-            if os.path.exists(settings.google_token_path):
-                from google.oauth2.credentials import Credentials
-                creds = Credentials.from_authorized_user_file(settings.google_token_path, self.SCOPES)
-            
-            # Если токена нет, пробуем Service Account
-            if (not creds or not creds.valid) and os.path.exists(settings.google_credentials_path):
-                creds = service_account.Credentials.from_service_account_file(
-                    settings.google_credentials_path,
-                    scopes=self.SCOPES,
-                )
-            
-            if not creds:
-                raise ValueError("Не найдены ни token.json, ни credentials.json")
-                
-            self._service = build("drive", "v3", credentials=creds)
+            self._service = build("drive", "v3", credentials=self.get_credentials())
         return self._service
 
+    @classmethod
+    def get_credentials(cls):
+        """OAuth2-токен пользователя, а если его нет или он невалиден — Service Account"""
+        settings = get_settings()
+        creds = None
+
+        # Пробуем загрузить токен (OAuth2 User flow)
+        import os
+        if os.path.exists(settings.google_token_path):
+            from google.oauth2.credentials import Credentials
+            creds = Credentials.from_authorized_user_file(settings.google_token_path, cls.SCOPES)
+
+        # Если токена нет, пробуем Service Account
+        if (not creds or not creds.valid) and os.path.exists(settings.google_credentials_path):
+            creds = service_account.Credentials.from_service_account_file(
+                settings.google_credentials_path,
+                scopes=cls.SCOPES,
+            )
+
+        if not creds:
+            raise ValueError("Не найдены ни token.json, ни credentials.json")
+        return creds
+
     def get_folder_ids(self) -> list[str]:
         """Парсит список папок из конфига"""
         if not self.folder_id:
             return []
         return [fid.strip() for fid in self.folder_id.split(",") if fid.strip()]
 
+    EXCEL_MIME_TYPES = (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.ms-excel",
+    )
+    FILE_FIELDS = "id, name, createdTime, modifiedTime, md5Checksum, size, parents"
+
     def list_excel_files(self, folder_ids: Optional[list[str]] = None) -> list:
         """Список Excel-файлов в указанных папках"""
         service = self._get_service()
@@ -62,24 +74,72 @@ class DriveService:
                 "and trashed=false"
             )
 
+            page_token = None
+            while True:
+                results = (
+                    service.files()
+                    .list(
+                        q=query,
+                        fields=f"nextPageToken, files({self.FILE_FIELDS})",
+                        orderBy="modifiedTime desc",
+                        pageSize=1000,
+                        pageToken=page_token,
+                        supportsAllDrives=True,
+                        includeItemsFromAllDrives=True,
+                    )
+                    .execute()
+                )
+                all_files.extend(results.get("files", []))
+                page_token = results.get("nextPageToken")
+                if not page_token:
+                    break
+
+        return all_files
+
+    def get_start_page_token(self) -> str:
+        """Текущая позиция ленты изменений (с неё начнётся следующий list_changes)"""
+        service = self._get_service()
+        return service.changes().getStartPageToken(supportsAllDrives=True).execute()["startPageToken"]
+
+    def list_changes(self, page_token: str, folder_ids: Optional[list[str]] = None) -> tuple[list, str]:
+        """
+        Excel-файлы в наших папках, изменённые после page_token.
+        Возвращает (файлы, новый start page token).
+        """
+        service = self._get_service()
+        target_folders = set(folder_ids or self.get_folder_ids())
+
+        changed = {}
+        while True:
             results = (
-                service.files()
+                service.changes()
                 .list(
-                    q=query,
-                    fields="files(id, name, createdTime, modifiedTime)",
-                    orderBy="modifiedTime desc",
+                    pageToken=page_token,
+                    fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({self.FILE_FIELDS}, mimeType, trashed))",
+                    pageSize=1000,
                     supportsAllDrives=True,
                     includeItemsFromAllDrives=True,
                 )
                 .execute()
             )
-            all_files.extend(results.get("files", []))
-
-        return all_files
+            for change in results.get("changes", []):
+                file = change.get("file")
+                if change.get("removed") or not file or file.get("trashed"):
+                    continue
+                if file.get("mimeType") not in self.EXCEL_MIME_TYPES:
+                    continue
+                if not target_folders & set(file.get("parents", [])):
+                    continue
+                changed[file["id"]] = file
+
+            if "newStartPageToken" in results:
+                return list(changed.values()), results["newStartPageToken"]
+            page_token = results["nextPageToken"]
 
     def download_file(self, file_id: str) -> bytes:
         """Скачать файл по ID"""
         service = self._get_service()
+        started = time.perf_counter()
         request = service.files().get_media(fileId=file_id)
 
         buffer = io.BytesIO()
@@ -90,56 +150,27 @@ class DriveService:
             _, done = downloader.next_chunk()
 
         buffer.seek(0)
-        return buffer.read()
+        content = buffer.read()
+        metrics.DRIVE_DOWNLOAD_BYTES.inc(len(content))
+        metrics.DRIVE_DOWNLOAD_SECONDS.observe(time.perf_counter() - started)
+        return content
 
     def get_file_metadata(self, file_id: str) -> dict:
         """Получить метаданные файла"""
         service = self._get_service()
         return (
             service.files()
-            .get(fileId=file_id, fields="id, name, createdTime, modifiedTime, size")
+            .get(fileId=file_id, fields=self.FILE_FIELDS)
             .execute()
         )
 
     def download_sheet_as_df(self, spreadsheet_id: str, sheet_name: Optional[str] = None) -> pd.DataFrame:
-        """Скачать Google Sheet как Pandas DataFrame"""
+        """
+        Скачать Google Sheet как Pandas DataFrame (лист целиком).
+        Клиент Sheets и результат кешируются по версии таблицы, см. SheetsFetcher.
+        """
         if not spreadsheet_id:
             return pd.DataFrame()
-            
-        settings = get_settings()
-        creds = None
-        import os
-        if os.path.exists(settings.google_token_path):
-            from google.oauth2.credentials import Credentials
-            creds = Credentials.from_authorized_user_file(settings.google_token_path, self.SCOPES)
-        elif os.path.exists(settings.google_credentials_path):
-            creds = service_account.Credentials.from_service_account_file(
-                settings.google_credentials_path,
-                scopes=self.SCOPES,
-            )
-            
-        # Для Sheets передаем scopes в credentials при создании, если нужно
-        # Но обычно Drive Readonly хватает для экспорта
-        service = build("sheets", "v4", credentials=creds)
-        
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=sheet_name or "A1:Z1000"
-        ).execute()
-        
-        values = result.get("values", [])
-        if not values or len(values) < 2:
-            return pd.DataFrame()
-        
-        # Google Sheets может вернуть строки разной длины — выравниваем
-        headers = values[0]
-        num_cols = len(headers)
-        
-        # Дополняем короткие строки пустыми значениями
-        rows = []
-        for row in values[1:]:
-            padded_row = row + [''] * (num_cols - len(row))
-            rows.append(padded_row[:num_cols])  # Обрезаем лишние колонки
-        
-        return pd.DataFrame(rows, columns=headers)
 
+        from src.gdrive.sheets_fetcher import get_sheets_fetcher
+        return get_sheets_fetcher().fetch(spreadsheet_id, sheet_name)
@@ -0,0 +1,139 @@
+"""
+Загрузка справочников из Google Sheets с кешированием.
+
+Клиенты Sheets/Drive создаются один раз на процесс. Результат каждого листа
+кешируется вместе с версией таблицы (Drive files.get: version/modifiedTime):
+пока версия не изменилась, лист не скачивается и не разбирается заново.
+Версия проверяется не чаще раза в sheets_cache_check_seconds, поэтому
+частые вызовы (sync_refs при каждой загрузке) почти ничего не стоят.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+import pandas as pd
+from googleapiclient.discovery import build
+from src.config import get_settings
+from src.gdrive.drive_service import DriveService
+
+logger = logging.getLogger(__name__)
+
+# Строк в одном запросе values.get
+PAGE_ROWS = 10_000
+
+
+@dataclass
+class _CachedSheet:
+    version: str
+    frame: pd.DataFrame
+    checked_at: float
+
+
+class SheetsFetcher:
+    """Постраничное чтение листа целиком + кеш по версии таблицы"""
+
+    def __init__(self, check_interval: Optional[int] = None):
+        self.check_interval = (
+            get_settings().sheets_cache_check_seconds if check_interval is None else check_interval
+        )
+        self._sheets = None
+        self._drive = None
+        self._cache: dict[tuple[str, Optional[str]], _CachedSheet] = {}
+        # httplib2 не потокобезопасен, а fetch вызывается из пула потоков
+        self._lock = threading.Lock()
+
+    def _clients(self):
+        if self._sheets is None:
+            creds = DriveService.get_credentials()
+            self._sheets = build("sheets", "v4", credentials=creds, cache_discovery=False)
+            self._drive = build("drive", "v3", credentials=creds, cache_discovery=False)
+        return self._sheets, self._drive
+
+    def fetch(self, spreadsheet_id: str, sheet_name: Optional[str] = None) -> pd.DataFrame:
+        """Лист sheet_name (по умолчанию первый) как DataFrame; из кеша, если таблица не менялась"""
+        key = (spreadsheet_id, sheet_name)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached.checked_at < self.check_interval:
+                return cached.frame.copy()
+
+            version = self._get_version(spreadsheet_id)
+            if cached and cached.version == version:
+                cached.checked_at = time.monotonic()
+                logger.info(f"Sheet {spreadsheet_id}: версия {version} не изменилась, берём из кеша")
+                return cached.frame.copy()
+
+            frame = self._to_frame(self._read_values(spreadsheet_id, sheet_name))
+            self._cache[key] = _CachedSheet(version=version, frame=frame, checked_at=time.monotonic())
+            logger.info(f"Sheet {spreadsheet_id}: загружено {len(frame)} строк (версия {version})")
+            return frame.copy()
+
+    def invalidate(self, spreadsheet_id: Optional[str] = None):
+        with self._lock:
+            if spreadsheet_id is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == spreadsheet_id]:
+                    del self._cache[key]
+
+    def _get_version(self, spreadsheet_id: str) -> str:
+        _, drive = self._clients()
+        meta = drive.files().get(
+            fileId=spreadsheet_id,
+            fields="version, modifiedTime",
+            supportsAllDrives=True,
+        ).execute()
+        return meta.get("version") or meta.get("modifiedTime", "")
+
+    def _read_values(self, spreadsheet_id: str, sheet_name: Optional[str]) -> list[list]:
+        """Все строки листа, страницами по PAGE_ROWS строк (без ограничения по колонкам)"""
+        sheets, _ = self._clients()
+        meta = sheets.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets.properties(title,gridProperties.rowCount)",
+        ).execute()
+        properties = [s["properties"] for s in meta.get("sheets", [])]
+        if not properties:
+            return []
+        sheet = next((p for p in properties if p["title"] == sheet_name), properties[0])
+        title = sheet["title"].replace("'", "''")
+        row_count = sheet.get("gridProperties", {}).get("rowCount", PAGE_ROWS)
+
+        values = []
+        for start in range(1, row_count + 1, PAGE_ROWS):
+            end = min(start + PAGE_ROWS - 1, row_count)
+            result = sheets.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=f"'{title}'!{start}:{end}",
+            ).execute()
+            page = result.get("values", [])
+            # Хвостовые пустые строки диапазона API не возвращает — дополняем,
+            # чтобы строки следующей страницы не сдвинулись
+            values.extend(page + [[]] * (end - start + 1 - len(page)))
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    @staticmethod
+    def _to_frame(values: list[list]) -> pd.DataFrame:
+        if not values or len(values) < 2:
+            return pd.DataFrame()
+
+        # Google Sheets может вернуть строки разной длины — выравниваем
+        headers = values[0]
+        num_cols = len(headers)
+
+        # Дополняем короткие строки пустыми значениями
+        rows = []
+        for row in values[1:]:
+            padded_row = row + [''] * (num_cols - len(row))
+            rows.append(padded_row[:num_cols])  # Обрезаем лишние колонки
+
+        return pd.DataFrame(rows, columns=headers)
+
+
+@lru_cache
+def get_sheets_fetcher() -> SheetsFetcher:
+    return SheetsFetcher()
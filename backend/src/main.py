@@ -3,9 +3,14 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from src.config import get_settings
-from src.database import engine, Base
-from src.api import health, reports, employees, stats, sync, auth, objects
+from src.database import engine, Base, async_session, dispose_engines
+from src.api import health, metrics, reports, employees, stats, sync, auth, objects, jobs
+from src.core.metrics import MetricsMiddleware
 from src.scheduler import start_scheduler, stop_scheduler
+from src.services.archive import check_archive_packages
+from src.services.jobs import start_job_runner, stop_job_runner
+from src.services.rollups import ensure_rollups
+from src.services.schema import ensure_indexes
 
 # Настройка логирования для отладки
 logging.basicConfig(
@@ -23,10 +28,17 @@ async def lifespan(app: FastAPI):
     # Startup
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await ensure_indexes(engine)
+    async with async_session() as db:
+        await ensure_rollups(db)
+        await check_archive_packages(db)
+    start_job_runner()
     start_scheduler()
     yield
     # Shutdown
     stop_scheduler()
+    await stop_job_runner()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -43,11 +55,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health.router, tags=["Health"])
+app.include_router(metrics.router, tags=["Health"])
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(employees.router, prefix="/api/employees", tags=["Employees"])
 app.include_router(stats.router, prefix="/api/stats", tags=["Statistics"])
 app.include_router(sync.router, prefix="/api", tags=["Sync"])
 app.include_router(objects.router, prefix="/api/objects", tags=["Objects"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
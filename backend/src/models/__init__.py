@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Date, ForeignKey, Text, Boolean
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Float, DateTime, Date, ForeignKey, Text, Boolean,
+    Index, UniqueConstraint, JSON, LargeBinary, text,
+)
 from sqlalchemy.orm import relationship
 from src.database import Base
 
@@ -6,6 +9,10 @@ from src.database import Base
 class Employee(Base):
     """Сотрудники"""
     __tablename__ = "employees"
+    __table_args__ = (
+        # Keyset-пагинация справочника: ORDER BY name, id
+        Index("ix_employees_name_id", "name", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     tn_number = Column(Integer, unique=True, nullable=False, index=True)
@@ -20,6 +27,11 @@ class Employee(Base):
 class Shift(Base):
     """Смены (Report 8)"""
     __tablename__ = "shifts"
+    __table_args__ = (
+        Index("ix_shifts_employee_id_date", "employee_id", "date"),
+        # Удаление строк файла при перезаписи + пересчёт daily_rollups по файлу и дням
+        Index("ix_shifts_processed_file_id_date", "processed_file_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
@@ -42,6 +54,10 @@ class Shift(Base):
 class Downtime(Base):
     """Простои (Report 10)"""
     __tablename__ = "downtimes"
+    __table_args__ = (
+        Index("ix_downtimes_employee_id_dt_start", "employee_id", "dt_start"),
+        Index("ix_downtimes_processed_file_id_dt_start", "processed_file_id", "dt_start"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
@@ -55,9 +71,36 @@ class Downtime(Base):
     processed_file = relationship("ProcessedFile", back_populates="downtimes")
 
 
+class DowntimeHour(Base):
+    """
+    Простои (Report 10), разложенные по часам (см. services/downtime_hours.py):
+    простой через границу часа делится между часами. Источник тепловой карты простоев.
+    """
+    __tablename__ = "downtime_hours"
+    __table_args__ = (
+        Index("ix_downtime_hours_day_hour", "day", "hour"),
+        Index("ix_downtime_hours_processed_file_id", "processed_file_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    processed_file_id = Column(Integer, ForeignKey("processed_files.id", ondelete="CASCADE"), nullable=True)
+    day = Column(Date, nullable=False)  # Календарная дата часа
+    hour = Column(Integer, nullable=False)  # 0-23
+    ble_tag_id = Column(Integer, nullable=True)
+    seconds = Column(Integer, nullable=False)  # Длительность простоя внутри часа
+
+    processed_file = relationship("ProcessedFile", back_populates="downtime_hours")
+
+
 class BleLog(Base):
     """Логи BLE (Report 11)"""
     __tablename__ = "ble_logs"
+    __table_args__ = (
+        Index("ix_ble_logs_shift_day_zone_id", "shift_day", "zone_id"),
+        Index("ix_ble_logs_employee_id_shift_day", "employee_id", "shift_day"),
+        Index("ix_ble_logs_processed_file_id_shift_day", "processed_file_id", "shift_day"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
@@ -71,6 +114,81 @@ class BleLog(Base):
     processed_file = relationship("ProcessedFile", back_populates="ble_logs")
 
 
+class BleInterval(Base):
+    """
+    Логи BLE (Report 11) в сжатом виде (ble_storage = "intervals"): серия подряд идущих
+    минут одного сотрудника с одной меткой и зоной. minutes — число исходных строк.
+    Время хранится как в ble_logs: shift_day + время суток.
+    """
+    __tablename__ = "ble_intervals"
+    __table_args__ = (
+        Index("ix_ble_intervals_shift_day_zone_id", "shift_day", "zone_id"),
+        Index("ix_ble_intervals_employee_id_shift_day", "employee_id", "shift_day"),
+        Index("ix_ble_intervals_processed_file_id_shift_day", "processed_file_id", "shift_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    processed_file_id = Column(Integer, ForeignKey("processed_files.id", ondelete="CASCADE"), nullable=True)
+    shift_day = Column(Date, nullable=False)
+    start_at = Column(DateTime, nullable=False)  # Первая отметка серии
+    end_at = Column(DateTime, nullable=False)  # Последняя отметка серии (включительно)
+    ble_tag = Column(Integer, nullable=False)
+    zone_id = Column(Integer, nullable=True)
+    minutes = Column(Integer, nullable=False)
+
+    processed_file = relationship("ProcessedFile", back_populates="ble_intervals")
+
+
+class TimelineInterval(Base):
+    """
+    Интервалы пребывания в зоне, собранные из минут ble_logs (см. services/timeline.py).
+    Время — фактическое: минуты ночной смены после полуночи лежат на следующей дате.
+    """
+    __tablename__ = "timeline_intervals"
+    __table_args__ = (
+        Index("ix_timeline_intervals_employee_id_shift_day", "employee_id", "shift_day"),
+        Index("ix_timeline_intervals_processed_file_id", "processed_file_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    processed_file_id = Column(Integer, ForeignKey("processed_files.id", ondelete="CASCADE"), nullable=True)
+    shift_day = Column(Date, nullable=False)
+    start_at = Column(DateTime, nullable=False)
+    end_at = Column(DateTime, nullable=False)
+    zone_id = Column(Integer, nullable=False)  # 0 — вне зоны BLE (метка 0)
+    minutes = Column(Integer, nullable=False)  # Длительность с округлением по правилу 0.51
+    samples = Column(Integer, nullable=False)  # Строк ble_logs в интервале
+    gap_before_seconds = Column(Integer, nullable=False, default=0)  # Разрыв данных > 1 минуты перед интервалом
+
+    processed_file = relationship("ProcessedFile", back_populates="timeline_intervals")
+
+
+class ZoneTransition(Base):
+    """
+    Переходы между зонами, собранные из timeline_intervals (см. services/movement.py).
+    Строка — пребывания сотрудника за смену в зоне from_zone, закончившиеся
+    переходом в to_zone (NULL — пребывание до конца смены): их число и минуты.
+    """
+    __tablename__ = "zone_transitions"
+    __table_args__ = (
+        Index("ix_zone_transitions_shift_day", "shift_day"),
+        Index("ix_zone_transitions_processed_file_id", "processed_file_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    processed_file_id = Column(Integer, ForeignKey("processed_files.id", ondelete="CASCADE"), nullable=True)
+    shift_day = Column(Date, nullable=False)
+    from_zone = Column(Integer, nullable=False)
+    to_zone = Column(Integer, nullable=True)
+    visits = Column(Integer, nullable=False)
+    minutes = Column(Integer, nullable=False)
+
+    processed_file = relationship("ProcessedFile", back_populates="zone_transitions")
+
+
 class BleTag(Base):
     """Справочник BLE-меток"""
     __tablename__ = "ble_tags"
@@ -103,9 +221,134 @@ class ProcessedFile(Base):
     processed_at = Column(DateTime, nullable=False)
     records_count = Column(Integer, nullable=True)
 
-    shifts = relationship("Shift", back_populates="processed_file", cascade="all, delete")
-    downtimes = relationship("Downtime", back_populates="processed_file", cascade="all, delete")
-    ble_logs = relationship("BleLog", back_populates="processed_file", cascade="all, delete")
+    # Строки файла удаляются set-based запросами (services/file_rows.py) или ON DELETE CASCADE,
+    # поэтому связи не загружают дочерние строки при удалении (passive_deletes)
+    shifts = relationship("Shift", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    downtimes = relationship("Downtime", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    downtime_hours = relationship("DowntimeHour", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    ble_logs = relationship("BleLog", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    ble_intervals = relationship("BleInterval", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    timeline_intervals = relationship("TimelineInterval", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+    zone_transitions = relationship("ZoneTransition", back_populates="processed_file", cascade="all, delete", passive_deletes=True)
+
+
+# zone_id строк DailyRollup, которые несут агрегаты смен/простоев, а не минуты зон
+ROLLUP_NO_ZONE = -1
+
+
+class DailyRollup(Base):
+    """Дневные агрегаты по (объект, день, сотрудник, зона) для /api/stats"""
+    __tablename__ = "daily_rollups"
+    __table_args__ = (
+        UniqueConstraint("object_name", "day", "employee_id", "zone_id", name="uq_daily_rollups_key"),
+        Index("ix_daily_rollups_day_object", "day", "object_name"),
+        # Фильтр справочника сотрудников по объекту
+        Index("ix_daily_rollups_employee_object", "employee_id", "object_name"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    object_name = Column(String(255), nullable=False)
+    day = Column(Date, nullable=False)
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=False)
+    zone_id = Column(Integer, nullable=False)  # ROLLUP_NO_ZONE для смен/простоев
+
+    # Report 11: минуты в зоне (1 строка лога = 1 минута)
+    log_minutes = Column(Integer, nullable=False, default=0)
+
+    # Report 8: суммы и количества непустых значений (для точных средних)
+    shifts_count = Column(Integer, nullable=False, default=0)
+    work_pct_sum = Column(Float, nullable=False, default=0)
+    work_pct_count = Column(Integer, nullable=False, default=0)
+    idle_pct_sum = Column(Float, nullable=False, default=0)
+    idle_pct_count = Column(Integer, nullable=False, default=0)
+    go_pct_sum = Column(Float, nullable=False, default=0)
+    go_pct_count = Column(Integer, nullable=False, default=0)
+    work_seconds = Column(BigInteger, nullable=False, default=0)
+    idle_seconds = Column(BigInteger, nullable=False, default=0)
+    go_seconds = Column(BigInteger, nullable=False, default=0)
+
+    # Report 10
+    downtime_count = Column(Integer, nullable=False, default=0)
+    downtime_minutes = Column(BigInteger, nullable=False, default=0)
+
+
+class CacheVersion(Base):
+    """
+    Версии кешей, общих для процессов (services/employee_resolver.py): смена
+    token означает, что закешированные значения устарели.
+    """
+    __tablename__ = "cache_versions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(64), unique=True, nullable=False)
+    token = Column(String(36), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class DriveFileState(Base):
+    """Водяные знаки файлов Google Drive на момент последней успешной синхронизации"""
+    __tablename__ = "drive_file_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_id = Column(String(255), unique=True, nullable=False)
+    filename = Column(String(255), nullable=False)
+    modified_time = Column(String(64), nullable=True)  # RFC 3339 как отдаёт Drive
+    md5_checksum = Column(String(32), nullable=True)
+    processed_file_id = Column(Integer, ForeignKey("processed_files.id", ondelete="SET NULL"), nullable=True)
+    synced_at = Column(DateTime, nullable=False)
+
+
+class DriveSyncToken(Base):
+    """Page token ленты изменений Google Drive (changes.list)"""
+    __tablename__ = "drive_sync_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), unique=True, nullable=False)
+    page_token = Column(String(255), nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ArchivedMonth(Base):
+    """Закрытые месяцы, выгруженные в Parquet-архив (services/archive.py) и удалённые из БД"""
+    __tablename__ = "archived_months"
+
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(Date, unique=True, nullable=False)  # Первое число месяца
+    archived_at = Column(DateTime, nullable=False)
+    rows = Column(JSON, nullable=True)  # {таблица: число выгруженных строк}
+
+
+class IngestJob(Base):
+    """Фоновые задачи загрузки (ручная загрузка файла, синхронизация Drive/справочников)"""
+    __tablename__ = "ingest_jobs"
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_available_at", "status", "available_at"),
+        # Не более одной выполняющейся задачи на ключ блокировки (объект, синхронизация Drive)
+        Index(
+            "uq_ingest_jobs_running_lock_key", "lock_key", unique=True,
+            postgresql_where=text("status = 'running'"),
+            sqlite_where=text("status = 'running'"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)  # upload | drive_sync | references
+    status = Column(String(20), nullable=False, default="queued")  # queued | running | succeeded | failed
+    lock_key = Column(String(255), nullable=True)
+    filename = Column(String(255), nullable=True)
+    report_type = Column(String(50), nullable=True)
+    payload = Column(LargeBinary, nullable=True)  # Содержимое загруженного файла до успешной обработки
+    stage = Column(String(50), nullable=True)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False)  # Не раньше — для отложенных повторов
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
 
 
 class User(Base):
@@ -2,8 +2,7 @@ import logging
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from src.database import async_session
-from src.gdrive import DriveService
-from src.services.report_parser import ReportParser
+from src.services.jobs import enqueue_drive_sync, notify_job_runner
 
 logger = logging.getLogger(__name__)
 
@@ -11,36 +10,11 @@ scheduler = AsyncIOScheduler()
 
 
 async def sync_drive_files():
-    """Фоновая задача: синхронизация файлов с Google Drive"""
-    logger.info("🔄 Начало автоматической синхронизации с Google Drive...")
-    
+    """Фоновая задача: постановка синхронизации с Google Drive в очередь ingest_jobs"""
     async with async_session() as db:
-        drive = DriveService()
-        parser = ReportParser(db)
-        
-        processed = 0
-        errors = 0
-        
-        try:
-            files = drive.list_excel_files()
-            logger.info(f"📁 Найдено {len(files)} файлов в Google Drive")
-            
-            for file_info in files:
-                try:
-                    content = drive.download_file(file_info["id"])
-                    await parser.parse_and_save(content, file_info["name"], sync_refs=False)
-                    processed += 1
-                except Exception as e:
-                    logger.error(f"❌ Ошибка обработки {file_info['name']}: {e}")
-                    errors += 1
-            
-            # Синхронизация справочников
-            await parser.sync_reference_data()
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка доступа к Google Drive: {e}")
-    
-    logger.info(f"✅ Синхронизация завершена: {processed} файлов, {errors} ошибок")
+        job = await enqueue_drive_sync(db)
+    notify_job_runner()
+    logger.info(f"🔄 Автоматическая синхронизация с Google Drive: задача {job.id} ({job.status})")
 
 
 def start_scheduler():
@@ -0,0 +1,142 @@
+"""
+Аналитический исполнитель для /api/stats: суммы метрик daily_rollups за период.
+
+Все метрики агрегатов аддитивны (суммы и количества непустых значений), поэтому
+результат по «живой» части периода (запрос в БД) и по архивной (DuckDB поверх
+Parquet, см. services/archive.py) просто складывается по ключам группировки.
+Архив читается, только если период задевает архивированные месяцы. Строки
+daily_rollups за архивированные месяцы в «живой» части не учитываются: иначе
+строки, попавшие в БД после архивации месяца, сложились бы с архивом дважды.
+Без duckdb архив читается через pyarrow + pandas (медленнее), без pyarrow — ошибка.
+"""
+import asyncio
+import logging
+from datetime import date
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import DailyRollup
+from src.services import archive
+from src.services.rollups import METRIC_COLUMNS
+from src.services.schema import months_between, next_month
+
+logger = logging.getLogger(__name__)
+
+GROUP_COLUMNS = ("day", "employee_id", "zone_id", "object_name")
+
+
+async def rollup_totals(
+    db: AsyncSession,
+    date_from: date,
+    date_to: date,
+    object_name: Optional[str] = None,
+    by: Sequence[str] = (),
+    employee_id: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Суммы METRIC_COLUMNS за [date_from, date_to] с группировкой по колонкам by
+    (и, если задан, только по сотруднику employee_id).
+    Без группировки — одна строка (нули, если данных нет).
+    """
+    by = list(by)
+    if any(col not in GROUP_COLUMNS for col in by):
+        raise ValueError(f"Группировка возможна только по {GROUP_COLUMNS}")
+
+    archived = await _archived_in_period(db, date_from, date_to)
+    frames = [await _live_totals(db, date_from, date_to, object_name, by, employee_id, archived)]
+    if archived:
+        frames.append(await asyncio.to_thread(_archive_totals, date_from, date_to, object_name, by, employee_id))
+
+    frame = pd.concat([f for f in frames if not f.empty] or frames, ignore_index=True)
+    if "day" in by:
+        frame["day"] = pd.to_datetime(frame["day"]).dt.date
+    if by:
+        frame = frame.groupby(by, as_index=False)[METRIC_COLUMNS].sum()
+    else:
+        frame = frame[METRIC_COLUMNS].sum().to_frame().T
+    return frame
+
+
+def average(frame: pd.DataFrame, sum_col: str, count_col: str) -> pd.Series:
+    """Среднее из суммы и количества непустых значений; NaN, если значений нет"""
+    counts = frame[count_col].astype("float64")
+    return frame[sum_col].astype("float64") / counts.where(counts > 0, np.nan)
+
+
+async def _live_totals(db, date_from, date_to, object_name, by, employee_id, archived=()) -> pd.DataFrame:
+    keys = [DailyRollup.__table__.c[col] for col in by]
+    stmt = select(
+        *keys,
+        *(func.coalesce(func.sum(DailyRollup.__table__.c[name]), 0).label(name) for name in METRIC_COLUMNS),
+    ).where(DailyRollup.day.between(date_from, date_to))
+    for month in archived:
+        # Суммы архивного месяца берутся только из архива
+        stmt = stmt.where(or_(DailyRollup.day < month, DailyRollup.day >= next_month(month)))
+    if object_name:
+        stmt = stmt.where(DailyRollup.object_name == object_name)
+    if employee_id is not None:
+        stmt = stmt.where(DailyRollup.employee_id == employee_id)
+    if keys:
+        stmt = stmt.group_by(*keys)
+    rows = (await db.execute(stmt)).all()
+    return pd.DataFrame(rows, columns=by + METRIC_COLUMNS)
+
+
+async def _archived_in_period(db: AsyncSession, date_from: date, date_to: date) -> list[date]:
+    """Архивированные месяцы, которые задевает период"""
+    archived = await archive.archived_months(db)
+    if not archived:
+        return []
+    return [month for month in months_between(date_from, date_to) if month in archived]
+
+
+def _archive_totals(
+    date_from: date, date_to: date, object_name: Optional[str], by: list[str], employee_id: Optional[int],
+) -> pd.DataFrame:
+    path = archive.rollups_glob()
+    if path is None:
+        return pd.DataFrame(columns=by + METRIC_COLUMNS)
+    archive.require_archive_packages()
+    try:
+        import duckdb
+    except ImportError:
+        return _archive_totals_arrow(date_from, date_to, object_name, by, employee_id)
+
+    where = ["day BETWEEN ? AND ?", "month BETWEEN ? AND ?"]
+    params = [date_from, date_to, f"{date_from:%Y-%m}", f"{date_to:%Y-%m}"]
+    if object_name:
+        where.append("object_name = ?")
+        params.append(object_name)
+    if employee_id is not None:
+        where.append("employee_id = ?")
+        params.append(employee_id)
+    sums = ", ".join(f"sum({name}) AS {name}" for name in METRIC_COLUMNS)
+    keys = ", ".join(by)
+    sql = (
+        f"SELECT {keys + ', ' if keys else ''}{sums} "
+        f"FROM read_parquet('{path}', hive_partitioning = true, hive_types_autocast = false) "
+        f"WHERE {' AND '.join(where)}"
+        + (f" GROUP BY {keys}" if keys else "")
+    )
+    with duckdb.connect() as conn:
+        frame = conn.execute(sql, params).df()
+    return frame.fillna({name: 0 for name in METRIC_COLUMNS})
+
+
+def _archive_totals_arrow(date_from, date_to, object_name, by, employee_id) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(
+        f"{archive.archive_root()}/{archive.ROLLUPS_TABLE}", format="parquet", partitioning="hive",
+    )
+    condition = (ds.field("day") >= date_from) & (ds.field("day") <= date_to)
+    if object_name:
+        condition &= ds.field("object_name") == object_name
+    if employee_id is not None:
+        condition &= ds.field("employee_id") == employee_id
+    frame = dataset.to_table(filter=condition, columns=by + METRIC_COLUMNS).to_pandas()
+    if by:
+        return frame.groupby(by, as_index=False)[METRIC_COLUMNS].sum()
+    return frame[METRIC_COLUMNS].sum().to_frame().T
@@ -0,0 +1,196 @@
+"""
+Архив закрытых месяцев в Parquet.
+
+Старые месяцы сырых таблиц (ble_logs, ble_intervals, shifts, downtimes) и их
+daily_rollups выгружаются на диск и удаляются из БД — сканы и индексы рабочих
+таблиц остаются размером в «живой» период. Раскладка (hive-partitioning):
+
+    {archive_dir}/{таблица}/object_name={объект}/month=YYYY-MM/data.parquet
+
+Статистика по архивным дням считается аналитическим исполнителем
+(services/analytics.py) поверх daily_rollups архива через DuckDB.
+
+Архивный месяц считается закрытым: при загрузке строки за такие месяцы
+отклоняются (причина archived_month), а analytics не читает «живые» daily_rollups
+архивных месяцев — суммы не задваиваются.
+Нужны пакеты pyarrow и duckdb (requirements.txt). Без duckdb архив читается
+через pyarrow, медленнее; без pyarrow архив недоступен — это проверяется при
+старте API (check_archive_packages), а не в середине запроса.
+"""
+import importlib.util
+import logging
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import BigInteger, Date, DateTime, Float, Integer, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+from src.models import ArchivedMonth, BleInterval, BleLog, DailyRollup, Downtime, ProcessedFile, Shift
+from src.services.schema import months_between, next_month
+
+logger = logging.getLogger(__name__)
+
+# Таблица -> (модель, колонка дня). object_name сырых строк берётся из processed_files
+ARCHIVE_TABLES = {
+    "ble_logs": (BleLog, BleLog.shift_day),
+    "ble_intervals": (BleInterval, BleInterval.shift_day),
+    "shifts": (Shift, Shift.date),
+    "downtimes": (Downtime, Downtime.dt_start),
+    "daily_rollups": (DailyRollup, DailyRollup.day),
+}
+ROLLUPS_TABLE = "daily_rollups"
+
+STREAM_BATCH_SIZE = 100_000
+
+# Пакеты архива: обязательный и ускоряющий чтение
+REQUIRED_PACKAGE = "pyarrow"
+QUERY_PACKAGE = "duckdb"
+
+
+def _installed(package: str) -> bool:
+    return importlib.util.find_spec(package) is not None
+
+
+def require_archive_packages():
+    """Понятная ошибка вместо ImportError из глубины выгрузки или запроса статистики"""
+    if not _installed(REQUIRED_PACKAGE):
+        raise RuntimeError(
+            f"Архив закрытых месяцев требует пакет {REQUIRED_PACKAGE} (pip install -r requirements.txt)"
+        )
+
+
+async def check_archive_packages(db: AsyncSession):
+    """
+    Проверка при старте API: если месяцы уже архивированы, без pyarrow статистика
+    по ним не посчитается — API не запускается. Без duckdb — предупреждение.
+    """
+    if not await archived_months(db):
+        return
+    require_archive_packages()
+    if not _installed(QUERY_PACKAGE):
+        logger.warning(f"Пакет {QUERY_PACKAGE} не установлен: архив читается через pyarrow (медленнее)")
+
+
+def archive_root() -> str:
+    return get_settings().archive_dir
+
+
+def partition_dir(table: str, object_name: str, month: date) -> str:
+    return os.path.join(archive_root(), table, f"object_name={object_name}", f"month={month:%Y-%m}")
+
+
+def _arrow_schema(model):
+    """Схема Parquet из колонок модели (без object_name — он в пути секции)"""
+    import pyarrow as pa
+
+    types = {Integer: pa.int64(), BigInteger: pa.int64(), Float: pa.float64(), Date: pa.date32(), DateTime: pa.timestamp("us")}
+    fields = []
+    for column in model.__table__.columns:
+        if column.name == "object_name":
+            continue
+        arrow_type = next((t for sa_type, t in types.items() if isinstance(column.type, sa_type)), pa.string())
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+async def _export_partition(db: AsyncSession, table: str, object_name: str, month: date) -> int:
+    """Выгружает строки таблицы за месяц объекта в Parquet (атомарно: tmp + rename)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    model, day_col = ARCHIVE_TABLES[table]
+    schema = _arrow_schema(model)
+    columns = [model.__table__.c[name] for name in schema.names]
+    stmt = select(*columns).where(day_col >= month, day_col < next_month(month))
+    if table == ROLLUPS_TABLE:
+        stmt = stmt.where(DailyRollup.object_name == object_name)
+    else:
+        stmt = stmt.join(ProcessedFile, model.processed_file_id == ProcessedFile.id).where(
+            ProcessedFile.object_name == object_name
+        )
+
+    target = partition_dir(table, object_name, month)
+    os.makedirs(target, exist_ok=True)
+    tmp_path = os.path.join(target, "data.parquet.tmp")
+    rows = 0
+    with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for batch in result.partitions():
+            data = list(zip(*batch))
+            writer.write_table(pa.table({name: data[i] for i, name in enumerate(schema.names)}, schema=schema))
+            rows += len(batch)
+    os.replace(tmp_path, os.path.join(target, "data.parquet"))
+    return rows
+
+
+async def _month_objects(db: AsyncSession, month: date) -> list[str]:
+    """Объекты, у которых есть агрегаты или сырые строки за месяц"""
+    objects = set()
+    for table, (model, day_col) in ARCHIVE_TABLES.items():
+        if table == ROLLUPS_TABLE:
+            stmt = select(DailyRollup.object_name)
+        else:
+            stmt = select(ProcessedFile.object_name).join(model, model.processed_file_id == ProcessedFile.id)
+        stmt = stmt.where(day_col >= month, day_col < next_month(month)).distinct()
+        objects.update(name for name in (await db.execute(stmt)).scalars() if name is not None)
+    return sorted(objects)
+
+
+async def archive_month(db: AsyncSession, month: date) -> dict:
+    """
+    Выгружает месяц всех объектов и удаляет выгруженные строки из БД одной транзакцией.
+    Повторный запуск безопасен: файлы секций перезаписываются.
+    """
+    require_archive_packages()
+    counts = dict.fromkeys(ARCHIVE_TABLES, 0)
+    for object_name in await _month_objects(db, month):
+        for table in ARCHIVE_TABLES:
+            counts[table] += await _export_partition(db, table, object_name, month)
+
+    for table, (model, day_col) in ARCHIVE_TABLES.items():
+        stmt = delete(model).where(day_col >= month, day_col < next_month(month))
+        if table != ROLLUPS_TABLE:
+            # Строки без файла не выгружаются (у них нет объекта) — остаются в БД
+            stmt = stmt.where(model.processed_file_id.is_not(None))
+        await db.execute(stmt)
+
+    db.add(ArchivedMonth(month=month, archived_at=datetime.now(), rows=counts))
+    await db.commit()
+    logger.info(f"Архив {month:%Y-%m}: {counts}")
+    return counts
+
+
+async def archive_before(db: AsyncSession, before: date) -> dict[str, dict]:
+    """Архивирует все ещё не архивированные месяцы, целиком лежащие раньше before"""
+    current_month = date.today().replace(day=1)
+    if before > current_month:
+        raise ValueError(f"Архивировать можно только закрытые месяцы (до {current_month})")
+
+    first_day = None
+    for _, day_col in ARCHIVE_TABLES.values():
+        value = (await db.execute(select(func.min(day_col)))).scalar()
+        if value is not None:
+            value = value.date() if isinstance(value, datetime) else value
+            first_day = min(first_day, value) if first_day else value
+    if first_day is None:
+        return {}
+
+    done = await archived_months(db)
+    result = {}
+    for month in months_between(first_day, before - timedelta(days=1)):
+        if next_month(month) > before or month in done:
+            continue
+        result[f"{month:%Y-%m}"] = await archive_month(db, month)
+    return result
+
+
+async def archived_months(db: AsyncSession) -> set[date]:
+    return set((await db.execute(select(ArchivedMonth.month))).scalars().all())
+
+
+def rollups_glob() -> Optional[str]:
+    """Шаблон путей Parquet-файлов daily_rollups архива или None, если архива нет"""
+    base = os.path.join(archive_root(), ROLLUPS_TABLE)
+    if not os.path.isdir(base):
+        return None
+    return os.path.join(base, "*", "*", "*.parquet")
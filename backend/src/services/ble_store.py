@@ -0,0 +1,161 @@
+"""
+Хранение логов BLE (Report 11) и чтение минут независимо от формата.
+
+ble_storage = "minutes" — строка ble_logs на каждую минуту (как в выгрузке).
+ble_storage = "intervals" — при загрузке подряд идущие минуты сотрудника с той же
+меткой и зоной сворачиваются (run-length) в одну строку ble_intervals с числом
+минут; строк в 10-50 раз меньше, сканы для агрегатов — пропорционально быстрее.
+
+Читатели (daily_rollups, таймлайны) обращаются только к функциям этого модуля,
+которые объединяют обе таблицы: данные, загруженные до смены режима, остаются
+видимыми, а счёт минут совпадает с count(*) по ble_logs.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import BleInterval, BleLog, ProcessedFile
+
+# Отметки дальше друг от друга — разрыв, серия обрывается
+RUN_MAX_STEP_SECONDS = 60
+
+LOG_COLUMNS = ["employee_id", "shift_day", "time_only", "ble_tag", "zone_id"]
+RUN_KEY = ["employee_id", "shift_day", "ble_tag", "zone_id"]
+RUN_COLUMNS = ["employee_id", "shift_day", "start_at", "end_at", "ble_tag", "zone_id", "minutes"]
+
+
+def encode_runs(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Минутные строки (LOG_COLUMNS) -> серии: employee_id, shift_day, start_at, end_at,
+    ble_tag, zone_id, minutes. Серия обрывается на смене сотрудника/дня/метки/зоны
+    и на разрыве больше RUN_MAX_STEP_SECONDS.
+    """
+    frame = frame.sort_values(["employee_id", "shift_day", "time_only"], kind="stable").reset_index(drop=True)
+    step = frame["time_only"].diff().dt.total_seconds()
+    same = np.ones(len(frame), dtype=bool)
+    for col in RUN_KEY:
+        values = frame[col]
+        same &= (values == values.shift()).to_numpy() | (values.isna() & values.shift().isna()).to_numpy()
+    new_run = ~same | (step > RUN_MAX_STEP_SECONDS).to_numpy()
+    frame["run"] = np.cumsum(new_run)
+
+    runs = frame.groupby("run", sort=False).agg(
+        employee_id=("employee_id", "first"),
+        shift_day=("shift_day", "first"),
+        start_at=("time_only", "first"),
+        end_at=("time_only", "last"),
+        ble_tag=("ble_tag", "first"),
+        zone_id=("zone_id", "first"),
+        minutes=("time_only", "size"),
+    )
+    return runs.reset_index(drop=True)
+
+
+def expand_runs(runs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Серии -> минутные строки (LOG_COLUMNS). Отметки распределяются равномерно
+    между start_at и end_at, для серий с шагом в минуту — точно как в исходнике.
+    """
+    counts = runs["minutes"].to_numpy(dtype="int64")
+    if counts.sum() == 0:
+        return pd.DataFrame(columns=LOG_COLUMNS)
+    rows = np.repeat(np.arange(len(runs)), counts)
+    # Порядковый номер отметки внутри серии
+    position = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    start = runs["start_at"].to_numpy(dtype="datetime64[ns]")[rows]
+    span = (runs["end_at"] - runs["start_at"]).to_numpy(dtype="timedelta64[ns]").astype("int64")[rows]
+    # Целочисленно, чтобы шаг в минуту восстанавливался без погрешности
+    offset = span * position // np.maximum(counts[rows] - 1, 1)
+    expanded = runs.iloc[rows][["employee_id", "shift_day", "ble_tag", "zone_id"]].reset_index(drop=True)
+    expanded["time_only"] = start + offset.astype("timedelta64[ns]")
+    return expanded[LOG_COLUMNS]
+
+
+def zone_minutes(object_name: str, day_from: date, day_to: date):
+    """
+    Подзапрос минут по (object_name, day, employee_id, zone_id) из обеих таблиц:
+    count(*) строк ble_logs + sum(minutes) серий ble_intervals.
+    """
+    branches = []
+    for table, minutes in ((BleLog, func.count(BleLog.id)), (BleInterval, func.sum(BleInterval.minutes))):
+        branches.append(
+            select(
+                ProcessedFile.object_name.label("object_name"),
+                table.shift_day.label("day"),
+                table.employee_id.label("employee_id"),
+                table.zone_id.label("zone_id"),
+                minutes.label("minutes"),
+            )
+            .join(ProcessedFile, table.processed_file_id == ProcessedFile.id)
+            .where(ProcessedFile.object_name == object_name, table.shift_day.between(day_from, day_to))
+            .group_by(ProcessedFile.object_name, table.shift_day, table.employee_id, table.zone_id)
+        )
+    return union_all(*branches).subquery("ble_minutes")
+
+
+async def file_day_range(db: AsyncSession, processed_file_id: int) -> tuple[Optional[date], Optional[date]]:
+    """Диапазон shift_day строк файла Report 11 в любой из таблиц"""
+    lo, hi = None, None
+    for table in (BleLog, BleInterval):
+        row = (await db.execute(
+            select(func.min(table.shift_day), func.max(table.shift_day))
+            .where(table.processed_file_id == processed_file_id)
+        )).one()
+        if row[0] is not None:
+            lo = min(lo, row[0]) if lo else row[0]
+            hi = max(hi, row[1]) if hi else row[1]
+    return lo, hi
+
+
+async def file_employee_minutes(db: AsyncSession, processed_file_id: int) -> dict[int, int]:
+    """Сотрудник -> число минутных строк файла (ble_logs и развёрнутые серии ble_intervals)"""
+    stmt = union_all(
+        select(BleLog.employee_id, func.count().label("minutes"))
+        .where(BleLog.processed_file_id == processed_file_id)
+        .group_by(BleLog.employee_id),
+        select(BleInterval.employee_id, func.sum(BleInterval.minutes).label("minutes"))
+        .where(BleInterval.processed_file_id == processed_file_id)
+        .group_by(BleInterval.employee_id),
+    )
+    minutes = defaultdict(int)
+    for employee_id, count in (await db.execute(stmt)).all():
+        minutes[employee_id] += int(count or 0)
+    return dict(sorted(minutes.items()))
+
+
+async def load_file_minutes(db: AsyncSession, processed_file_id: int, employee_ids: list[int]) -> pd.DataFrame:
+    """
+    Минутные строки (LOG_COLUMNS) файла для части сотрудников; серии разворачиваются.
+    Сборка кадра — в отдельном потоке, чтобы не занимать event loop.
+    """
+    log_rows = (await db.execute(
+        select(*(BleLog.__table__.c[name] for name in LOG_COLUMNS))
+        .where(BleLog.processed_file_id == processed_file_id, BleLog.employee_id.in_(employee_ids))
+    )).all()
+    run_rows = (await db.execute(
+        select(*(BleInterval.__table__.c[name] for name in RUN_COLUMNS))
+        .where(BleInterval.processed_file_id == processed_file_id, BleInterval.employee_id.in_(employee_ids))
+    )).all()
+    return await asyncio.to_thread(_minutes_frame, log_rows, run_rows)
+
+
+def _minutes_frame(log_rows: list, run_rows: list) -> pd.DataFrame:
+    logs = pd.DataFrame(log_rows, columns=LOG_COLUMNS)
+    runs = pd.DataFrame(run_rows, columns=RUN_COLUMNS)
+    if not runs.empty:
+        runs["start_at"] = pd.to_datetime(runs["start_at"])
+        runs["end_at"] = pd.to_datetime(runs["end_at"])
+        logs = expand_runs(runs) if logs.empty else pd.concat([logs, expand_runs(runs)], ignore_index=True)
+
+    logs["time_only"] = pd.to_datetime(logs["time_only"])
+    return logs
+
+
+def uses_intervals(storage: str) -> bool:
+    if storage not in ("minutes", "intervals"):
+        raise ValueError(f"Неизвестный режим ble_storage: {storage}")
+    return storage == "intervals"
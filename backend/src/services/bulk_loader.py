@@ -0,0 +1,77 @@
+"""
+Массовая загрузка нормализованных колонок в таблицы отчётов.
+
+На PostgreSQL (asyncpg) строки уходят через `COPY ... FROM STDIN`
+(`copy_records_to_table`) на соединении текущей сессии, т.е. внутри её
+транзакции: данные становятся видимы вместе с ProcessedFile в одном commit,
+а через Supabase Pooler (pgbouncer, transaction mode) транзакция закреплена
+за одним серверным соединением. На других драйверах используется
+executemany обычного Core INSERT.
+"""
+import logging
+import pandas as pd
+from sqlalchemy import Date, DateTime, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class BulkLoader:
+    """Потоковая загрузка DataFrame в таблицу модели пачками фиксированного размера"""
+
+    BATCH_SIZE = 50_000
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.settings = get_settings()
+
+    async def load(self, model, frame: pd.DataFrame, **constants) -> int:
+        """
+        Загружает колонки frame (имена = имена колонок таблицы) в таблицу model.
+        constants — значения, одинаковые для всех строк (например processed_file_id).
+        """
+        if frame.empty:
+            return 0
+
+        table = model.__table__
+        columns = list(frame.columns) + list(constants)
+        conn = await self.db.connection()
+        use_copy = self.settings.bulk_load_copy and conn.dialect.driver == "asyncpg"
+
+        if use_copy:
+            raw = await conn.get_raw_connection()
+            driver_conn = raw.driver_connection
+
+        for start in range(0, len(frame), self.BATCH_SIZE):
+            batch = frame.iloc[start:start + self.BATCH_SIZE]
+            values = [self._to_python(batch[name], table.c[name].type) for name in frame.columns]
+            values += [[value] * len(batch) for value in constants.values()]
+            records = zip(*values)
+
+            if use_copy:
+                await driver_conn.copy_records_to_table(
+                    table.name,
+                    records=records,
+                    columns=columns,
+                    schema_name=table.schema,
+                )
+            else:
+                await self.db.execute(insert(table), [dict(zip(columns, r)) for r in records])
+
+        logger.debug(f"{table.name}: загружено {len(frame)} строк ({'COPY' if use_copy else 'INSERT'})")
+        return len(frame)
+
+    @staticmethod
+    def _to_python(series: pd.Series, col_type) -> list:
+        """Колонка -> список python-значений, понятных драйверу (None вместо NaN/NaT/NA)"""
+        if isinstance(col_type, DateTime):
+            values = list(series.dt.to_pydatetime())
+        elif isinstance(col_type, Date):
+            values = series.dt.date.tolist()
+        else:
+            # tolist() отдаёт int/float, а не numpy-скаляры (asyncpg их не принимает)
+            values = series.tolist()
+        for i in series.isna().to_numpy().nonzero()[0]:
+            values[i] = None
+        return values
@@ -0,0 +1,269 @@
+"""
+Колоночная (векторизованная) нормализация строк отчётов.
+
+Вместо построчного обхода `df.to_dict('records')` значения приводятся к нужным
+типам операциями над целыми колонками. Семантика совпадает со скалярными
+хелперами (`to_int`, `parse_date`, `parse_datetime`): разнородные object-колонки
+разбираются по уникальным значениям, поэтому результат идентичен построчному
+разбору, а стоимость пропорциональна числу различных значений, а не строк.
+"""
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+import numpy as np
+import pandas as pd
+from src.services.report_schema import ReportSchema, compile_schema
+
+_HHMM_RE = re.compile(r'^\d{1,2}:\d{2}$')
+
+
+# --- Скалярные преобразования (эталонная семантика) ---
+
+def to_int(val) -> Optional[int]:
+    if pd.isna(val):
+        return None
+    try:
+        return int(float(val))
+    except Exception:
+        return None
+
+
+def to_float(val) -> Optional[float]:
+    if pd.isna(val):
+        return None
+    try:
+        return float(str(val).replace(",", "."))
+    except Exception:
+        return None
+
+
+def parse_date(val):
+    if pd.isna(val):
+        return None
+    if isinstance(val, datetime):
+        return val.date()
+    try:
+        return pd.to_datetime(val, dayfirst=True).date()
+    except Exception:
+        return None
+
+
+def parse_datetime(val):
+    if pd.isna(val):
+        return None
+    if isinstance(val, datetime):
+        return val
+    try:
+        str_val = str(val).strip()
+        # Обработка формата HH:MM (только время без даты)
+        if _HHMM_RE.match(str_val):
+            # Парсим как время, добавляем фиктивную дату (будет заменена позже)
+            return datetime.strptime(str_val, '%H:%M')
+        return pd.to_datetime(val, dayfirst=True)
+    except Exception:
+        return None
+
+
+# --- Колоночные преобразования ---
+
+def _map_uniques(series: pd.Series, func: Callable) -> list:
+    """Применяет func к уникальным значениям колонки и раскладывает результат по строкам"""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    mapped = [func(u) for u in uniques]
+    # Последний элемент — значение для NaN (sentinel -1)
+    mapped.append(None)
+    lookup = np.empty(len(mapped), dtype=object)
+    lookup[:] = mapped
+    return lookup[codes]
+
+
+def int_column(series: pd.Series) -> pd.Series:
+    """Колонка -> Int64 (pd.NA там, где to_int вернул бы None)"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        valid = np.isfinite(values)
+        result = pd.array(np.trunc(np.where(valid, values, 0)).astype("int64"), dtype="Int64")
+        result[~valid] = pd.NA
+        return pd.Series(result, index=series.index)
+    return pd.Series(pd.array(_map_uniques(series, to_int), dtype="Int64"), index=series.index)
+
+
+def float_column(series: pd.Series) -> pd.Series:
+    """Колонка -> float64 (NaN там, где to_float вернул бы None)"""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype("float64")
+    values = _map_uniques(series, to_float)
+    return pd.Series(np.array([np.nan if v is None else v for v in values], dtype="float64"), index=series.index)
+
+
+def date_column(series: pd.Series) -> pd.Series:
+    """Колонка -> datetime64 с обнулённым временем (NaT там, где parse_date вернул бы None)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.normalize()
+    return pd.Series(pd.to_datetime(_map_uniques(series, parse_date)), index=series.index)
+
+
+def datetime_column(series: pd.Series) -> pd.Series:
+    """Колонка -> datetime64 (NaT там, где parse_datetime вернул бы None)"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.Series(pd.to_datetime(_map_uniques(series, parse_datetime)), index=series.index)
+
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(np.nan, index=df.index, dtype="float64")
+
+
+def tn_column(df: pd.DataFrame) -> pd.Series:
+    """Табельный номер (несколько колонок ТН схема уже свела в одну — первое непустое значение)"""
+    return int_column(_column(df, "tn"))
+
+
+# --- Нормализация отчётов ---
+
+@dataclass
+class NormalizedFrame:
+    """Результат нормализации: принятые строки и отчёт об отклонённых"""
+    frame: pd.DataFrame
+    rejected: pd.DataFrame  # колонки: row (индекс строки в листе), reason
+
+    def rejected_summary(self, sample_size: int = 20) -> dict:
+        return {
+            "total": len(self.rejected),
+            "by_reason": {str(k): int(v) for k, v in self.rejected["reason"].value_counts().items()},
+            "sample_rows": [int(r) for r in self.rejected["row"].head(sample_size)],
+        }
+
+
+def _split(df: pd.DataFrame, checks: list[tuple[str, pd.Series]]) -> tuple[np.ndarray, pd.DataFrame]:
+    """Проверки применяются по порядку; строке приписывается первая нарушенная"""
+    reason = np.full(len(df), None, dtype=object)
+    for name, ok in checks:
+        bad = ~ok.to_numpy(dtype=bool, na_value=False)
+        reason[bad & (reason == None)] = name  # noqa: E711
+    rejected_mask = reason != None  # noqa: E711
+    rejected = pd.DataFrame({
+        "row": df.index.to_numpy()[rejected_mask],
+        "reason": reason[rejected_mask],
+    })
+    return ~rejected_mask, rejected
+
+
+def normalize_report11(df: pd.DataFrame) -> NormalizedFrame:
+    """
+    Report 11 (BLE логи): tn, shift_day, time_only, ble_tag, zone_id.
+    Ожидает колонки в именах системы (ReportSchema.project).
+    """
+    tn = tn_column(df)
+    shift_day = date_column(_column(df, "shift_day"))
+    time_only = datetime_column(_column(df, "time_only"))
+    ble_tag = int_column(_column(df, "ble_tag"))
+    zone_id = int_column(_column(df, "zone_id"))
+
+    accepted, rejected = _split(df, [
+        ("tn", tn.fillna(0) != 0),
+        ("shift_day", shift_day.notna()),
+        ("time_only", time_only.notna()),
+        ("ble_tag", ble_tag.notna()),
+    ])
+
+    shift_day = shift_day[accepted]
+    time_only = time_only[accepted]
+    frame = pd.DataFrame({
+        "tn": tn[accepted].astype("int64"),
+        "shift_day": shift_day,
+        # datetime.combine(shift_day, time_only.time())
+        "time_only": shift_day + (time_only - time_only.dt.normalize()),
+        "ble_tag": ble_tag[accepted].astype("int64"),
+        # _to_int(zone) or 1
+        "zone_id": zone_id[accepted].fillna(0).replace(0, 1).astype("int64"),
+    })
+    return NormalizedFrame(frame=frame, rejected=rejected)
+
+
+def _name_column(df: pd.DataFrame) -> pd.Series:
+    """ФИО для создаваемых сотрудников (Unknown, если колонки нет или ячейка пуста)"""
+    if "ФИО" not in df.columns:
+        return pd.Series("Unknown", index=df.index, dtype=object)
+    col = df["ФИО"]
+    return col.astype(str).where(col.notna(), "Unknown")
+
+
+def normalize_report8(df: pd.DataFrame) -> NormalizedFrame:
+    """Report 8 (смены): tn, date, date_begin, date_end и показатели go/idle/work"""
+    tn = tn_column(df)
+    date_val = date_column(_column(df, "date"))
+    date_begin = datetime_column(_column(df, "date_begin"))
+    date_end = datetime_column(_column(df, "date_end"))
+
+    accepted, rejected = _split(df, [
+        ("tn", tn.fillna(0) != 0),
+        ("date", date_val.notna()),
+        ("date_begin", date_begin.notna()),
+        ("date_end", date_end.notna()),
+    ])
+
+    frame = pd.DataFrame({
+        "tn": tn[accepted].astype("int64"),
+        "name": _name_column(df)[accepted],
+        "date": date_val[accepted],
+        "date_begin": date_begin[accepted],
+        "date_end": date_end[accepted],
+        "full_go_percent": float_column(_column(df, "full_go"))[accepted],
+        "full_idle_percent": float_column(_column(df, "full_idle"))[accepted],
+        "full_work_percent": float_column(_column(df, "full_work"))[accepted],
+        "full_go_seconds": int_column(_column(df, "full_go_seconds"))[accepted],
+        "full_idle_seconds": int_column(_column(df, "full_idle_seconds"))[accepted],
+        "full_work_seconds": int_column(_column(df, "full_work_seconds"))[accepted],
+    })
+    return NormalizedFrame(frame=frame, rejected=rejected)
+
+
+def normalize_report10(df: pd.DataFrame) -> NormalizedFrame:
+    """Report 10 (простои): tn, dt_start, dt_end, duration, chosen_ble_tag_number"""
+    tn = tn_column(df)
+    dt_start = datetime_column(_column(df, "dt_start"))
+    dt_end = datetime_column(_column(df, "dt_end"))
+    duration = int_column(_column(df, "duration"))
+
+    accepted, rejected = _split(df, [
+        ("tn", tn.fillna(0) != 0),
+        ("dt_start", dt_start.notna()),
+        ("dt_end", dt_end.notna()),
+        # duration_minutes NOT NULL: раньше такая строка роняла commit всего файла
+        ("duration", duration.notna()),
+    ])
+
+    frame = pd.DataFrame({
+        "tn": tn[accepted].astype("int64"),
+        "name": _name_column(df)[accepted],
+        "dt_start": dt_start[accepted],
+        "dt_end": dt_end[accepted],
+        "duration_minutes": duration[accepted].astype("int64"),
+        "ble_tag_id": int_column(_column(df, "chosen_ble_tag_number"))[accepted],
+    })
+    return NormalizedFrame(frame=frame, rejected=rejected)
+
+
+NORMALIZERS = {
+    "report8": normalize_report8,
+    "report10": normalize_report10,
+    "report11": normalize_report11,
+}
+
+
+def normalize_report(
+    report_type: str, df: pd.DataFrame, schema: Optional[ReportSchema] = None, projected: bool = False,
+) -> NormalizedFrame:
+    """
+    Проекция листа по схеме + нормализация под тип отчёта. Без schema схема
+    компилируется по заголовку df (из кеша, если такой заголовок уже встречался).
+    projected=True — df уже прочитан только по колонкам schema.usecols (SheetReader.chunks).
+    """
+    if report_type not in NORMALIZERS:
+        raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+    schema = schema or compile_schema(report_type, df.columns)
+    return NORMALIZERS[report_type](schema.project(df, projected=projected))
@@ -0,0 +1,88 @@
+"""
+Почасовая раскладка простоев (Report 10) для тепловой карты.
+
+Каждый простой делится по границам часов: простой 09:50-10:20 даёт 10 минут
+в часе 9 и 20 минут в часе 10 (через полночь — на разные даты). Результат
+сгруппирован по (сотрудник, метка, дата, час) и хранится в downtime_hours,
+поэтому тепловая карта и рейтинги считаются суммами по маленькой таблице,
+без чтения всех строк downtimes.
+
+Раскладка пересобирается при каждой загрузке/перезаписи файла Report 10.
+"""
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import Downtime, DowntimeHour, ProcessedFile
+from src.services.bulk_loader import BulkLoader
+
+logger = logging.getLogger(__name__)
+
+HOUR = np.timedelta64(1, "h")
+BUCKET_COLUMNS = ["employee_id", "ble_tag_id", "day", "hour"]
+
+
+def split_by_hour(downtimes: pd.DataFrame) -> pd.DataFrame:
+    """
+    Простои (employee_id, ble_tag_id, dt_start, dt_end) -> секунды по часам:
+    колонки BUCKET_COLUMNS + seconds. Простои с dt_end <= dt_start пропускаются.
+    """
+    frame = downtimes[downtimes["dt_end"] > downtimes["dt_start"]]
+    if frame.empty:
+        return pd.DataFrame(columns=BUCKET_COLUMNS + ["seconds"])
+
+    start = frame["dt_start"].to_numpy("datetime64[ns]")
+    end = frame["dt_end"].to_numpy("datetime64[ns]")
+    first = start.astype("datetime64[h]")
+    last = (end - np.timedelta64(1, "ns")).astype("datetime64[h]")
+    hours = (last - first).astype(np.int64) + 1
+
+    # Строка на каждый час простоя: индекс простоя + номер часа внутри него
+    idx = np.repeat(np.arange(len(frame)), hours)
+    step = np.arange(len(idx)) - np.repeat(np.cumsum(hours) - hours, hours)
+    bucket = first[idx].astype("datetime64[ns]") + step * HOUR
+    seconds = (np.minimum(end[idx], bucket + HOUR) - np.maximum(start[idx], bucket)) // np.timedelta64(1, "s")
+
+    bucket = pd.DatetimeIndex(bucket)
+    parts = pd.DataFrame({
+        "employee_id": frame["employee_id"].to_numpy()[idx],
+        "ble_tag_id": frame["ble_tag_id"].astype("Int64").array.take(idx),
+        "day": bucket.normalize(),
+        "hour": bucket.hour,
+        "seconds": seconds.astype(np.int64),
+    })
+    return parts.groupby(BUCKET_COLUMNS, as_index=False, dropna=False)["seconds"].sum()
+
+
+async def rebuild_file_downtime_hours(db: AsyncSession, processed_file_id: int) -> int:
+    """
+    Пересобирает downtime_hours файла Report 10 из его downtimes.
+    Работает в транзакции вызывающего (commit делает он). Возвращает число строк.
+    """
+    await db.execute(delete(DowntimeHour).where(DowntimeHour.processed_file_id == processed_file_id))
+
+    rows = (await db.execute(
+        select(Downtime.employee_id, Downtime.ble_tag_id, Downtime.dt_start, Downtime.dt_end)
+        .where(Downtime.processed_file_id == processed_file_id)
+    )).all()
+    downtimes = pd.DataFrame(rows, columns=["employee_id", "ble_tag_id", "dt_start", "dt_end"])
+    if downtimes.empty:
+        return 0
+
+    buckets = split_by_hour(downtimes)
+    total = await BulkLoader(db).load(DowntimeHour, buckets, processed_file_id=processed_file_id)
+    logger.info(f"Простои файла {processed_file_id}: {len(downtimes)} -> {total} часовых строк")
+    return total
+
+
+async def rebuild_all_downtime_hours(db: AsyncSession) -> int:
+    """Пересборка почасовых простоев всех загруженных файлов Report 10"""
+    file_ids = (await db.execute(
+        select(ProcessedFile.id).where(ProcessedFile.report_type == "report10")
+    )).scalars().all()
+    total = 0
+    for file_id in file_ids:
+        total += await rebuild_file_downtime_hours(db, file_id)
+        await db.commit()
+    return total
@@ -0,0 +1,68 @@
+"""
+Водяные знаки инкрементальной синхронизации Google Drive.
+
+Для каждого файла хранится md5Checksum/modifiedTime, с которыми он был
+успешно обработан; при следующей синхронизации скачиваются только файлы,
+у которых они изменились. Дополнительно хранится page token ленты
+изменений Drive (changes.list), чтобы не перечислять папки целиком.
+"""
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import DriveFileState, DriveSyncToken
+
+CHANGES_TOKEN_NAME = "drive_changes"
+
+
+class DriveWatermarks:
+    """Чтение и запись водяных знаков файлов Drive и page token ленты изменений"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def filter_changed(self, files: list[dict]) -> list[dict]:
+        """Оставляет файлы, которых нет в drive_file_states или чьи md5/modifiedTime изменились"""
+        if not files:
+            return []
+        stmt = select(DriveFileState).where(DriveFileState.file_id.in_([f["id"] for f in files]))
+        states = {s.file_id: s for s in (await self.db.execute(stmt)).scalars()}
+        return [f for f in files if self._is_changed(f, states.get(f["id"]))]
+
+    @staticmethod
+    def _is_changed(file_info: dict, state: Optional[DriveFileState]) -> bool:
+        if state is None or state.filename != file_info["name"]:
+            return True
+        md5 = file_info.get("md5Checksum")
+        if md5 and state.md5_checksum:
+            return md5 != state.md5_checksum
+        return file_info.get("modifiedTime") != state.modified_time
+
+    async def mark_synced(self, file_info: dict, processed_file_id: Optional[int] = None):
+        """Запоминает состояние успешно обработанного (или пропущенного как дубль) файла"""
+        stmt = select(DriveFileState).where(DriveFileState.file_id == file_info["id"])
+        state = (await self.db.execute(stmt)).scalar_one_or_none()
+        if state is None:
+            state = DriveFileState(file_id=file_info["id"])
+            self.db.add(state)
+        state.filename = file_info["name"]
+        state.modified_time = file_info.get("modifiedTime")
+        state.md5_checksum = file_info.get("md5Checksum")
+        if processed_file_id is not None:
+            state.processed_file_id = processed_file_id
+        state.synced_at = datetime.now()
+        await self.db.commit()
+
+    async def get_page_token(self) -> Optional[str]:
+        stmt = select(DriveSyncToken.page_token).where(DriveSyncToken.name == CHANGES_TOKEN_NAME)
+        return (await self.db.execute(stmt)).scalar_one_or_none()
+
+    async def set_page_token(self, page_token: str):
+        stmt = select(DriveSyncToken).where(DriveSyncToken.name == CHANGES_TOKEN_NAME)
+        token = (await self.db.execute(stmt)).scalar_one_or_none()
+        if token is None:
+            token = DriveSyncToken(name=CHANGES_TOKEN_NAME)
+            self.db.add(token)
+        token.page_token = page_token
+        token.updated_at = datetime.now()
+        await self.db.commit()
@@ -0,0 +1,149 @@
+"""
+Общий для всех загрузок кеш tn_number -> employees.id.
+
+Раньше каждый ReportParser перед файлом читал всю таблицу employees, а
+новых сотрудников создавал через ORM: синхронизация 200 файлов — 200 полных
+сканов, а параллельные загрузки могли одновременно создать одного и того же
+сотрудника. Теперь:
+
+  - кеш один на процесс и живёт между файлами и экземплярами парсера;
+  - отсутствующие в кеше номера ищутся одним SELECT ... IN на пачку,
+    новые создаются одним INSERT ... ON CONFLICT (tn_number) DO NOTHING
+    и перечитываются (строки, созданные параллельной загрузкой, тоже находятся);
+  - в общий кеш попадают только id из закоммиченных транзакций: найденное
+    в транзакции копится в session.info и публикуется после commit
+    (при rollback — отбрасывается);
+  - версия кеша хранится в cache_versions и проверяется один раз на файл
+    (check_version): если token в БД сменился (invalidate_employees при
+    синхронизации справочника, пересоздание таблиц reset_db.py), кеш очищается.
+"""
+import functools
+import logging
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import CacheVersion, Employee
+from src.services.reference_sync import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "employees"
+BATCH_SIZE = 5000  # Размер IN-списка / пачки INSERT
+_PENDING_KEY = "employee_resolver_pending"
+
+
+class EmployeeResolver:
+    def __init__(self):
+        self._ids: dict[int, int] = {}  # tn_number -> id (только закоммиченные)
+        self._token: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    async def resolve(self, db: AsyncSession, tn_numbers: list[int], names: Optional[dict] = None) -> dict:
+        """
+        tn_number -> id для всех номеров; неизвестные сотрудники создаются (имя из names или "Unknown").
+        Версию кеша вызывающий проверяет один раз на файл (check_version), а не на каждую пачку.
+        """
+        pending = db.info.get(_PENDING_KEY, {})
+
+        result, missing = {}, []
+        for tn in tn_numbers:
+            employee_id = self._ids.get(tn) or pending.get(tn)
+            if employee_id is None:
+                missing.append(tn)
+            else:
+                result[tn] = employee_id
+        self.hits += len(result)
+        self.misses += len(missing)
+        if not missing:
+            return result
+
+        found = await self._select(db, missing)
+        unknown = [tn for tn in missing if tn not in found]
+        if unknown:
+            names = names or {}
+            insert = dialect_insert(db)
+            for start in range(0, len(unknown), BATCH_SIZE):
+                batch = unknown[start:start + BATCH_SIZE]
+                inserted = await db.execute(
+                    insert(Employee.__table__)
+                    .values([{"tn_number": tn, "name": names.get(tn, "Unknown")} for tn in batch])
+                    .on_conflict_do_nothing(index_elements=["tn_number"])
+                )
+                self.created += max(inserted.rowcount, 0)
+            found.update(await self._select(db, unknown))
+            logger.info(f"Сотрудники: {len(unknown)} новых табельных номеров")
+
+        self._stage(db, found)
+        result.update(found)
+        return result
+
+    async def _select(self, db: AsyncSession, tn_numbers: list[int]) -> dict:
+        found = {}
+        for start in range(0, len(tn_numbers), BATCH_SIZE):
+            stmt = select(Employee.tn_number, Employee.id).where(
+                Employee.tn_number.in_(tn_numbers[start:start + BATCH_SIZE])
+            )
+            found.update((await db.execute(stmt)).all())
+        return found
+
+    def _stage(self, db: AsyncSession, found: dict):
+        """Копит id до commit сессии: в общий кеш — только после успешного commit"""
+        if _PENDING_KEY not in db.info:
+            db.info[_PENDING_KEY] = {}
+            sync_session = db.sync_session
+
+            @event.listens_for(sync_session, "after_commit")
+            def _publish(session):
+                self._ids.update(session.info.get(_PENDING_KEY, {}))
+                session.info[_PENDING_KEY] = {}
+
+            @event.listens_for(sync_session, "after_rollback")
+            def _discard(session):
+                session.info[_PENDING_KEY] = {}
+
+        db.info[_PENDING_KEY].update(found)
+
+    async def check_version(self, db: AsyncSession):
+        """Очищает кеш, если версия в cache_versions сменилась. Вызывается один раз на файл"""
+        token = (await db.execute(
+            select(CacheVersion.token).where(CacheVersion.name == CACHE_NAME)
+        )).scalar_one_or_none()
+        if token is None:
+            # Первая загрузка после создания таблиц: заводим версию
+            await db.execute(
+                dialect_insert(db)(CacheVersion.__table__)
+                .values(name=CACHE_NAME, token=uuid.uuid4().hex, updated_at=datetime.now())
+                .on_conflict_do_nothing(index_elements=["name"])
+            )
+            token = (await db.execute(
+                select(CacheVersion.token).where(CacheVersion.name == CACHE_NAME)
+            )).scalar_one()
+        if token != self._token:
+            if self._token is not None:
+                logger.info("Кеш сотрудников устарел (сменилась версия) — очищаем")
+            self._ids.clear()
+            self._token = token
+
+    def stats(self) -> dict:
+        return {"entries": len(self._ids), "hits": self.hits, "misses": self.misses, "created": self.created}
+
+
+async def invalidate_employees(db: AsyncSession):
+    """
+    Сбрасывает кеш сотрудников во всех процессах (синхронизация справочника,
+    удаление или перенумерация сотрудников). Commit делает вызывающий.
+    """
+    await db.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == CACHE_NAME)
+        .values(token=uuid.uuid4().hex, updated_at=datetime.now())
+    )
+
+
+@functools.lru_cache
+def get_employee_resolver() -> EmployeeResolver:
+    return EmployeeResolver()
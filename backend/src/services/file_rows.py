@@ -0,0 +1,51 @@
+"""
+Удаление строк загруженного файла (перезапись отчёта) set-based запросами.
+
+Раньше перезапись делала db.delete(processed_file), и каскад ORM загружал в
+память каждую дочернюю строку (ble_logs, shifts, ...) и удалял их по одной.
+Теперь для каждой таблицы со ссылкой на processed_files выполняется один
+DELETE ... WHERE processed_file_id = :id (или UPDATE ... SET NULL — как
+объявлено в ondelete внешнего ключа), поэтому итог тот же, что у каскада.
+
+Всё выполняется в транзакции вызывающего: до commit дашборды видят старые данные.
+"""
+import logging
+from typing import Iterator
+from sqlalchemy import Column, Table, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import Base
+from src.models import ProcessedFile
+
+logger = logging.getLogger(__name__)
+
+
+def file_dependents() -> Iterator[tuple[Table, Column, str]]:
+    """(таблица, колонка внешнего ключа, ondelete) для всех таблиц, ссылающихся на processed_files"""
+    for table in Base.metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if fk.column is ProcessedFile.__table__.c.id:
+                yield table, fk.parent, (fk.ondelete or "").upper()
+
+
+async def delete_file_rows(db: AsyncSession, processed_file_id: int) -> dict[str, int]:
+    """Удаляет (или отвязывает) строки всех таблиц, ссылающихся на файл. Возвращает число строк по таблицам"""
+    counts = {}
+    for table, column, ondelete in file_dependents():
+        if ondelete == "SET NULL":
+            stmt = update(table).where(column == processed_file_id).values({column.name: None})
+        else:
+            stmt = delete(table).where(column == processed_file_id)
+        counts[table.name] = (await db.execute(stmt)).rowcount
+    return counts
+
+
+async def delete_processed_file(db: AsyncSession, processed_file: ProcessedFile) -> dict[str, int]:
+    """
+    Удаляет файл со всеми его строками. Связи ProcessedFile объявлены с
+    passive_deletes, поэтому ORM не загружает дочерние строки.
+    """
+    counts = await delete_file_rows(db, processed_file.id)
+    await db.delete(processed_file)
+    await db.flush()
+    logger.info(f"Файл {processed_file.id} удалён: {counts}")
+    return counts
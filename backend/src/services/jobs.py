@@ -0,0 +1,350 @@
+"""
+Очередь фоновых задач загрузки на таблице ingest_jobs.
+
+HTTP-эндпоинты только ставят задачу (enqueue_*) и сразу возвращают её id;
+выполняет JobRunner — несколько asyncio-воркеров, запускаемых из lifespan.
+
+Надёжность:
+  - задача хранится в БД вместе с содержимым файла, поэтому переживает рестарт;
+  - выполняющаяся задача раз в heartbeat обновляет heartbeat_at; задачи,
+    зависшие в running дольше job_stale_seconds (процесс упал), возвращаются
+    в очередь или помечаются failed, если попытки исчерпаны;
+  - ошибка — повтор с экспоненциальной задержкой до max_attempts;
+  - lock_key (объект отчёта / drive_sync) + частичный уникальный индекс
+    uq_ingest_jobs_running_lock_key: по одному ключу одновременно выполняется
+    не более одной задачи, даже при нескольких процессах API;
+  - запись данных объекта дополнительно защищена блокировкой объекта в
+    ReportParser.save_normalized (services/locks.py): синхронизация Drive пишет
+    файлы многих объектов и не может занять их ключи задачами, поэтому загрузка
+    и синхронизация, перезаписывающие один объект, выполняются по очереди;
+  - чтение и нормализация файла идут в пуле процессов (parse_worker), в
+    event loop остаётся только запись в БД.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import get_settings
+from src.database import async_session
+from src.models import IngestJob
+from src.services.locks import object_lock_key
+from src.services.parse_worker import get_parse_executor, shutdown_parse_executor
+from src.services.report_parser import ReportParser
+from src.services.sync_pipeline import run_drive_sync
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+DRIVE_SYNC_LOCK = "drive_sync"
+REFERENCES_LOCK = "references"
+
+# Не чаще, чем раз в столько секунд, прогресс пишется в БД
+PROGRESS_INTERVAL = 2.0
+
+
+def job_to_dict(job: IngestJob) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "filename": job.filename,
+        "report_type": job.report_type,
+        "stage": job.stage,
+        "rows_processed": job.rows_processed,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _new_job(kind: str, lock_key: Optional[str], **fields) -> IngestJob:
+    now = datetime.now()
+    return IngestJob(
+        kind=kind,
+        status="queued",
+        lock_key=lock_key,
+        stage="queued",
+        rows_processed=0,
+        attempts=0,
+        max_attempts=get_settings().job_max_attempts,
+        created_at=now,
+        available_at=now,
+        **fields,
+    )
+
+
+async def enqueue_upload(db: AsyncSession, content: bytes, filename: str, report_type: str = "auto") -> IngestJob:
+    """Задача загрузки файла. Ключ блокировки — объект из имени файла (перезаписи одного объекта не пересекаются)"""
+    object_name = ReportParser._extract_object_name(filename)
+    job = _new_job(
+        "upload", object_lock_key(object_name),
+        filename=filename, report_type=report_type, payload=content,
+    )
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def _enqueue_singleton(db: AsyncSession, kind: str, lock_key: str) -> IngestJob:
+    """Если такая задача уже в очереди или выполняется — возвращает её, а не ставит вторую"""
+    stmt = select(IngestJob).where(IngestJob.kind == kind, IngestJob.status.in_(ACTIVE_STATUSES)).limit(1)
+    existing = (await db.execute(stmt)).scalar_one_or_none()
+    if existing is not None:
+        return existing
+    job = _new_job(kind, lock_key)
+    db.add(job)
+    await db.commit()
+    return job
+
+
+async def enqueue_drive_sync(db: AsyncSession) -> IngestJob:
+    return await _enqueue_singleton(db, "drive_sync", DRIVE_SYNC_LOCK)
+
+
+async def enqueue_references_sync(db: AsyncSession) -> IngestJob:
+    return await _enqueue_singleton(db, "references", REFERENCES_LOCK)
+
+
+class JobRunner:
+    """Пул asyncio-воркеров, выбирающих задачи из ingest_jobs"""
+
+    def __init__(self, workers: Optional[int] = None, session_factory=async_session):
+        settings = get_settings()
+        self.workers = workers or settings.job_workers
+        self.poll_interval = settings.job_poll_seconds
+        self.stale_after = timedelta(seconds=settings.job_stale_seconds)
+        self.heartbeat_interval = max(settings.job_stale_seconds / 5, 1)
+        self.session_factory = session_factory
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"🧵 Очередь задач запущена: {self.workers} воркеров")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Разбудить воркеры сразу после постановки задачи (без ожидания poll_interval)"""
+        self._wakeup.set()
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                await self.recover_stale()
+                job_id = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Воркер {number}: ошибка выборки задачи: {e}")
+                job_id = None
+
+            if job_id is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job_id)
+
+    async def _claim(self) -> Optional[int]:
+        """Берёт первую готовую задачу, ключ которой сейчас не занят. None — брать нечего"""
+        running_keys = select(IngestJob.lock_key).where(
+            IngestJob.status == "running", IngestJob.lock_key.is_not(None)
+        )
+        stmt = (
+            select(IngestJob.id)
+            .where(
+                IngestJob.status == "queued",
+                IngestJob.available_at <= datetime.now(),
+                or_(IngestJob.lock_key.is_(None), IngestJob.lock_key.not_in(running_keys)),
+            )
+            .order_by(IngestJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        async with self.session_factory() as db:
+            job_id = (await db.execute(stmt)).scalar_one_or_none()
+            if job_id is None:
+                return None
+            # Повтор условий выборки — защита от двойного захвата там, где нет SKIP LOCKED
+            # (в т.ч. если задача успела упасть и вернуться в очередь с отложенным available_at)
+            now = datetime.now()
+            try:
+                claimed = await db.execute(
+                    update(IngestJob)
+                    .where(IngestJob.id == job_id, IngestJob.status == "queued", IngestJob.available_at <= now)
+                    .values(
+                        status="running", stage="started", attempts=IngestJob.attempts + 1,
+                        started_at=now, heartbeat_at=now, error=None,
+                    )
+                )
+                await db.commit()
+            except IntegrityError:
+                # Другой процесс только что занял тот же lock_key — попробуем позже
+                await db.rollback()
+                return None
+            return job_id if claimed.rowcount == 1 else None
+
+    async def recover_stale(self):
+        """Возвращает в очередь задачи, чей воркер перестал обновлять heartbeat (падение процесса)"""
+        deadline = datetime.now() - self.stale_after
+        async with self.session_factory() as db:
+            stale = (await db.execute(
+                select(IngestJob).where(IngestJob.status == "running", IngestJob.heartbeat_at < deadline)
+            )).scalars().all()
+            for job in stale:
+                logger.warning(f"Задача {job.id} зависла (heartbeat {job.heartbeat_at}), возвращаем в очередь")
+                self._schedule_retry(job, "Прервана: воркер перестал отвечать")
+            if stale:
+                await db.commit()
+
+    def _schedule_retry(self, job: IngestJob, error: str):
+        job.error = error
+        job.heartbeat_at = None
+        if job.attempts >= job.max_attempts:
+            job.status = "failed"
+            job.stage = "failed"
+            job.finished_at = datetime.now()
+            job.payload = None
+        else:
+            job.status = "queued"
+            job.stage = "retry"
+            job.available_at = datetime.now() + timedelta(seconds=30 * 2 ** (job.attempts - 1))
+
+    async def _run(self, job_id: int):
+        async with self.session_factory() as db:
+            job = await db.get(IngestJob, job_id)
+            kind, filename, report_type, payload = job.kind, job.filename, job.report_type, job.payload
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        progress = _ProgressWriter(job_id, self.session_factory)
+        logger.info(f"▶️ Задача {job_id} ({kind} {filename or ''}) запущена")
+        try:
+            result = await self._execute(kind, filename, report_type, payload, progress)
+        except asyncio.CancelledError:
+            # Остановка приложения: задача вернётся в очередь без траты попытки
+            heartbeat.cancel()
+            await self._finish(job_id, requeue=True)
+            raise
+        except Exception as e:
+            heartbeat.cancel()
+            logger.error(f"❌ Задача {job_id} упала: {e}")
+            await self._finish(job_id, error=str(e))
+            return
+        heartbeat.cancel()
+        await self._finish(job_id, result=result, rows=progress.rows)
+        logger.info(f"✅ Задача {job_id} выполнена")
+
+    async def _execute(self, kind, filename, report_type, payload, progress) -> dict:
+        if kind == "upload":
+            async with self.session_factory() as db:
+                parser = ReportParser(db)
+                parser.on_progress = progress
+                # Разбор — в пуле процессов: в event loop он остановил бы API и heartbeat задач
+                return await parser.parse_and_save(
+                    payload, filename, report_type=report_type or "auto", executor=get_parse_executor(),
+                )
+        if kind == "drive_sync":
+            result = await run_drive_sync(on_progress=progress)
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+            return result
+        if kind == "references":
+            async with self.session_factory() as db:
+                return await ReportParser(db).sync_reference_data()
+        raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(IngestJob).where(IngestJob.id == job_id).values(heartbeat_at=datetime.now())
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.warning(f"Задача {job_id}: не удалось обновить heartbeat: {e}")
+
+    async def _finish(self, job_id: int, result: Optional[dict] = None, error: Optional[str] = None,
+                      rows: Optional[int] = None, requeue: bool = False):
+        async with self.session_factory() as db:
+            job = await db.get(IngestJob, job_id)
+            if requeue:
+                job.status, job.stage, job.heartbeat_at = "queued", "requeued", None
+                job.attempts = max(job.attempts - 1, 0)
+            elif error is not None:
+                self._schedule_retry(job, error)
+            else:
+                job.status = "succeeded"
+                job.stage = "done"
+                job.result = result
+                if rows is not None:
+                    job.rows_processed = rows
+                job.finished_at = datetime.now()
+                job.payload = None  # Содержимое файла больше не нужно
+            await db.commit()
+
+
+class _ProgressWriter:
+    """Колбэк прогресса: пишет stage/rows_processed в задачу не чаще PROGRESS_INTERVAL"""
+
+    def __init__(self, job_id: int, session_factory):
+        self.job_id = job_id
+        self.session_factory = session_factory
+        self.rows = 0
+        self._stage = None
+        self._written_at = 0.0
+
+    async def __call__(self, stage: str, rows: int):
+        self.rows = rows
+        now = time.monotonic()
+        if stage == self._stage and now - self._written_at < PROGRESS_INTERVAL:
+            return
+        self._stage, self._written_at = stage, now
+        # Прогресс — best effort: сбой записи не должен ронять саму загрузку
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(IngestJob)
+                    .where(and_(IngestJob.id == self.job_id, IngestJob.status == "running"))
+                    .values(stage=stage, rows_processed=rows, heartbeat_at=datetime.now())
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Задача {self.job_id}: не удалось записать прогресс: {e}")
+
+
+_runner: Optional[JobRunner] = None
+
+
+def start_job_runner():
+    global _runner
+    _runner = JobRunner()
+    _runner.start()
+
+
+async def stop_job_runner():
+    if _runner is not None:
+        await _runner.stop()
+    shutdown_parse_executor()
+
+
+def notify_job_runner():
+    if _runner is not None:
+        _runner.notify()
@@ -0,0 +1,35 @@
+"""
+Блокировки записи на время транзакции, общие для всех процессов.
+
+PostgreSQL: pg_advisory_xact_lock — транзакция ждёт, пока ключ не отпустит
+другая транзакция (любого процесса API или скрипта), и держит его до
+commit/rollback. В SQLite запись и так сериализована блокировкой файла БД,
+поэтому там блокировки не берутся.
+"""
+from typing import Union
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+# Первая половина ключа pg_advisory_xact_lock(int, int): отделяет наши блокировки от чужих
+LOCK_NAMESPACE = 0x5757
+
+
+def object_lock_key(object_name: str) -> str:
+    """Ключ записи данных объекта (загрузка, перезапись, синхронизация Drive)"""
+    return f"object:{object_name}"
+
+
+def partition_lock_key(partition: str) -> str:
+    """Ключ создания секции таблицы"""
+    return f"partition:{partition}"
+
+
+async def advisory_xact_lock(db: Union[AsyncSession, AsyncConnection], key: str):
+    """Ждёт и берёт блокировку key до конца текущей транзакции db"""
+    dialect = db.bind.dialect if isinstance(db, AsyncSession) else db.dialect
+    if dialect.name != "postgresql":
+        return
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(:namespace, hashtext(:key))"),
+        {"namespace": LOCK_NAMESPACE, "key": key},
+    )
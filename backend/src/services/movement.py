@@ -0,0 +1,44 @@
+"""
+Перемещения между зонами по таймлайнам смен.
+
+Подряд идущие интервалы таймлайна одной зоны (в том числе разделённые
+разрывом данных) считаются одним пребыванием. Каждое пребывание
+заканчивается переходом в следующую зону смены или концом смены.
+Пребывания группируются по (сотрудник, день смены, откуда, куда) и хранятся в
+zone_transitions. Из этой таблицы одним сгруппированным запросом получаются
+матрица переходов, частые маршруты и среднее время пребывания в зоне.
+
+Переходы пересобираются вместе с таймлайном файла (services/timeline.py).
+"""
+import pandas as pd
+
+TRANSITION_COLUMNS = ["employee_id", "shift_day", "from_zone", "to_zone", "visits", "minutes"]
+
+
+def build_transitions(intervals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Интервалы таймлайна (отсортированные по сотруднику, дню смены и началу) ->
+    строки zone_transitions (колонки TRANSITION_COLUMNS).
+    """
+    if intervals.empty:
+        return pd.DataFrame(columns=TRANSITION_COLUMNS)
+
+    employee, day, zone = intervals["employee_id"], intervals["shift_day"], intervals["zone_id"]
+    same_shift = (employee == employee.shift()) & (day == day.shift())
+    visit = (~same_shift | (zone != zone.shift())).cumsum()
+
+    visits = intervals.groupby(visit, sort=False).agg(
+        employee_id=("employee_id", "first"),
+        shift_day=("shift_day", "first"),
+        from_zone=("zone_id", "first"),
+        minutes=("minutes", "sum"),
+    ).reset_index(drop=True)
+    next_same_shift = (
+        (visits["employee_id"] == visits["employee_id"].shift(-1))
+        & (visits["shift_day"] == visits["shift_day"].shift(-1))
+    )
+    visits["to_zone"] = visits["from_zone"].shift(-1).where(next_same_shift).astype("Int64")
+
+    return visits.groupby(
+        ["employee_id", "shift_day", "from_zone", "to_zone"], sort=False, dropna=False,
+    ).agg(visits=("minutes", "size"), minutes=("minutes", "sum")).reset_index()[TRANSITION_COLUMNS]
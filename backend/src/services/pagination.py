@@ -0,0 +1,130 @@
+"""
+Keyset-пагинация (курсоры) и потоковая выдача NDJSON для списков API.
+
+Страница выбирается условием «ключ сортировки после последней строки
+предыдущей страницы» (WHERE (k1, k2) > (:k1, :k2) ORDER BY k1, k2 LIMIT n),
+поэтому её стоимость не зависит от номера страницы, в отличие от OFFSET.
+Курсор — непрозрачная строка (base64 от JSON значений ключа последней строки).
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Optional, Sequence, Union
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import read_session
+
+MAX_PAGE_SIZE = 500
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: Sequence) -> list:
+    """Значения ключа из курсора; типы дат восстанавливаются по колонкам ключа"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [_restore(value, key) for value, key in zip(values, keys)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+def _restore(value, key):
+    python_type = key.type.python_type
+    if value is None or not isinstance(value, str):
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def _after(keys: Sequence, values: Sequence, descending: bool):
+    """
+    Условие «строго после values» в порядке сортировки keys.
+    Раскрыто в OR/AND, а не tuple_() > tuple_(): так работает и для DESC
+    и в любой СУБД. Ключи не должны быть NULL (последний — уникальный id).
+    """
+    clauses = []
+    for i, key in enumerate(keys):
+        step = key < values[i] if descending else key > values[i]
+        clauses.append(and_(*(keys[j] == values[j] for j in range(i)), step))
+    return or_(*clauses)
+
+
+def keyset(stmt: Select, keys: Sequence, cursor: Optional[str], limit: int, descending: bool = False) -> Select:
+    """Добавляет к запросу сортировку по keys, условие курсора и LIMIT (+1 строка — признак следующей страницы)"""
+    if cursor:
+        stmt = stmt.where(_after(keys, decode_cursor(cursor, keys), descending))
+    order = [key.desc() if descending else key for key in keys]
+    return stmt.order_by(*order).limit(limit + 1)
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt: Select,
+    keys: Sequence,
+    cursor: Optional[str],
+    limit: int,
+    to_dict: Callable[[Any], dict],
+    descending: bool = False,
+) -> dict:
+    """Одна страница: {"items": [...], "next_cursor": str | None}"""
+    rows = (await db.execute(keyset(stmt, keys, cursor, limit, descending))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+    return {"items": [to_dict(row) for row in rows], "next_cursor": next_cursor}
+
+
+def page_or_list(page: dict, cursor: Optional[str], limit: Optional[int]) -> Union[dict, list]:
+    """
+    Без cursor и limit — прежний ответ списков (массив строк первой страницы),
+    чтобы не сломать старых клиентов; с любым из них — страница {"items", "next_cursor"}.
+    """
+    return page if cursor is not None or limit is not None else page["items"]
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    """Экранирует %, _ и escape в пользовательском вводе для LIKE/ILIKE (... ESCAPE escape)"""
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
+
+
+def ndjson_response(
+    stmt: Select,
+    keys: Sequence,
+    cursor: Optional[str],
+    batch_size: int,
+    to_dict: Callable[[Any], dict],
+    descending: bool = False,
+) -> StreamingResponse:
+    """
+    Поток NDJSON (одна строка JSON на запись) по всем строкам после cursor.
+    Строки читаются страницами по batch_size короткими запросами в своей сессии
+    (сессия запроса к моменту отправки тела уже закрыта), память — O(batch_size).
+    """
+    if cursor:
+        decode_cursor(cursor, keys)  # 400 до начала потока, а не обрыв посередине
+
+    async def lines() -> AsyncIterator[bytes]:
+        page_cursor = cursor
+        while True:
+            async with read_session() as db:
+                page = await fetch_page(db, stmt, keys, page_cursor, batch_size, to_dict, descending)
+            for item in page["items"]:
+                yield (json.dumps(item, ensure_ascii=False, default=str) + "\n").encode()
+            page_cursor = page["next_cursor"]
+            if page_cursor is None:
+                break
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,136 @@
+"""
+Разбор xlsx вне event loop.
+
+Чтение листа (openpyxl) и нормализация pandas — CPU-работа на секунды (43k строк
+Report 11 — около 5 с). В event loop она останавливает HTTP-запросы и heartbeat
+фоновых задач, поэтому выполняется в пуле процессов (или, без пула, в потоке).
+Нормализованные пачки складываются в spool-файл на диске, а в памяти и в event
+loop остаётся только запись в БД: save_normalized читает пачки из spool по одной.
+Так разбор файла не занимает ни блокировку объекта, ни сессию БД.
+"""
+import asyncio
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Optional
+from src.config import get_settings
+from src.services.columnar import NormalizedFrame, normalize_report
+from src.services.report_schema import ReportSchema, log_schema, resolve_schema
+from src.services.xlsx_stream import SheetReader
+
+SPOOL_PREFIX = "workwatch-spool-"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def parse_to_spool(
+    content: bytes, report_type: str, default_type: str, chunk_size: Optional[int], streaming: bool, path: str,
+) -> dict:
+    """
+    Дочерний процесс (или поток): чтение листа только по колонкам схемы и
+    нормализация пачками. Пачки по одной пишутся pickle в path. Возвращает
+    схему, ширину листа, число пачек и время стадий read/normalize.
+    """
+    timings = {"read": 0.0, "normalize": 0.0}
+    started = time.perf_counter()
+    try:
+        with SheetReader(content, streaming=streaming) as sheet, open(path, "wb") as spool:
+            schema = resolve_schema(sheet.columns, report_type, default=default_type, log=False)
+            frames = sheet.chunks(chunk_size, schema.usecols)
+            chunks = 0
+            while True:
+                df = next(frames, None)
+                now = time.perf_counter()
+                timings["read"] += now - started
+                if df is None:
+                    break
+                normalized = normalize_report(schema.report_type, df, schema, projected=True)
+                pickle.dump(normalized, spool, pickle.HIGHEST_PROTOCOL)
+                chunks += 1
+                started = time.perf_counter()
+                timings["normalize"] += started - now
+    except Exception as e:
+        # Исключение передаётся текстом: не всякое исключение переживает pickle
+        raise RuntimeError(f"Ошибка разбора: {type(e).__name__}: {e}") from None
+    return {"schema": schema, "width": len(sheet.columns), "chunks": chunks, "timings": timings}
+
+
+@dataclass
+class SpooledReport:
+    """Разобранный файл: пачки NormalizedFrame в spool-файле (async-итератор для save_normalized)"""
+
+    path: str
+    schema: ReportSchema
+    width: int
+    chunks: int
+    timings: dict = field(default_factory=dict)
+
+    @property
+    def report_type(self) -> str:
+        return self.schema.report_type
+
+    async def __aiter__(self) -> AsyncIterator[NormalizedFrame]:
+        with open(self.path, "rb") as spool:
+            for _ in range(self.chunks):
+                yield await asyncio.to_thread(pickle.load, spool)
+
+    def discard(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def parse_report(
+    content: bytes,
+    default_type: str,
+    report_type: str = "auto",
+    chunk_size: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> SpooledReport:
+    """
+    Разбирает файл в spool вне event loop: в executor (пул процессов), а без него —
+    в потоке. Схема логируется здесь: в дочернем процессе логирование не настроено.
+    Spool удаляет вызывающий (SpooledReport.discard).
+    """
+    settings = get_settings()
+    streaming = settings.ingest_streaming
+    if streaming:
+        chunk_size = chunk_size or settings.ingest_chunk_size
+    else:
+        chunk_size = None
+    fd, path = tempfile.mkstemp(prefix=SPOOL_PREFIX, suffix=".pkl")
+    os.close(fd)
+    try:
+        args = (content, report_type, default_type, chunk_size, streaming, path)
+        if executor is None:
+            parsed = await asyncio.to_thread(parse_to_spool, *args)
+        else:
+            parsed = await asyncio.get_running_loop().run_in_executor(executor, parse_to_spool, *args)
+    except BaseException:
+        os.unlink(path)
+        raise
+    log_schema(parsed["schema"], parsed["width"])
+    return SpooledReport(path=path, **parsed)
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Общий для процесса пул разбора (фоновые задачи загрузки), создаётся при первом обращении"""
+    global _executor
+    if _executor is None:
+        # spawn: форк процесса с работающими потоками и event loop небезопасен
+        _executor = ProcessPoolExecutor(
+            max_workers=get_settings().sync_parse_workers, mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_parse_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,342 @@
+"""
+Кеш результатов эндпоинтов /api/stats.
+
+Каждая запись помнит свою область (object_name, date_from, date_to). Когда
+ReportParser фиксирует новый или перезаписанный файл, инвалидируются только
+записи, чья область пересекается с объектом и днями файла (записи без
+фильтра по объекту затрагивает любой файл).
+
+Результат, посчитанный во время инвалидации, не кешируется: перед compute()
+запоминается поколение области (счётчик инвалидаций её объекта), и если за время
+расчёта оно сменилось, запрос мог прочитать данные до commit загрузки.
+
+Бэкенды:
+  - memory — в процессе: TTL + LRU-вытеснение, лимиты по числу записей и байтам;
+  - redis  — общий для нескольких воркеров (нужен пакет redis), TTL средствами Redis.
+"""
+import asyncio
+import functools
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Iterable, Optional
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# (object_name | None, date_from, date_to)
+Scope = tuple[Optional[str], date, date]
+
+
+def _scope_overlaps(scope: Scope, object_name: Optional[str], day_from: date, day_to: date) -> bool:
+    entry_object, entry_from, entry_to = scope
+    if entry_object is not None and object_name is not None and entry_object != object_name:
+        return False
+    return entry_from <= day_to and day_from <= entry_to
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища записей кеша"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, scope: Scope, ttl: int):
+        ...
+
+    @abstractmethod
+    async def invalidate(self, object_name: Optional[str], day_from: date, day_to: date) -> int:
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+    @abstractmethod
+    async def generation(self, object_name: Optional[str]) -> Any:
+        """Поколение области объекта (None — все объекты): меняется при каждой затронувшей её инвалидации"""
+        ...
+
+    def info(self) -> dict:
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """In-process кеш: OrderedDict в порядке последнего доступа"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: OrderedDict[str, tuple[float, Scope, Any, int]] = OrderedDict()
+        # Объект (None — инвалидация без объекта) -> число инвалидаций; _generation — всего
+        self._generations: defaultdict[Optional[str], int] = defaultdict(int)
+        self._generation = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value, _ = entry
+        if expires_at < time.monotonic():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, scope: Scope, ttl: int):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._pop(key)
+        self._entries[key] = (time.monotonic() + ttl, scope, value, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def invalidate(self, object_name: Optional[str], day_from: date, day_to: date) -> int:
+        self._bump(object_name)
+        stale = [
+            key for key, (_, scope, _, _) in self._entries.items()
+            if _scope_overlaps(scope, object_name, day_from, day_to)
+        ]
+        for key in stale:
+            self._pop(key)
+        return len(stale)
+
+    async def clear(self):
+        self._bump(None)
+        self._entries.clear()
+        self._bytes = 0
+
+    async def generation(self, object_name: Optional[str]) -> Any:
+        if object_name is None:
+            return self._generation
+        return self._generations[object_name], self._generations[None]
+
+    def _bump(self, object_name: Optional[str]):
+        self._generation += 1
+        self._generations[object_name] += 1
+
+    def info(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+    def _pop(self, key: str):
+        *_, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+class RedisBackend(CacheBackend):
+    """
+    Общий кеш в Redis. Значения — JSON со сроком жизни (EX). Области записей —
+    в sorted set (член — [ключ, объект, с, по], score — момент истечения записи):
+    истёкшие члены вычищаются при каждой записи и инвалидации, а сам индекс
+    живёт не дольше самой поздней записи, поэтому он не растёт бесконечно.
+    LRU-вытеснение значений обеспечивает maxmemory-policy самого Redis.
+    Поколения областей — hash (объект -> число инвалидаций, "" — без объекта,
+    "*" — всего), общий для всех воркеров.
+    """
+
+    def __init__(self, url: str, prefix: str = "ww:stats:"):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("Для STATS_CACHE_BACKEND=redis нужен пакет redis") from e
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.scopes_key = f"{prefix}scope_index"
+        # Прежний индекс (hash без срока жизни): другой тип, поэтому новое имя; удаляется в clear()
+        self.legacy_scopes_key = f"{prefix}scopes"
+        self.generations_key = f"{prefix}generations"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, scope: Scope, ttl: int):
+        object_name, day_from, day_to = scope
+        now = time.time()
+        member = json.dumps([key, object_name, day_from.isoformat(), day_to.isoformat()])
+        pipe = self._redis.pipeline()
+        pipe.set(self.prefix + key, json.dumps(value, default=str), ex=ttl)
+        pipe.zadd(self.scopes_key, {member: now + ttl})
+        pipe.zremrangebyscore(self.scopes_key, "-inf", now)
+        # Индекс не переживает последнюю запись (ttl у всех записей одинаковый)
+        pipe.expire(self.scopes_key, ttl)
+        await pipe.execute()
+
+    async def _live_scopes(self) -> list[str]:
+        await self._redis.zremrangebyscore(self.scopes_key, "-inf", time.time())
+        return await self._redis.zrange(self.scopes_key, 0, -1)
+
+    async def invalidate(self, object_name: Optional[str], day_from: date, day_to: date) -> int:
+        await self._bump(object_name)
+        stale = []
+        for member in await self._live_scopes():
+            key, entry_object, entry_from, entry_to = json.loads(member)
+            scope = (entry_object, date.fromisoformat(entry_from), date.fromisoformat(entry_to))
+            if _scope_overlaps(scope, object_name, day_from, day_to):
+                stale.append((key, member))
+        if stale:
+            await self._redis.delete(*(self.prefix + key for key, _ in stale))
+            await self._redis.zrem(self.scopes_key, *(member for _, member in stale))
+        return len(stale)
+
+    async def clear(self):
+        await self._bump(None)
+        members = await self._redis.zrange(self.scopes_key, 0, -1)
+        if members:
+            await self._redis.delete(*(self.prefix + json.loads(m)[0] for m in members))
+        await self._redis.delete(self.scopes_key, self.legacy_scopes_key)
+
+    async def generation(self, object_name: Optional[str]) -> Any:
+        if object_name is None:
+            return await self._redis.hget(self.generations_key, "*")
+        return await self._redis.hmget(self.generations_key, [object_name, ""])
+
+    async def _bump(self, object_name: Optional[str]):
+        pipe = self._redis.pipeline()
+        pipe.hincrby(self.generations_key, "*", 1)
+        pipe.hincrby(self.generations_key, object_name or "", 1)
+        await pipe.execute()
+
+
+class QueryCache:
+    """Кеш со счётчиками попаданий/промахов поверх выбранного бэкенда"""
+
+    def __init__(self, backend: CacheBackend, ttl: int, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_skips = 0  # Результатов, не закешированных из-за инвалидации во время расчёта
+        self._delayed: set[asyncio.Task] = set()
+
+    async def get_or_compute(self, key: str, scope: Scope, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await compute()
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Stats cache get failed: {e}")
+            value = None
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        try:
+            generation = await self.backend.generation(scope[0])
+        except Exception as e:
+            logger.warning(f"Stats cache generation failed: {e}")
+            return await compute()
+        value = await compute()
+        try:
+            if await self.backend.generation(scope[0]) == generation:
+                await self.backend.set(key, value, scope, self.ttl)
+            else:
+                self.stale_skips += 1
+        except Exception as e:
+            logger.warning(f"Stats cache set failed: {e}")
+        return value
+
+    async def invalidate(self, object_name: Optional[str], day_from: Optional[date], day_to: Optional[date]):
+        """Сбрасывает записи, пересекающиеся с объектом и днями загруженного файла"""
+        if not self.enabled or day_from is None or day_to is None:
+            return
+        try:
+            removed = await self.backend.invalidate(object_name, day_from, day_to)
+        except Exception as e:
+            logger.warning(f"Stats cache invalidate failed, clearing: {e}")
+            await self.backend.clear()
+            return
+        self.invalidations += removed
+        if removed:
+            logger.info(f"Stats cache: сброшено {removed} записей ({object_name} {day_from}..{day_to})")
+
+    def invalidate_after(self, ready: Awaitable[bool], scopes: Iterable[tuple[Optional[str], Optional[date], Optional[date]]]):
+        """
+        Повторный сброс тех же областей, когда завершится ready (например, реплика догнала commit).
+        Пока реплика отстаёт, дашборды читают с неё старые данные и снова кешируют их.
+        Без повторного сброса эти данные жили бы в кеше весь TTL.
+        """
+        if not self.enabled:
+            ready.close()
+            return
+        task = asyncio.create_task(self._invalidate_when(ready, list(scopes)))
+        self._delayed.add(task)
+        task.add_done_callback(self._delayed.discard)
+
+    async def _invalidate_when(self, ready: Awaitable[bool], scopes: list):
+        try:
+            if not await ready:
+                logger.warning("Stats cache: реплика не догнала загрузку за отведённое время, сбрасываем кеш повторно")
+            for object_name, day_from, day_to in scopes:
+                await self.invalidate(object_name, day_from, day_to)
+        except Exception as e:
+            logger.warning(f"Stats cache delayed invalidate failed: {e}")
+
+    async def clear(self):
+        if self.enabled:
+            await self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "invalidated": self.invalidations,
+            "stale_skips": self.stale_skips,
+            **self.backend.info(),
+        }
+
+
+@functools.lru_cache
+def get_stats_cache() -> QueryCache:
+    settings = get_settings()
+    if settings.stats_cache_backend == "redis":
+        backend = RedisBackend(settings.stats_cache_redis_url)
+    else:
+        backend = MemoryBackend(settings.stats_cache_max_entries, settings.stats_cache_max_bytes)
+    return QueryCache(backend, ttl=settings.stats_cache_ttl_seconds, enabled=settings.stats_cache_enabled)
+
+
+def default_scope(params: dict) -> Scope:
+    """Область запроса с date_from/date_to (по умолчанию — последние 7 дней, как в эндпоинтах)"""
+    today = date.today()
+    return (
+        params.get("object_name"),
+        params.get("date_from") or today - timedelta(days=7),
+        params.get("date_to") or today,
+    )
+
+
+def cached(name: str, scope: Callable[[dict], Scope] = default_scope):
+    """
+    Декоратор эндпоинта: кеширует результат по имени и параметрам запроса (кроме db).
+    Сигнатура сохраняется через functools.wraps, поэтому FastAPI видит исходные параметры.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            params = {k: v for k, v in kwargs.items() if k != "db"}
+            entry_scope = scope(params)
+            key = name + ":" + json.dumps(
+                {**params, "_scope": [entry_scope[1], entry_scope[2]]}, sort_keys=True, default=str
+            )
+            return await get_stats_cache().get_or_compute(key, entry_scope, lambda: func(**kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+"""
+Пакетная запись справочников (сотрудники, BLE-метки, зоны).
+
+Вместо SELECT + UPDATE/INSERT на каждую строку листа: на пачку строк —
+один SELECT существующих значений по ключу и один
+INSERT ... ON CONFLICT (key) DO UPDATE только для новых и изменившихся строк.
+Условие WHERE ... IS DISTINCT FROM в ON CONFLICT страхует от лишних
+UPDATE, если строку параллельно записал кто-то ещё.
+"""
+import logging
+from sqlalchemy import or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_DIALECT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def dialect_insert(db: AsyncSession):
+    """insert() диалекта сессии (с on_conflict_do_update / on_conflict_do_nothing)"""
+    return _DIALECT_INSERTS[db.bind.dialect.name]
+
+
+async def upsert_reference(
+    db: AsyncSession,
+    model,
+    key: str,
+    rows: list[dict],
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """
+    Upsert строк справочника по уникальной колонке key.
+    Все строки должны иметь одинаковый набор колонок. При повторе ключа побеждает последняя строка.
+    Возвращает {"inserted", "updated", "unchanged"}. Commit делает вызывающий.
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not rows:
+        return counts
+
+    unique_rows = list({row[key]: row for row in rows}.values())
+    value_columns = [c for c in unique_rows[0] if c != key]
+    table = model.__table__
+    insert = dialect_insert(db)
+
+    for i in range(0, len(unique_rows), batch_size):
+        batch = unique_rows[i:i + batch_size]
+
+        stmt = select(table.c[key], *(table.c[c] for c in value_columns)).where(
+            table.c[key].in_([row[key] for row in batch])
+        )
+        existing = {r[0]: tuple(r[1:]) for r in await db.execute(stmt)}
+
+        changed = []
+        for row in batch:
+            current = existing.get(row[key])
+            if current is None:
+                counts["inserted"] += 1
+            elif current != tuple(row[c] for c in value_columns):
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            changed.append(row)
+
+        if not changed:
+            continue
+        stmt = insert(table).values(changed)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={c: stmt.excluded[c] for c in value_columns},
+            where=or_(*(table.c[c].is_distinct_from(stmt.excluded[c]) for c in value_columns)),
+        )
+        await db.execute(stmt)
+
+    logger.info(f"{table.name}: {counts}")
+    return counts
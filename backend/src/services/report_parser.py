@@ -1,28 +1,84 @@
-import io
+import asyncio
 import re
+import hashlib
 import logging
+import time
+from collections import defaultdict
+from concurrent.futures import Executor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+import numpy as np
 import pandas as pd
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, insert
-from src.models import Employee, Shift, Downtime, BleLog, BleTag, Zone, ProcessedFile
+from sqlalchemy import delete, select, update, insert
+from src.models import Employee, Shift, Downtime, BleLog, BleInterval, BleTag, Zone, ProcessedFile
 from src.gdrive import DriveService
 from src.config import get_settings
+from src.core import metrics
+from src.database import primary_wal_position, wait_for_replica
+from src.services import ble_store
+from src.services.archive import archived_months
+from src.services.bulk_loader import BulkLoader
+from src.services.file_rows import delete_processed_file
+from src.services.locks import advisory_xact_lock, object_lock_key
+from src.services.row_diff import RowDiff
+from src.services.rollups import file_day_range, refresh_rollups
+from src.services.columnar import NormalizedFrame, to_int
+from src.services.query_cache import get_stats_cache
+from src.services.reference_sync import upsert_reference
+from src.services.parse_worker import parse_report
+from src.services.schema import ensure_ble_logs_partitions, forget_ble_logs_partitions
+from src.services.downtime_hours import rebuild_file_downtime_hours
+from src.services.employee_resolver import get_employee_resolver, invalidate_employees
+from src.services.timeline import rebuild_file_timeline
 
 logger = logging.getLogger(__name__)
 
+# Тип отчёта -> таблица, в которую загружаются его строки
+REPORT_MODELS = {
+    "report8": Shift,
+    "report10": Downtime,
+    "report11": BleLog,
+}
+
+# Колонка, по которой строка относится к дню (для daily_rollups)
+DAY_COLUMNS = {
+    "report8": "date",
+    "report10": "dt_start",
+    "report11": "shift_day",
+}
+
+
+async def _iterate(chunks: Union[Iterable, AsyncIterable]) -> AsyncIterator:
+    """Пачки из обычного (parse_and_save) или асинхронного (конвейер Drive) источника"""
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
 
 class ReportParser:
     """Парсер Excel-отчётов Report 8/10/11 с автоматической синхронизацией справочников"""
 
+    DUPLICATE_RESULT = {"report_type": "skipped", "records_count": 0, "status": "duplicate"}
+
     def __init__(self, db: AsyncSession):
         self.db = db
         self.drive_service = DriveService()
         self.settings = get_settings()
-        self._employee_cache = {}  # tn_number -> EmployeeId
-
-    async def seed_zones(self):
+        self._employees = get_employee_resolver()  # Общий для процесса кеш tn_number -> EmployeeId
+        self.rejected = None  # Сводка отклонённых строк последнего файла
+        self._day_range = (None, None)  # Дни, затронутые текущим файлом
+        self.timings = defaultdict(float)  # Стадия -> секунды для последнего файла
+        self._row_diff_enabled = False  # Перезапись текущего файла построчным diff
+        self._row_diff = None  # RowDiff текущего файла (создаётся по первой пачке)
+        # async (stage, rows_processed) -> None: прогресс для фоновых задач (IngestJob)
+        self.on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None
+
+    async def seed_zones(self) -> dict:
         """Начальная загрузка справочника зон из документации"""
         zones_data = {
             0: "Вне зоны BLE-маячков",
@@ -41,78 +97,85 @@ class ReportParser:
             13: "КПП",
         }
         
-        for zid, name in zones_data.items():
-            stmt = select(Zone).where(Zone.zone_id == zid)
-            res = await self.db.execute(stmt)
-            zone = res.scalar_one_or_none()
-            if zone:
-                zone.name = name
-            else:
-                self.db.add(Zone(zone_id=zid, name=name))
-        
+        counts = await upsert_reference(
+            self.db, Zone, "zone_id",
+            [{"zone_id": zid, "name": name} for zid, name in zones_data.items()],
+        )
         await self.db.commit()
+        return counts
+
+    async def sync_reference_data(self) -> dict:
+        """
+        Синхронизация справочников из Google Sheets.
+        Возвращает счётчики inserted/updated/unchanged по каждому справочнику.
+        """
+        started = time.perf_counter()
+        result = {"zones": await self.seed_zones()}
 
-    async def sync_reference_data(self):
-        """Синхронизация справочников из Google Sheets"""
-        await self.seed_zones()
-        
         # 1. Синхронизация сотрудников (People Mapping)
         if self.settings.sheet_id_people_mapping:
-            df_people = self.drive_service.download_sheet_as_df(self.settings.sheet_id_people_mapping)
-            if not df_people.empty:
-                # Маппинг колонок (эвристика)
-                headers = [str(c).strip().lower() for c in df_people.columns]
-                idx_tn = next((i for i, h in enumerate(headers) if any(k in h for k in ['тн', 'табель', 'tab'])), None)
-                idx_name = next((i for i, h in enumerate(headers) if any(k in h for k in ['фио', 'сотрудник', 'name'])), None)
-                idx_dept = next((i for i, h in enumerate(headers) if any(k in h for k in ['участок', 'отдел', 'dept'])), None)
-                
-                if idx_tn is not None:
-                    for _, row in df_people.iterrows():
-                        try:
-                            tn = self._to_int(row.iloc[idx_tn])
-                            if not tn: continue
-                            name = str(row.iloc[idx_name]) if idx_name is not None else "Unknown"
-                            dept = str(row.iloc[idx_dept]) if idx_dept is not None else None
-                            
-                            await self._upsert_employee(tn, name, dept)
-                        except Exception: continue
+            df_people = await asyncio.to_thread(
+                self.drive_service.download_sheet_as_df, self.settings.sheet_id_people_mapping
+            )
+            rows = self._employee_rows(df_people)
+            result["employees"] = await upsert_reference(self.db, Employee, "tn_number", rows)
+            if result["employees"]["inserted"] or result["employees"]["updated"]:
+                # Кеш tn_number -> id в процессах, которые грузят отчёты, сбрасывается тем же commit
+                await invalidate_employees(self.db)
 
         # 2. Синхронизация BLE меток (Journal)
         if self.settings.sheet_id_ble_journal:
-            df_ble = self.drive_service.download_sheet_as_df(self.settings.sheet_id_ble_journal)
-            if not df_ble.empty:
-                # Обычно: A - Номер, D - Описание
-                for _, row in df_ble.iterrows():
-                    try:
-                        tag_num = self._to_int(row.iloc[0])
-                        if not tag_num: continue
-                        desc = str(row.iloc[3]) if len(row) > 3 else str(row.iloc[1])
-                        
-                        await self._upsert_ble_tag(tag_num, desc)
-                    except Exception: continue
-        
-        await self.db.commit()
+            df_ble = await asyncio.to_thread(
+                self.drive_service.download_sheet_as_df, self.settings.sheet_id_ble_journal
+            )
+            rows = self._ble_tag_rows(df_ble)
+            result["ble_tags"] = await upsert_reference(self.db, BleTag, "tag_number", rows)
 
-    async def _upsert_employee(self, tn: int, name: str, dept: Optional[str]):
-        stmt = select(Employee).where(Employee.tn_number == tn)
-        res = await self.db.execute(stmt)
-        employee = res.scalar_one_or_none()
-        
-        if employee:
-            employee.name = name
-            employee.department = dept
-        else:
-            self.db.add(Employee(tn_number=tn, name=name, department=dept))
-
-    async def _upsert_ble_tag(self, tag_num: int, desc: str):
-        stmt = select(BleTag).where(BleTag.tag_number == tag_num)
-        res = await self.db.execute(stmt)
-        tag = res.scalar_one_or_none()
-        
-        if tag:
-            tag.description = desc
-        else:
-            self.db.add(BleTag(tag_number=tag_num, description=desc))
+        await self.db.commit()
+        metrics.SYNC_SECONDS.observe(time.perf_counter() - started, kind="references")
+        metrics.SYNC_RUNS.inc(kind="references", status="success")
+
+        # Имена и участки сотрудников попадают в ответы /api/stats
+        if result.get("employees", {}).get("updated"):
+            await get_stats_cache().clear()
+        return result
+
+    def _employee_rows(self, df_people: pd.DataFrame) -> list[dict]:
+        """Строки листа People Mapping -> {tn_number, name, department}"""
+        if df_people.empty:
+            return []
+        # Маппинг колонок (эвристика)
+        headers = [str(c).strip().lower() for c in df_people.columns]
+        idx_tn = next((i for i, h in enumerate(headers) if any(k in h for k in ['тн', 'табель', 'tab'])), None)
+        idx_name = next((i for i, h in enumerate(headers) if any(k in h for k in ['фио', 'сотрудник', 'name'])), None)
+        idx_dept = next((i for i, h in enumerate(headers) if any(k in h for k in ['участок', 'отдел', 'dept'])), None)
+        if idx_tn is None:
+            return []
+
+        rows = []
+        for values in df_people.itertuples(index=False):
+            tn = self._to_int(values[idx_tn])
+            if not tn:
+                continue
+            rows.append({
+                "tn_number": tn,
+                "name": str(values[idx_name]) if idx_name is not None else "Unknown",
+                "department": str(values[idx_dept]) if idx_dept is not None else None,
+            })
+        return rows
+
+    def _ble_tag_rows(self, df_ble: pd.DataFrame) -> list[dict]:
+        """Строки журнала BLE -> {tag_number, description}. Обычно: A - Номер, D - Описание"""
+        if df_ble.empty:
+            return []
+        desc_idx = 3 if df_ble.shape[1] > 3 else 1
+        rows = []
+        for values in df_ble.itertuples(index=False):
+            tag_num = self._to_int(values[0])
+            if not tag_num:
+                continue
+            rows.append({"tag_number": tag_num, "description": str(values[desc_idx])})
+        return rows
 
     async def parse_and_save(
         self,
@@ -121,10 +184,87 @@ class ReportParser:
         drive_file_id: Optional[str] = None,
         report_type: str = "auto",
         sync_refs: bool = True,
+        chunk_size: Optional[int] = None,
+        executor: Optional[Executor] = None,
     ) -> dict:
-        import hashlib
+        """
+        Загрузка файла целиком. executor — пул процессов для разбора (фоновые задачи);
+        без него разбор идёт в потоке.
+        """
         content_hash = hashlib.md5(content).hexdigest()
 
+        if await self.is_duplicate(filename, content_hash):
+            logger.info(f"SKIP: {filename} - дубликат (хеш совпадает)")
+            metrics.INGEST_FILES.inc(report_type="skipped", status="duplicate")
+            return self.DUPLICATE_RESULT
+
+        if sync_refs:
+            await self.sync_reference_data()
+
+        # Разбор (чтение листа и нормализация) — вне event loop, в пуле процессов или в потоке;
+        # здесь остаётся только запись пачек из spool
+        report = await parse_report(
+            content, default_type=self._detect_report_type(filename, "auto"),
+            report_type=report_type, chunk_size=chunk_size, executor=executor,
+        )
+        try:
+            object_name = self._extract_object_name(filename)
+            logger.info(f"Report type detected: {report.report_type} for {filename}, Object: {object_name}")
+            return await self.save_normalized(
+                report,
+                filename=filename,
+                content_hash=content_hash,
+                report_type=report.report_type,
+                object_name=object_name,
+                drive_file_id=drive_file_id,
+                timings=report.timings,
+            )
+        finally:
+            report.discard()
+
+    async def is_duplicate(self, filename: str, content_hash: str) -> bool:
+        """Файл с таким именем и содержимым уже загружен"""
+        stmt = select(ProcessedFile.id).where(
+            ProcessedFile.filename == filename,
+            ProcessedFile.content_hash == content_hash,
+        )
+        res = await self.db.execute(stmt)
+        return res.first() is not None
+
+    async def save_normalized(
+        self,
+        chunks: Union[Iterable[NormalizedFrame], AsyncIterable[NormalizedFrame]],
+        filename: str,
+        content_hash: str,
+        report_type: str,
+        object_name: str,
+        drive_file_id: Optional[str] = None,
+        timings: Optional[dict] = None,
+    ) -> dict:
+        """
+        Сохраняет уже нормализованные пачки строк файла одной транзакцией.
+        Используется parse_and_save и конвейером синхронизации: пачки читаются из
+        spool, подготовленного parse_report (разбор в отдельном процессе).
+        timings — время стадий, измеренное до вызова (read, normalize).
+        """
+        if report_type not in REPORT_MODELS:
+            raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+        self.rejected = {"total": 0, "by_reason": {}, "sample_rows": []}
+        self._day_range = (None, None)
+        self.timings = defaultdict(float, timings or {})
+        self._row_diff_enabled = False
+        self._row_diff = None
+        rollup_ranges = []  # (object_name, day_from, day_to) для пересчёта daily_rollups
+
+        # Записи одного объекта (загрузка, синхронизация Drive, любой процесс) идут строго по одной:
+        # иначе перезаписи одного файла и пересчёт daily_rollups объекта пересекаются
+        with self._timed("lock"):
+            await advisory_xact_lock(self.db, object_lock_key(object_name))
+        # Закрытые месяцы живут только в Parquet-архиве: их строки в БД не пишутся
+        self._archived = np.array(sorted(await archived_months(self.db)), dtype="datetime64[M]")
+        # Версия кеша сотрудников — один раз на файл, а не на каждую пачку
+        await self._employees.check_version(self.db)
+
         # 1. Ищем существующий файл по ИМЕНИ (так как при перезаливке ID может не меняться или меняться)
         # Нам нужно перезаписывать данные, если имя совпадает, а контент разный.
         stmt = select(ProcessedFile).where(ProcessedFile.filename == filename)
@@ -135,66 +275,112 @@ class ReportParser:
             # Если хеш совпадает — это полный дубль, пропускаем
             if existing_file.content_hash == content_hash:
                 logger.info(f"SKIP: {filename} - дубликат (хеш совпадает)")
-                return {"report_type": "skipped", "records_count": 0, "status": "duplicate"}
-            
-            # Если хеш отличается — удаляем старую запись (Cascade удалит и данные)
-            logger.info(f"OVERWRITE: {filename} - хеш изменился, перезаписываем")
-            await self.db.delete(existing_file)
-            await self.db.flush()
+                metrics.INGEST_FILES.inc(report_type="skipped", status="duplicate")
+                return self.DUPLICATE_RESULT
+
+            old_from, old_to = await file_day_range(self.db, existing_file)
+            rollup_ranges.append((existing_file.object_name, old_from, old_to))
+            if await self._can_diff(existing_file, report_type):
+                # Хеш отличается, но строки в основном те же — применяем только разницу
+                logger.info(f"DIFF: {filename} - хеш изменился, сравниваем строки")
+                self._row_diff_enabled = True
+            else:
+                # Если хеш отличается — удаляем старую запись и её строки (set-based, в этой же транзакции)
+                logger.info(f"OVERWRITE: {filename} - хеш изменился, перезаписываем")
+                with self._timed("delete"):
+                    await delete_processed_file(self.db, existing_file)
         else:
             logger.info(f"NEW FILE: {filename}")
 
-        if sync_refs:
-            await self.sync_reference_data()
-            
-        report_type = self._detect_report_type(filename, report_type)
-        object_name = self._extract_object_name(filename)
-        logger.info(f"Report type detected: {report_type} for {filename}, Object: {object_name}")
-
-        # Инициализируем ExcelFile перед работой с листами
-        xls = pd.ExcelFile(io.BytesIO(content))
-        
-        # Все отчеты (8, 10, 11) содержат данные на ВТОРОМ листе (index 1).
-        # Если второго листа нет, берем первый.
-        sheet_index = 1 
-        sheet_name = xls.sheet_names[sheet_index] if len(xls.sheet_names) > sheet_index else xls.sheet_names[0]
-        logger.info(f"Reading sheet '{sheet_name}' (index {sheet_index}) from {filename}")
-        df = xls.parse(sheet_name)
-        logger.info(f"DataFrame shape: {df.shape}, columns: {list(df.columns)[:10]}...")
-        if not df.empty:
-            logger.info(f"First row sample: {dict(df.iloc[0])}")
-
         # Используем content_hash как уникальный ID для идемпотентности, 
         # или drive_file_id если он есть, но для внутреннего учета.
         final_file_id = drive_file_id if drive_file_id else f"{filename}_{datetime.now().timestamp()}"
 
-        processed = ProcessedFile(
-            file_id=final_file_id,
-            filename=filename,
-            content_hash=content_hash,
-            report_type=report_type,
-            object_name=object_name,
-            processed_at=datetime.now(),
-            records_count=0, # Будет обновлено ниже
-        )
-        self.db.add(processed)
+        if self._row_diff_enabled:
+            processed = existing_file
+            processed.file_id = final_file_id
+            processed.content_hash = content_hash
+            processed.object_name = object_name
+            processed.processed_at = datetime.now()
+        else:
+            processed = ProcessedFile(
+                file_id=final_file_id,
+                filename=filename,
+                content_hash=content_hash,
+                report_type=report_type,
+                object_name=object_name,
+                processed_at=datetime.now(),
+                records_count=0, # Будет обновлено ниже
+            )
+            self.db.add(processed)
         await self.db.flush()  # Чтобы получить processed.id
 
-        if report_type == "report8":
-            records_count = await self._parse_report8(df, processed.id)
-        elif report_type == "report10":
-            records_count = await self._parse_report10(df, processed.id)
-        elif report_type == "report11":
-            records_count = await self._parse_report11(df, processed.id)
-        else:
-            raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+        records_count = 0
+        async for normalized in _iterate(chunks):
+            records_count += await self._ingest(report_type, normalized, processed.id)
+            await self._report_progress("insert", records_count)
+        diff_summary = await self._finish_row_diff(report_type, processed.id)
 
         processed.records_count = records_count
-        await self.db.commit()
+        if report_type == "report11":
+            await self._report_progress("timeline", records_count)
+            with self._timed("timeline"):
+                await rebuild_file_timeline(self.db, processed.id)
+        elif report_type == "report10":
+            with self._timed("downtime_hours"):
+                await rebuild_file_downtime_hours(self.db, processed.id)
+        rollup_ranges.append((object_name, *self._day_range))
+        await self._report_progress("rollups", records_count)
+        with self._timed("rollups"):
+            for rollup_object, day_from, day_to in rollup_ranges:
+                await refresh_rollups(self.db, rollup_object, day_from, day_to)
+        with self._timed("commit"):
+            await self.db.commit()
+
+        # Сбрасываем кеш статистики только по затронутым объектам и дням
+        for rollup_object, day_from, day_to in rollup_ranges:
+            await get_stats_cache().invalidate(rollup_object, day_from, day_to)
+        # С репликой — ещё раз, когда она догонит этот commit: до этого дашборды кешируют старые данные
+        position = await primary_wal_position(self.db)
+        if position is not None:
+            get_stats_cache().invalidate_after(
+                wait_for_replica(position, self.settings.replica_max_lag_seconds), rollup_ranges,
+            )
+
+        status = "diffed" if diff_summary else "overwritten" if existing_file else "processed"
+        metrics.INGEST_FILES.inc(report_type=report_type, status=status)
+        metrics.observe_stage_timings(report_type, self.timings)
+        logger.info(
+            f"{filename}: {records_count} строк, отклонено {self.rejected['total']}, "
+            f"стадии: " + ", ".join(f"{k}={v:.2f}s" for k, v in self.timings.items())
+        )
+
+        return {
+            "report_type": report_type,
+            "records_count": records_count,
+            "status": status,
+            "rejected": self.rejected,
+            "diff": diff_summary,
+            "processed_file_id": processed.id,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+
+    async def _report_progress(self, stage: str, rows: int):
+        if self.on_progress is not None:
+            await self.on_progress(stage, rows)
 
-        return {"report_type": report_type, "records_count": records_count, "status": "processed"}
+    @contextmanager
+    def _timed(self, stage: str):
+        """Накапливает время стадии обработки файла в self.timings"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - started
 
-    def _detect_report_type(self, filename: str, hint: str) -> str:
+    @staticmethod
+    def _detect_report_type(filename: str, hint: str) -> str:
+        """Тип отчёта по имени файла (если заголовок листа не распознан, см. report_schema)"""
         if hint != "auto":
             return hint
 
@@ -215,7 +401,8 @@ class ReportParser:
 
         return "report10"
 
-    def _extract_object_name(self, filename: str) -> str:
+    @staticmethod
+    def _extract_object_name(filename: str) -> str:
         """Извлекает имя объекта из названия файла.
            Ожидаемый формат: ..._OBJNAME_... 
            Например: 11_отчет по АА_BLE со склейкой_MAGNIT_LOMONOSOV_!NEW!_... -> MAGNIT_LOMONOSOV
@@ -233,231 +420,138 @@ class ReportParser:
             
         return "Unknown"
 
-    async def _load_employee_cache(self):
-        """Предзагрузка всех сотрудников в кеш"""
-        stmt = select(Employee.id, Employee.tn_number)
-        result = await self.db.execute(stmt)
-        for row in result:
-            self._employee_cache[row.tn_number] = row.id
-
-    async def _get_or_create_employee_id(self, tn_number: int, name: str) -> int:
-        """Получает ID сотрудника из кеша или создает нового"""
-        if tn_number in self._employee_cache:
-            return self._employee_cache[tn_number]
-
-        # Если нет в кеше, ищем в БД (на случай если добавили в процессе)
-        stmt = select(Employee.id).where(Employee.tn_number == tn_number)
-        result = await self.db.execute(stmt)
-        emp_id = result.scalar_one_or_none()
-
-        if not emp_id:
-            employee = Employee(tn_number=tn_number, name=name)
-            self.db.add(employee)
-            await self.db.flush()
-            emp_id = employee.id
-
-        self._employee_cache[tn_number] = emp_id
-        return emp_id
-
-    async def _parse_report8(self, df: pd.DataFrame, processed_file_id: int) -> int:
-        """Парсинг Report 8 (смены) с использованием Bulk Insert"""
-        await self._load_employee_cache()
-        df = self._normalize_columns(df)
-        records = df.to_dict('records')
-        
-        objs = []
-        for row in records:
-            try:
-                tn = self._extract_tn(row)
-                if not tn: continue
-
-                date_val = self._parse_date(row.get("date"))
-                date_begin = self._parse_datetime(row.get("date_begin"))
-                date_end = self._parse_datetime(row.get("date_end"))
-
-                if not date_val or not date_begin or not date_end:
-                    continue
-
-                emp_id = await self._get_or_create_employee_id(tn, str(row.get("ФИО", "Unknown")))
-
-                objs.append(Shift(
-                    employee_id=emp_id,
-                    processed_file_id=processed_file_id,
-                    date=date_val,
-                    date_begin=date_begin,
-                    date_end=date_end,
-                    full_go_percent=self._to_float(row.get("full_go")),
-                    full_idle_percent=self._to_float(row.get("full_idle")),
-                    full_work_percent=self._to_float(row.get("full_work")),
-                    full_go_seconds=self._to_int(row.get("full_go_seconds")),
-                    full_idle_seconds=self._to_int(row.get("full_idle_seconds")),
-                    full_work_seconds=self._to_int(row.get("full_work_seconds")),
-                ))
-            except Exception:
-                continue
-
-        if objs:
-            self.db.add_all(objs)
-            await self.db.commit()
-        return len(objs)
-
-    async def _parse_report10(self, df: pd.DataFrame, processed_file_id: int) -> int:
-        """Парсинг Report 10 (простои) с использованием Bulk Insert"""
-        await self._load_employee_cache()
-        df = self._normalize_columns(df)
-        records = df.to_dict('records')
-        
-        objs = []
-        for row in records:
-            try:
-                tn = self._extract_tn(row)
-                if not tn: continue
-
-                dt_start = self._parse_datetime(row.get("dt_start"))
-                dt_end = self._parse_datetime(row.get("dt_end"))
-
-                if not dt_start or not dt_end:
-                    continue
-
-                emp_id = await self._get_or_create_employee_id(tn, str(row.get("ФИО", "Unknown")))
-
-                objs.append(Downtime(
-                    employee_id=emp_id,
-                    processed_file_id=processed_file_id,
-                    dt_start=dt_start,
-                    dt_end=dt_end,
-                    duration_minutes=self._to_int(row.get("duration", 0)),
-                    ble_tag_id=self._to_int(row.get("chosen_ble_tag_number")),
-                ))
-            except Exception:
-                continue
-
-        if objs:
-            self.db.add_all(objs)
-            await self.db.commit()
-        return len(objs)
-
-    async def _parse_report11(self, df: pd.DataFrame, processed_file_id: int) -> int:
-        """Парсинг Report 11 (BLE логи) с использованием Bulk Insert"""
-        await self._load_employee_cache()
-        df = self._normalize_columns(df)
-        records = df.to_dict('records')
-        
-        objs = []
-        for row in records:
-            try:
-                tn = self._extract_tn(row)
-                if not tn: continue
-                
-                shift_day = self._parse_date(row.get("shift_day"))
-                time_only_raw = row.get("time_only")
-                time_only = self._parse_datetime(time_only_raw)
-
-                if not shift_day or not time_only:
-                    continue
-
-                ble_tag_val = self._to_int(row.get("ble_tag"))
-                if ble_tag_val is None:
-                    continue
-
-                emp_id = await self._get_or_create_employee_id(tn, "Unknown")
-                full_time = datetime.combine(shift_day, time_only.time())
-
-                objs.append(BleLog(
-                    employee_id=emp_id,
-                    processed_file_id=processed_file_id,
-                    shift_day=shift_day,
-                    time_only=full_time,
-                    ble_tag=ble_tag_val,
-                    zone_id=self._to_int(row.get("zone_id")) or 1,
-                ))
-            except Exception:
-                continue
-
-        if objs:
-            self.db.add_all(objs)
-            await self.db.commit()
-        return len(objs)
-
-    def _normalize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        rename_map = {}
-        lower_map = {str(c).strip().lower(): c for c in df.columns}
-
-        mappings = {
-            "тн": "tn",
-            "табельный номер": "tn",
-            "фио": "ФИО",
-            "dt_start": "dt_start",
-            "начало простоя": "dt_start",
-            "dt_end": "dt_end",
-            "конец простоя": "dt_end",
-            "duration": "duration",
-            "длительность": "duration",
-            "chosen_ble_tag_number": "chosen_ble_tag_number",
-            # Report 11 mappings - исправленные на реальные названия из Excel
-            "день смены": "shift_day",
-            "shift_day": "shift_day",
-            "время на объекте": "time_only",  # ИСПРАВЛЕНО: было "время"
-            "время": "time_only",
-            "time_only": "time_only",
-            "metka": "ble_tag",               # ДОБАВЛЕНО: реальное название
-            "метка": "ble_tag",
-            "ble_tag": "ble_tag",
-            "zona": "zone_id",                # ДОБАВЛЕНО: реальное название
-            "зона": "zone_id",
-            "zone_id": "zone_id",
-        }
-
-        for key, target in mappings.items():
-            if key in lower_map:
-                rename_map[lower_map[key]] = target
-
-        return df.rename(columns=rename_map)
-
-    def _extract_tn(self, row) -> Optional[int]:
-        for key in ["tn", "тн", "ТН", "табельный номер"]:
-            val = row.get(key)
-            if pd.notna(val):
-                return self._to_int(val)
-        return None
-
-    def _parse_date(self, val):
-        if pd.isna(val):
-            return None
-        if isinstance(val, datetime):
-            return val.date()
+    async def _resolve_employee_ids(self, tn_numbers: list[int], names: Optional[dict] = None) -> dict:
+        """tn_number -> EmployeeId через общий кеш; в БД — только отсутствующие в нём (см. employee_resolver)"""
+        return await self._employees.resolve(self.db, tn_numbers, names)
+
+    async def _ingest(self, report_type: str, normalized: NormalizedFrame, processed_file_id: int) -> int:
+        """Разрешает сотрудников пакетно и загружает нормализованные строки через BulkLoader"""
+        summary = normalized.rejected_summary()
+        self._merge_rejected(report_type, summary)
+        frame = self._drop_archived(report_type, normalized.frame)
+        rejected = summary["total"] + len(normalized.frame) - len(frame)
+        metrics.INGEST_ROWS.inc(len(normalized.frame) + summary["total"], report_type=report_type, outcome="read")
+        metrics.INGEST_ROWS.inc(len(frame), report_type=report_type, outcome="accepted")
+        metrics.INGEST_ROWS.inc(rejected, report_type=report_type, outcome="rejected")
+
+        if frame.empty:
+            return 0
+        days = frame[DAY_COLUMNS[report_type]]
+        self._extend_day_range(days)
+        compress = report_type == "report11" and ble_store.uses_intervals(self.settings.ble_storage)
+        if report_type == "report11" and not compress:
+            await ensure_ble_logs_partitions(self.db, days.min().date(), days.max().date())
+
+        names = {}
+        if "name" in frame.columns:
+            names = frame.drop_duplicates("tn").set_index("tn")["name"].to_dict()
+        with self._timed("resolve"):
+            emp_ids = await self._resolve_employee_ids(frame["tn"].unique().tolist(), names)
+
+        employee_ids = frame["tn"].map(emp_ids)
+        frame = frame.drop(columns=[c for c in ("tn", "name") if c in frame.columns])
+        frame.insert(0, "employee_id", employee_ids)
+
+        if compress:
+            with self._timed("encode"):
+                runs = ble_store.encode_runs(frame)
+            with self._timed("insert"):
+                await BulkLoader(self.db).load(BleInterval, runs, processed_file_id=processed_file_id)
+            logger.debug(f"report11: {len(frame)} строк -> {len(runs)} серий ble_intervals")
+            return len(frame)
+
+        model = REPORT_MODELS[report_type]
+        if self._row_diff_enabled:
+            with self._timed("diff"):
+                if self._row_diff is None:
+                    self._row_diff = await RowDiff.load(self.db, model, processed_file_id, list(frame.columns))
+                added = self._row_diff.split(frame)
+            with self._timed("insert"):
+                await self._load_rows(model, added, processed_file_id)
+            return len(frame)
+
+        with self._timed("insert"):
+            return await self._load_rows(model, frame, processed_file_id)
+
+    async def _load_rows(self, model, frame: pd.DataFrame, processed_file_id: int) -> int:
         try:
-            return pd.to_datetime(val, dayfirst=True).date()
+            return await BulkLoader(self.db).load(model, frame, processed_file_id=processed_file_id)
         except Exception:
-            return None
+            # COPY (asyncpg) поднимает ошибки драйвера, не обёрнутые SQLAlchemy
+            if model is BleLog:
+                # Секцию могли отсоединить или таблицу перевести в секции из другого процесса:
+                # повтор задачи проверит секции заново
+                forget_ble_logs_partitions()
+            raise
+
+    async def _can_diff(self, existing_file: ProcessedFile, report_type: str) -> bool:
+        """
+        Построчный diff возможен, если файл того же типа и его строки лежат
+        построчно (серии ble_intervals пересобираются из всего файла — там полная перезапись).
+        """
+        if self.settings.overwrite_mode != "diff" or existing_file.report_type != report_type:
+            return False
+        if report_type != "report11":
+            return True
+        if ble_store.uses_intervals(self.settings.ble_storage):
+            return False
+        stored_as_runs = await self.db.execute(
+            select(BleInterval.id).where(BleInterval.processed_file_id == existing_file.id).limit(1)
+        )
+        return stored_as_runs.first() is None
 
-    def _parse_datetime(self, val):
-        if pd.isna(val):
-            return None
-        if isinstance(val, datetime):
-            return val
-        try:
-            str_val = str(val).strip()
-            # Обработка формата HH:MM (только время без даты)
-            if re.match(r'^\d{1,2}:\d{2}$', str_val):
-                # Парсим как время, добавляем фиктивную дату (будет заменена позже)
-                return datetime.strptime(str_val, '%H:%M')
-            return pd.to_datetime(val, dayfirst=True)
-        except Exception:
+    async def _finish_row_diff(self, report_type: str, processed_file_id: int) -> Optional[dict]:
+        """Удаляет строки, которых нет в новой версии файла; сводка diff или None (не diff)"""
+        if not self._row_diff_enabled:
             return None
+        model = REPORT_MODELS[report_type]
+        with self._timed("diff"):
+            if self._row_diff is None:
+                # В новой версии нет ни одной строки — старые удаляются целиком
+                removed = (await self.db.execute(delete(model).where(model.processed_file_id == processed_file_id))).rowcount
+                summary = {"added": 0, "removed": removed, "unchanged": 0}
+            else:
+                await self._row_diff.delete_removed(self.db)
+                summary = self._row_diff.summary()
+        logger.info(f"DIFF: +{summary['added']} -{summary['removed']} ={summary['unchanged']}")
+        return summary
 
-    def _to_float(self, val) -> Optional[float]:
-        if pd.isna(val):
-            return None
-        try:
-            return float(str(val).replace(",", "."))
-        except Exception:
-            return None
+    def _drop_archived(self, report_type: str, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Убирает строки архивированных месяцев (отклонены с причиной archived_month).
+        Такие строки сложились бы с архивом в /api/stats, а обновить сам архив загрузка не может.
+        """
+        if not len(self._archived) or frame.empty:
+            return frame
+        months = frame[DAY_COLUMNS[report_type]].to_numpy().astype("datetime64[M]")
+        archived = np.isin(months, self._archived)
+        count = int(archived.sum())
+        if not count:
+            return frame
+        logger.warning(f"{report_type}: {count} строк за архивированные месяцы не загружены")
+        self._merge_rejected(report_type, {
+            "total": count,
+            "by_reason": {"archived_month": count},
+            "sample_rows": [int(r) for r in frame.index[archived][:20]],
+        })
+        return frame[~archived]
+
+    def _extend_day_range(self, days: pd.Series):
+        """Расширяет диапазон дней, затронутых текущим файлом"""
+        lo, hi = days.min().date(), days.max().date()
+        cur_lo, cur_hi = self._day_range
+        self._day_range = (min(lo, cur_lo) if cur_lo else lo, max(hi, cur_hi) if cur_hi else hi)
+
+    def _merge_rejected(self, report_type: str, summary: dict, sample_size: int = 20):
+        """Сводка отклонённых строк накапливается по всем пачкам файла"""
+        if not summary["total"]:
+            return
+        logger.info(f"{report_type}: отклонено строк {summary['total']}: {summary['by_reason']}")
+        self.rejected["total"] += summary["total"]
+        for reason, count in summary["by_reason"].items():
+            self.rejected["by_reason"][reason] = self.rejected["by_reason"].get(reason, 0) + count
+        free = sample_size - len(self.rejected["sample_rows"])
+        self.rejected["sample_rows"].extend(summary["sample_rows"][:max(free, 0)])
 
     def _to_int(self, val) -> Optional[int]:
-        if pd.isna(val):
-            return None
-        try:
-            return int(float(val))
-        except Exception:
-            return None
+        return to_int(val)
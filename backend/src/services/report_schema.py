@@ -0,0 +1,204 @@
+"""
+Схемы колонок отчётов 8/10/11, скомпилированные по заголовку листа.
+
+Для каждого типа отчёта описаны поля, которые читает нормализация, и
+возможные заголовки Excel для каждого поля. По строке заголовка схема
+компилируется один раз: поле -> номер колонки в листе. Результат кешируется
+по заголовку, поэтому файлы одной выгрузки (и все пачки одного файла)
+используют готовую схему. По схеме:
+
+  - читаются только нужные колонки (usecols) — широкие выгрузки не
+    разбираются целиком и не держатся в памяти;
+  - тип отчёта определяется по заголовку, а не только по имени файла;
+  - если заголовки не распознаны, поля Report 11 берутся по фиксированным
+    позициям (Positional Fallback из aa_ble_docs.md): ТН (0), Дата (3),
+    Метка (10), Зона (11), Время (15).
+"""
+import functools
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Заголовки табельного номера; если в листе их несколько, берётся первое непустое значение
+TN_HEADERS = ("tn", "тн", "табельный номер", "tn_number")
+
+
+@dataclass(frozen=True)
+class Layout:
+    """Поля отчёта: имя колонки в системе -> заголовки Excel (в нижнем регистре, по приоритету)"""
+    fields: dict[str, tuple[str, ...]]
+    required: tuple[str, ...]  # Без них строки отклоняются; по ним же определяется тип отчёта
+    fallback: dict[str, int] = field(default_factory=dict)  # Поле -> позиция колонки, если заголовка нет
+
+
+LAYOUTS = {
+    "report8": Layout(
+        fields={
+            "tn": TN_HEADERS,
+            "ФИО": ("фио",),
+            "date": ("date",),
+            "date_begin": ("date_begin",),
+            "date_end": ("date_end",),
+            "full_go": ("full_go",),
+            "full_idle": ("full_idle",),
+            "full_work": ("full_work",),
+            "full_go_seconds": ("full_go_seconds",),
+            "full_idle_seconds": ("full_idle_seconds",),
+            "full_work_seconds": ("full_work_seconds",),
+        },
+        required=("tn", "date", "date_begin", "date_end"),
+    ),
+    "report10": Layout(
+        fields={
+            "tn": TN_HEADERS,
+            "ФИО": ("фио",),
+            "dt_start": ("dt_start", "начало простоя"),
+            "dt_end": ("dt_end", "конец простоя"),
+            "duration": ("duration", "длительность"),
+            "chosen_ble_tag_number": ("chosen_ble_tag_number",),
+        },
+        required=("tn", "dt_start", "dt_end", "duration"),
+    ),
+    "report11": Layout(
+        fields={
+            "tn": TN_HEADERS,
+            "shift_day": ("день смены", "дата смены", "дата", "shift_day"),
+            "time_only": ("время на объекте", "время", "time", "time_only"),
+            "ble_tag": ("metka", "метка", "ble-метка", "ble метка", "tag", "ble_tag"),
+            "zone_id": ("zona", "зона", "id зоны", "zone", "zone_id"),
+        },
+        required=("tn", "shift_day", "time_only", "ble_tag"),
+        fallback={"tn": 0, "shift_day": 3, "ble_tag": 10, "zone_id": 11, "time_only": 15},
+    ),
+}
+
+
+def _normalize_header(name) -> str:
+    return str(name).strip().lower()
+
+
+def header_fingerprint(columns: Iterable) -> str:
+    """Короткий отпечаток строки заголовка (для логов: одна выгрузка — один отпечаток)"""
+    raw = "\x1f".join(_normalize_header(c) for c in columns)
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+@dataclass(frozen=True)
+class ReportSchema:
+    """Скомпилированная проекция листа: поле -> номера колонок в листе"""
+    report_type: str
+    fingerprint: str
+    sources: tuple[tuple[str, tuple[int, ...]], ...]
+    positional: tuple[str, ...] = ()  # Поля, взятые по позиции, а не по заголовку
+    missing: tuple[str, ...] = ()  # Обязательные поля, которых нет в листе
+
+    @functools.cached_property
+    def usecols(self) -> tuple[int, ...]:
+        """Номера колонок листа, которые нужно прочитать (по возрастанию)"""
+        return tuple(sorted({i for _, positions in self.sources for i in positions}))
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing
+
+    def project(self, df: pd.DataFrame, *, projected: bool) -> pd.DataFrame:
+        """
+        Кадр с колонками в именах системы. projected=True — df уже только колонки
+        usecols (в их порядке), как их отдаёт SheetReader; False — лист целиком.
+        """
+        if projected:
+            if df.shape[1] != len(self.usecols):
+                raise ValueError(f"Ожидалось {len(self.usecols)} колонок схемы, в пачке {df.shape[1]}")
+        else:
+            df = df.iloc[:, list(self.usecols)]
+        local = {position: i for i, position in enumerate(self.usecols)}
+        columns = {}
+        for name, positions in self.sources:
+            column = df.iloc[:, local[positions[0]]]
+            for position in positions[1:]:
+                column = column.where(column.notna(), df.iloc[:, local[position]])
+            columns[name] = column
+        return pd.DataFrame(columns, index=df.index)
+
+
+def compile_schema(report_type: str, columns: Iterable) -> ReportSchema:
+    """Схема отчёта report_type для листа с заголовком columns (кешируется по заголовку)"""
+    if report_type not in LAYOUTS:
+        raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+    return _compile(report_type, tuple(str(c) for c in columns))
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(report_type: str, columns: tuple[str, ...]) -> ReportSchema:
+    layout = LAYOUTS[report_type]
+    positions = {}  # заголовок -> позиция первой такой колонки
+    for i, name in enumerate(columns):
+        positions.setdefault(_normalize_header(name), i)
+
+    sources = {}
+    for name, headers in layout.fields.items():
+        found = tuple(positions[h] for h in headers if h in positions)
+        if found:
+            sources[name] = found if name == "tn" else found[:1]
+
+    positional = []
+    if layout.fallback and any(name not in sources for name in layout.required):
+        taken = {i for found in sources.values() for i in found}
+        for name, position in layout.fallback.items():
+            if name not in sources and position < len(columns) and position not in taken:
+                sources[name] = (position,)
+                taken.add(position)
+                positional.append(name)
+
+    return ReportSchema(
+        report_type=report_type,
+        fingerprint=header_fingerprint(columns),
+        sources=tuple((name, sources[name]) for name in layout.fields if name in sources),
+        positional=tuple(positional),
+        missing=tuple(name for name in layout.required if name not in sources),
+    )
+
+
+def detect_report_type(columns: Iterable) -> Optional[str]:
+    """Тип отчёта по заголовку: все обязательные поля найдены по именам колонок (без позиций)"""
+    columns = tuple(str(c) for c in columns)
+    candidates = []
+    for report_type in LAYOUTS:
+        schema = compile_schema(report_type, columns)
+        if schema.complete and not schema.positional:
+            candidates.append((len(schema.sources), report_type))
+    return max(candidates)[1] if candidates else None
+
+
+def resolve_schema(
+    columns: Iterable, report_type: str = "auto", default: str = "report10", log: bool = True,
+) -> ReportSchema:
+    """
+    Схема листа. report_type="auto" — тип по заголовку, а если он не распознан,
+    default (тип по имени файла). log=False — без записи в лог (разбор в дочернем
+    процессе: схему логирует родитель через log_schema).
+    """
+    columns = tuple(str(c) for c in columns)
+    if report_type == "auto":
+        report_type = detect_report_type(columns) or default
+    schema = compile_schema(report_type, columns)
+    if log:
+        log_schema(schema, len(columns))
+    return schema
+
+
+def log_schema(schema: ReportSchema, width: int):
+    """Выбранные колонки схемы; предупреждение, если поля взяты по позиции"""
+    if schema.positional:
+        logger.warning(
+            f"{schema.report_type} [{schema.fingerprint}]: заголовки не распознаны, поля по позиции: "
+            + ", ".join(f"{name}={dict(schema.sources)[name][0]}" for name in schema.positional)
+        )
+    logger.info(
+        f"Схема {schema.report_type} [{schema.fingerprint}]: колонки {list(schema.usecols)} из {width}"
+        + (f", нет полей {list(schema.missing)}" if schema.missing else "")
+    )
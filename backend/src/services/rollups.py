@@ -0,0 +1,181 @@
+"""
+Дневные агрегаты (daily_rollups) для эндпоинтов /api/stats.
+
+Строки ключуются (object_name, day, employee_id, zone_id): минуты логов
+Report 11 (ble_logs и/или ble_intervals, см. ble_store) раскладываются по
+зонам, агрегаты смен (Report 8) и простоев (Report 10) лежат в строке
+с zone_id = ROLLUP_NO_ZONE. Средние хранятся
+как сумма + количество непустых значений, поэтому любые диапазоны
+складываются без потери точности.
+
+Пересчёт инкрементальный: при загрузке/перезаписи файла пересобираются
+только строки его объекта за затронутые дни.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Optional
+from sqlalchemy import delete, func, insert, literal_column, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import DailyRollup, Downtime, ProcessedFile, Shift, ROLLUP_NO_ZONE
+from src.services import ble_store
+from src.services.query_cache import get_stats_cache
+
+logger = logging.getLogger(__name__)
+
+# Колонки-метрики DailyRollup (всё, кроме ключа)
+METRIC_COLUMNS = [
+    "log_minutes",
+    "shifts_count",
+    "work_pct_sum", "work_pct_count",
+    "idle_pct_sum", "idle_pct_count",
+    "go_pct_sum", "go_pct_count",
+    "work_seconds", "idle_seconds", "go_seconds",
+    "downtime_count", "downtime_minutes",
+]
+KEY_COLUMNS = ["object_name", "day", "employee_id", "zone_id"]
+
+
+def _metrics(**values) -> list:
+    """Список колонок-метрик в порядке METRIC_COLUMNS, незаданные = 0"""
+    return [values.get(name, literal_column("0")).label(name) for name in METRIC_COLUMNS]
+
+
+def _source_select(object_name: str, day_from: date, day_to: date):
+    """UNION ALL частичных агрегатов логов, смен и простоев объекта за период"""
+    day_end = day_to + timedelta(days=1)
+
+    minutes = ble_store.zone_minutes(object_name, day_from, day_to)
+    logs = (
+        select(
+            minutes.c.object_name,
+            minutes.c.day,
+            minutes.c.employee_id,
+            func.coalesce(minutes.c.zone_id, ROLLUP_NO_ZONE).label("zone_id"),
+            *_metrics(log_minutes=func.sum(minutes.c.minutes)),
+        )
+        .group_by(minutes.c.object_name, minutes.c.day, minutes.c.employee_id, minutes.c.zone_id)
+    )
+
+    shifts = (
+        select(
+            ProcessedFile.object_name.label("object_name"),
+            Shift.date.label("day"),
+            Shift.employee_id.label("employee_id"),
+            literal_column(str(ROLLUP_NO_ZONE)).label("zone_id"),
+            *_metrics(
+                shifts_count=func.count(Shift.id),
+                work_pct_sum=func.coalesce(func.sum(Shift.full_work_percent), 0),
+                work_pct_count=func.count(Shift.full_work_percent),
+                idle_pct_sum=func.coalesce(func.sum(Shift.full_idle_percent), 0),
+                idle_pct_count=func.count(Shift.full_idle_percent),
+                go_pct_sum=func.coalesce(func.sum(Shift.full_go_percent), 0),
+                go_pct_count=func.count(Shift.full_go_percent),
+                work_seconds=func.coalesce(func.sum(Shift.full_work_seconds), 0),
+                idle_seconds=func.coalesce(func.sum(Shift.full_idle_seconds), 0),
+                go_seconds=func.coalesce(func.sum(Shift.full_go_seconds), 0),
+            ),
+        )
+        .join(ProcessedFile, Shift.processed_file_id == ProcessedFile.id)
+        .where(ProcessedFile.object_name == object_name, Shift.date.between(day_from, day_to))
+        .group_by(ProcessedFile.object_name, Shift.date, Shift.employee_id)
+    )
+
+    downtime_day = func.date(Downtime.dt_start)
+    downtimes = (
+        select(
+            ProcessedFile.object_name.label("object_name"),
+            downtime_day.label("day"),
+            Downtime.employee_id.label("employee_id"),
+            literal_column(str(ROLLUP_NO_ZONE)).label("zone_id"),
+            *_metrics(
+                downtime_count=func.count(Downtime.id),
+                downtime_minutes=func.coalesce(func.sum(Downtime.duration_minutes), 0),
+            ),
+        )
+        .join(ProcessedFile, Downtime.processed_file_id == ProcessedFile.id)
+        # Диапазон по самому dt_start, чтобы работал индекс
+        .where(
+            ProcessedFile.object_name == object_name,
+            Downtime.dt_start >= day_from,
+            Downtime.dt_start < day_end,
+        )
+        .group_by(ProcessedFile.object_name, downtime_day, Downtime.employee_id)
+    )
+
+    return union_all(logs, shifts, downtimes).subquery("parts")
+
+
+async def refresh_rollups(db: AsyncSession, object_name: Optional[str], day_from: date, day_to: date) -> int:
+    """
+    Пересобирает daily_rollups объекта за [day_from, day_to] из сырых таблиц.
+    Работает в транзакции вызывающего (commit делает он).
+    """
+    if object_name is None or day_from is None or day_to is None:
+        return 0
+
+    await db.execute(
+        delete(DailyRollup).where(
+            DailyRollup.object_name == object_name,
+            DailyRollup.day.between(day_from, day_to),
+        )
+    )
+
+    parts = _source_select(object_name, day_from, day_to)
+    merged = select(
+        *(parts.c[name] for name in KEY_COLUMNS),
+        *(func.sum(parts.c[name]).label(name) for name in METRIC_COLUMNS),
+    ).group_by(*(parts.c[name] for name in KEY_COLUMNS))
+
+    result = await db.execute(insert(DailyRollup).from_select(KEY_COLUMNS + METRIC_COLUMNS, merged))
+    logger.info(f"Rollups: {object_name} {day_from}..{day_to} -> {result.rowcount} строк")
+    return result.rowcount
+
+
+async def file_day_range(db: AsyncSession, processed_file: ProcessedFile) -> tuple[Optional[date], Optional[date]]:
+    """Диапазон дней, которые затрагивают строки файла (для пересчёта при перезаписи)"""
+    if processed_file.report_type == "report11":
+        return await ble_store.file_day_range(db, processed_file.id)
+    if processed_file.report_type == "report8":
+        col, table_file_id = Shift.date, Shift.processed_file_id
+    else:
+        col, table_file_id = func.date(Downtime.dt_start), Downtime.processed_file_id
+
+    stmt = select(func.min(col), func.max(col)).where(table_file_id == processed_file.id)
+    lo, hi = (await db.execute(stmt)).one()
+    return _as_date(lo), _as_date(hi)
+
+
+def _as_date(value) -> Optional[date]:
+    # func.date() в SQLite возвращает строку
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+async def rebuild_all_rollups(db: AsyncSession) -> int:
+    """Полная пересборка по всем объектам (первичное заполнение после деплоя)"""
+    objects = (await db.execute(
+        select(ProcessedFile.object_name).where(ProcessedFile.object_name.is_not(None)).distinct()
+    )).scalars().all()
+
+    total = 0
+    for object_name in objects:
+        files = (await db.execute(
+            select(ProcessedFile).where(ProcessedFile.object_name == object_name)
+        )).scalars().all()
+        ranges = [await file_day_range(db, f) for f in files]
+        days = [d for r in ranges for d in r if d is not None]
+        if days:
+            total += await refresh_rollups(db, object_name, min(days), max(days))
+    await db.commit()
+    await get_stats_cache().clear()
+    return total
+
+
+async def ensure_rollups(db: AsyncSession):
+    """Если агрегаты ещё не построены, а данные уже есть — строит их один раз"""
+    has_rollups = (await db.execute(select(DailyRollup.id).limit(1))).first()
+    has_files = (await db.execute(select(ProcessedFile.id).limit(1))).first()
+    if has_files and not has_rollups:
+        logger.info("daily_rollups пуста — первичное построение агрегатов")
+        await rebuild_all_rollups(db)
@@ -0,0 +1,105 @@
+"""
+Построчный diff при перезаписи файла (overwrite_mode = "diff").
+
+Для каждой строки считается отпечаток — хеш значений её колонок (как они
+лежат в таблице, с employee_id вместо табельного номера). Отпечатки строк,
+уже сохранённых для файла, читаются из БД пачками. Новые строки
+сопоставляются с ними по ключу (хеш, номер повтора хеша), поэтому
+одинаковые строки внутри файла тоже учитываются. В итоге вставляются только
+новые строки, удаляются только исчезнувшие, остальные не трогаются.
+
+Итоговое содержимое таблицы то же, что после полной перезаписи; меняются
+только id изменённых строк.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, DateTime, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+STREAM_BATCH_SIZE = 100_000
+DELETE_BATCH_SIZE = 5_000
+NULL_SENTINEL = np.iinfo(np.int64).min  # NULL/NaT в отпечатке (не совпадает с реальными значениями)
+
+
+def fingerprint(frame: pd.DataFrame, model) -> np.ndarray:
+    """
+    Хеш строк frame (uint64). Значения приводятся к одному виду независимо от
+    того, пришли они из листа (pandas) или из БД (python-объекты):
+    даты/время — наносекунды, числа — float64, NULL — NULL_SENTINEL.
+    """
+    canonical = {}
+    for name in frame.columns:
+        column_type = model.__table__.c[name].type
+        if isinstance(column_type, (Date, DateTime)):
+            values = pd.to_datetime(frame[name])
+            canonical[name] = np.where(values.isna(), NULL_SENTINEL, values.to_numpy("datetime64[ns]").astype("int64"))
+        else:
+            canonical[name] = pd.to_numeric(frame[name]).astype("float64").fillna(float(NULL_SENTINEL)).to_numpy()
+    return pd.util.hash_pandas_object(pd.DataFrame(canonical), index=False).to_numpy()
+
+
+def _occurrences(hashes: np.ndarray, offset: pd.Series = None) -> np.ndarray:
+    """Номер повтора каждого хеша (0, 1, ...), продолжая счёт offset (хеш -> уже встречено)"""
+    series = pd.Series(hashes)
+    occurrence = series.groupby(series).cumcount().to_numpy()
+    if offset is not None and not offset.empty:
+        occurrence = occurrence + offset.reindex(hashes).fillna(0).to_numpy(dtype="int64")
+    return occurrence
+
+
+class RowDiff:
+    """Сопоставление новых строк файла с сохранёнными; новые строки подаются пачками"""
+
+    def __init__(self, model, stored: pd.DataFrame):
+        self.model = model
+        # stored: id, hash -> индекс (hash, повтор), значение — id строки
+        self._stored = pd.Series(
+            stored["id"].to_numpy(),
+            index=pd.MultiIndex.from_arrays([stored["hash"].to_numpy(), _occurrences(stored["hash"].to_numpy())]),
+        )
+        self._kept = np.zeros(len(stored), dtype=bool)
+        self._seen = pd.Series(dtype="int64")
+        self.added = 0
+        self.unchanged = 0
+
+    @classmethod
+    async def load(cls, db: AsyncSession, model, processed_file_id: int, columns: list[str]) -> "RowDiff":
+        """Отпечатки строк файла, уже лежащих в таблице model (columns — колонки новых пачек)"""
+        table = model.__table__
+        stmt = select(table.c.id, *(table.c[name] for name in columns)).where(
+            table.c.processed_file_id == processed_file_id
+        )
+        parts = []
+        result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for batch in result.partitions():
+            frame = pd.DataFrame(batch, columns=["id"] + columns)
+            parts.append(pd.DataFrame({"id": frame["id"].to_numpy(), "hash": fingerprint(frame[columns], model)}))
+        stored = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({"id": [], "hash": []})
+        return cls(model, stored.astype({"id": "int64", "hash": "uint64"}))
+
+    def split(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Отмечает совпавшие строки пачки сохранёнными и возвращает только новые"""
+        hashes = fingerprint(frame, self.model)
+        keys = pd.MultiIndex.from_arrays([hashes, _occurrences(hashes, self._seen)])
+        positions = self._stored.index.get_indexer(keys)
+        matched = positions >= 0
+        self._kept[positions[matched]] = True
+
+        counts = pd.Series(hashes).value_counts()
+        self._seen = self._seen.add(counts, fill_value=0).astype("int64")
+        self.unchanged += int(matched.sum())
+        self.added += int((~matched).sum())
+        return frame[~matched]
+
+    def removed_ids(self) -> list[int]:
+        return self._stored.to_numpy()[~self._kept].tolist()
+
+    async def delete_removed(self, db: AsyncSession) -> int:
+        """Удаляет сохранённые строки, которых нет в новой версии файла"""
+        ids = self.removed_ids()
+        for start in range(0, len(ids), DELETE_BATCH_SIZE):
+            await db.execute(delete(self.model).where(self.model.id.in_(ids[start:start + DELETE_BATCH_SIZE])))
+        return len(ids)
+
+    def summary(self) -> dict:
+        return {"added": self.added, "removed": len(self.removed_ids()), "unchanged": self.unchanged}
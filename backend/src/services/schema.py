@@ -0,0 +1,247 @@
+"""
+Поддержка схемы БД поверх Base.metadata.create_all.
+
+create_all создаёт индексы только вместе с новой таблицей, поэтому индексы,
+добавленные в модели позже, досоздаются ensure_indexes (в PostgreSQL —
+CREATE INDEX CONCURRENTLY, без блокировки записи в большие таблицы).
+
+Опционально ble_logs секционируется по shift_day (RANGE, по месяцу):
+старые месяцы отсоединяются DETACH PARTITION, а удаление строк
+перезаписанного файла затрагивает только секции его дней.
+Перевод существующей таблицы — скриптом partition_ble_logs.py; работающие
+процессы замечают его не позже чем через PARTITION_CACHE_SECONDS.
+"""
+import logging
+import time
+from datetime import date
+from typing import Optional
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from src.database import Base
+from src.models import BleLog
+from src.services.locks import advisory_xact_lock, partition_lock_key
+
+logger = logging.getLogger(__name__)
+
+BLE_LOGS_TABLE = BleLog.__tablename__
+
+# Сколько секунд процесс доверяет кешу секций: partition_ble_logs.py (перевод таблицы,
+# отсоединение секций) выполняется отдельно от работающего API
+PARTITION_CACHE_SECONDS = 300
+
+# Месяцы, секции которых уже проверены в этом процессе
+_known_partitions: set[str] = set()
+# Секционирована ли ble_logs (None — не проверено или кеш устарел)
+_partitioned: Optional[bool] = None
+_checked_at = 0.0
+
+
+async def ensure_indexes(engine: AsyncEngine) -> list[str]:
+    """Создаёт объявленные в моделях индексы, которых ещё нет в БД. Возвращает имена созданных"""
+    async with engine.connect() as conn:
+        existing = await conn.run_sync(_existing_indexes)
+
+    missing = [
+        index
+        for table in Base.metadata.sorted_tables
+        if table.name in existing
+        for index in table.indexes
+        if index.name not in existing[table.name]
+    ]
+    if not missing:
+        return []
+
+    if engine.dialect.name == "postgresql":
+        # CONCURRENTLY нельзя выполнять внутри транзакции
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            for index in missing:
+                logger.info(f"Создаём индекс {index.name}")
+                await conn.execute(text(_create_index_sql(index, engine.dialect, concurrently=True)))
+    else:
+        async with engine.begin() as conn:
+            for index in missing:
+                logger.info(f"Создаём индекс {index.name}")
+                await conn.run_sync(index.create, checkfirst=True)
+    return [index.name for index in missing]
+
+
+def _existing_indexes(sync_conn) -> dict[str, set[str]]:
+    inspector = inspect(sync_conn)
+    return {
+        table: {ix["name"] for ix in inspector.get_indexes(table)}
+        for table in inspector.get_table_names()
+    }
+
+
+def _create_index_sql(index: Index, dialect=None, concurrently: bool = False) -> str:
+    """DDL индекса с учётом диалекта (частичные индексы, UNIQUE) и IF NOT EXISTS"""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect or postgresql.dialect()))
+    if concurrently:
+        ddl = ddl.replace("INDEX IF NOT EXISTS", "INDEX CONCURRENTLY IF NOT EXISTS", 1)
+    return ddl
+
+
+# --- Секционирование ble_logs (только PostgreSQL) ---
+
+def partition_name(month: date) -> str:
+    return f"{BLE_LOGS_TABLE}_y{month.year}m{month.month:02d}"
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def months_between(day_from: date, day_to: date) -> list[date]:
+    months, month = [], _month_start(day_from)
+    while month <= day_to:
+        months.append(month)
+        month = next_month(month)
+    return months
+
+
+async def is_ble_logs_partitioned(conn) -> bool:
+    dialect = conn.bind.dialect if isinstance(conn, AsyncSession) else conn.dialect
+    if dialect.name != "postgresql":
+        return False
+    result = await conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t))"),
+        {"t": BLE_LOGS_TABLE},
+    )
+    return bool(result.scalar())
+
+
+def forget_ble_logs_partitions():
+    """Сбрасывает кеш секций процесса (например, после ошибки вставки в ble_logs)"""
+    global _partitioned
+    _partitioned = None
+    _known_partitions.clear()
+
+
+async def ensure_ble_logs_partitions(db: AsyncSession, day_from: date, day_to: date):
+    """
+    Создаёт недостающие месячные секции ble_logs под диапазон дней (в транзакции вызывающего).
+    Если таблица не секционирована — ничего не делает. Секция создаётся под
+    advisory-блокировкой её имени: параллельные загрузки одного нового месяца
+    создают её по очереди, вторая видит уже созданную (IF NOT EXISTS).
+    """
+    global _partitioned, _checked_at
+    if time.monotonic() - _checked_at > PARTITION_CACHE_SECONDS:
+        forget_ble_logs_partitions()
+    if _partitioned is None:
+        _partitioned = await is_ble_logs_partitioned(db)
+        _checked_at = time.monotonic()
+    if not _partitioned:
+        return
+
+    for month in months_between(day_from, day_to):
+        name = partition_name(month)
+        if name in _known_partitions:
+            continue
+        exists, attached = (await db.execute(text(
+            "SELECT to_regclass(:name) IS NOT NULL, EXISTS (SELECT 1 FROM pg_inherits "
+            "WHERE inhrelid = to_regclass(:name) AND inhparent = to_regclass(:parent))"
+        ), {"name": name, "parent": BLE_LOGS_TABLE})).one()
+        if exists and not attached:
+            raise ValueError(f"Таблица {name} есть, но не является секцией {BLE_LOGS_TABLE} (отсоединена?)")
+        if not exists:
+            await advisory_xact_lock(db, partition_lock_key(name))
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {BLE_LOGS_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+            ))
+            logger.info(f"{BLE_LOGS_TABLE}: создана секция {name}")
+        _known_partitions.add(name)
+
+
+async def detach_ble_logs_partitions(db: AsyncSession, before: date) -> list[str]:
+    """
+    Отсоединяет секции месяцев, целиком лежащих раньше before. Таблицы секций
+    остаются в БД (их можно выгрузить в архив и удалить); daily_rollups не меняются.
+    """
+    rows = await db.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:t) ORDER BY c.relname"
+    ), {"t": BLE_LOGS_TABLE})
+
+    detached = []
+    for name in rows.scalars():
+        month = _parse_partition_month(name)
+        if month is not None and next_month(month) <= before:
+            await db.execute(text(f"ALTER TABLE {BLE_LOGS_TABLE} DETACH PARTITION {name}"))
+            _known_partitions.discard(name)
+            detached.append(name)
+    await db.commit()
+    return detached
+
+
+def _parse_partition_month(name: str) -> Optional[date]:
+    prefix = f"{BLE_LOGS_TABLE}_y"
+    if not name.startswith(prefix):
+        return None
+    try:
+        year, month = name[len(prefix):].split("m")
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+async def partition_ble_logs(conn: AsyncConnection) -> int:
+    """
+    Переводит ble_logs в секционированную по shift_day таблицу (одной транзакцией conn).
+    Данные копируются в месячные секции, последовательность id сохраняется.
+    Первичный ключ становится (id, shift_day) — ключ секционирования обязан в него входить.
+    Возвращает число созданных секций.
+    """
+    if await is_ble_logs_partitioned(conn):
+        return 0
+
+    t = BLE_LOGS_TABLE
+    tmp = f"{t}_partitioned"
+    await conn.execute(text(f"LOCK TABLE {t} IN ACCESS EXCLUSIVE MODE"))
+    lo, hi = (await conn.execute(text(f"SELECT min(shift_day), max(shift_day) FROM {t}"))).one()
+    await conn.execute(text(f"ALTER SEQUENCE {t}_id_seq OWNED BY NONE"))
+    await conn.execute(text(f"""
+        CREATE TABLE {tmp} (
+            id INTEGER NOT NULL DEFAULT nextval('{t}_id_seq'),
+            employee_id INTEGER NOT NULL REFERENCES employees (id),
+            processed_file_id INTEGER REFERENCES processed_files (id) ON DELETE CASCADE,
+            shift_day DATE NOT NULL,
+            time_only TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            ble_tag INTEGER NOT NULL,
+            zone_id INTEGER,
+            CONSTRAINT {tmp}_pkey PRIMARY KEY (id, shift_day)
+        ) PARTITION BY RANGE (shift_day)
+    """))
+
+    months = months_between(lo, hi) if lo is not None else []
+    for month in months:
+        await conn.execute(text(
+            f"CREATE TABLE {partition_name(month)} PARTITION OF {tmp} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        ))
+
+    columns = "id, employee_id, processed_file_id, shift_day, time_only, ble_tag, zone_id"
+    await conn.execute(text(f"INSERT INTO {tmp} ({columns}) SELECT {columns} FROM {t}"))
+    await conn.execute(text(f"DROP TABLE {t}"))
+    await conn.execute(text(f"ALTER TABLE {tmp} RENAME TO {t}"))
+    await conn.execute(text(f"ALTER TABLE {t} RENAME CONSTRAINT {tmp}_pkey TO {t}_pkey"))
+    await conn.execute(text(f"ALTER SEQUENCE {t}_id_seq OWNED BY {t}.id"))
+
+    # Индексы на родительской таблице автоматически создаются во всех секциях
+    for index in BleLog.__table__.indexes:
+        await conn.execute(text(_create_index_sql(index)))
+
+    global _partitioned, _checked_at
+    _partitioned = True
+    _checked_at = time.monotonic()
+    _known_partitions.update(partition_name(m) for m in months)
+    logger.info(f"{t}: секционирована, {len(months)} месячных секций")
+    return len(months)
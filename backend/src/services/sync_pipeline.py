@@ -0,0 +1,235 @@
+"""
+Параллельный конвейер синхронизации файлов Google Drive.
+
+Три ступени с независимыми лимитами:
+  1. скачивание — блокирующий googleapiclient в пуле потоков (у каждого
+     потока свой DriveService: httplib2 не потокобезопасен);
+  2. разбор — чтение xlsx и нормализация pandas в пуле процессов, чтобы
+     CPU-работа не держала GIL и event loop API; пачки складываются в spool
+     на диске (parse_worker), поэтому разбор не ждёт записи;
+  3. запись — ограниченное число одновременных сессий БД (ReportParser.save_normalized);
+     файлы одного объекта пишутся по очереди: их перезаписи и пересчёт
+     daily_rollups объекта (ключ uq_daily_rollups_key) не должны пересекаться.
+     Блокировка объекта берётся только на запись: пока пишется один файл объекта,
+     следующие уже скачиваются и разбираются.
+
+Неизменившиеся файлы (водяные знаки DriveWatermarks) не скачиваются вовсе,
+а дубликаты (имя + md5 уже в processed_files) отсекаются сразу после
+скачивания, до дорогого разбора.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Optional
+from src.config import get_settings
+from src.core import metrics
+from src.database import async_session
+from src.gdrive import DriveService
+from src.services.drive_watermarks import DriveWatermarks
+from src.services.parse_worker import SpooledReport, parse_report
+from src.services.report_parser import ReportParser
+
+logger = logging.getLogger(__name__)
+
+
+class SyncPipeline:
+    """Конвейер: скачивание -> разбор -> запись, с ограниченным числом воркеров на каждой ступени"""
+
+    def __init__(
+        self,
+        download_workers: Optional[int] = None,
+        parse_workers: Optional[int] = None,
+        db_writers: Optional[int] = None,
+        drive_factory: Callable[[], DriveService] = DriveService,
+        session_factory=async_session,
+        on_progress: Optional[Callable[[str, int], Awaitable[None]]] = None,
+    ):
+        settings = get_settings()
+        self.download_workers = download_workers or settings.sync_download_workers
+        self.parse_workers = parse_workers or settings.sync_parse_workers
+        self.db_writers = db_writers or settings.sync_db_writers
+        self.chunk_size = settings.ingest_chunk_size
+        self.incremental = settings.drive_incremental_sync
+        self.changes_feed = settings.drive_changes_feed
+        self.drive_factory = drive_factory
+        self.session_factory = session_factory
+        self.on_progress = on_progress  # async (stage, files_done) -> None
+        self._files_done = 0
+
+    async def run(self, files: Optional[list[dict]] = None) -> dict:
+        """
+        Обрабатывает files (или все Excel-файлы из папок Drive).
+        Возвращает {"success", "processed", "files", "errors"}.
+        """
+        next_page_token = None
+        if files is None:
+            try:
+                files, next_page_token = await self._list_files()
+            except Exception as e:
+                return {"success": False, "error": f"Ошибка доступа к Google Drive: {str(e)}"}
+
+        listed = len(files)
+        if self.incremental:
+            async with self.session_factory() as db:
+                files = await DriveWatermarks(db).filter_changed(files)
+        logger.info(
+            f"📁 Синхронизация {len(files)} из {listed} файлов: download={self.download_workers}, "
+            f"parse={self.parse_workers}, db={self.db_writers}"
+        )
+
+        # Пул клиентов Drive: по одному на поток скачивания
+        self._drives = asyncio.Queue()
+        for _ in range(self.download_workers):
+            self._drives.put_nowait(self.drive_factory())
+        self._download_sem = asyncio.Semaphore(self.download_workers)
+        self._parse_sem = asyncio.Semaphore(self.parse_workers)
+        self._write_sem = asyncio.Semaphore(self.db_writers)
+        # Объект -> блокировка записи: пока пишется один файл объекта, следующий не занимает слот писателя
+        self._object_locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        # Сколько скачанных файлов одновременно держим в памяти до конца разбора
+        self._in_flight = asyncio.Semaphore(self.download_workers + self.parse_workers)
+
+        results, errors = [], []
+        # spawn: форк процесса с работающими потоками и event loop небезопасен
+        with ProcessPoolExecutor(
+            max_workers=self.parse_workers, mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            self._executor = executor
+            outcomes = await asyncio.gather(
+                *(self._process(file_info) for file_info in files),
+                return_exceptions=True,
+            )
+
+        for file_info, outcome in zip(files, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"❌ Ошибка обработки {file_info['name']}: {outcome}")
+                errors.append({"filename": file_info["name"], "error": str(outcome)})
+            else:
+                results.append(outcome)
+        metrics.SYNC_FILES.inc(len(results), outcome="processed")
+        metrics.SYNC_FILES.inc(len(errors), outcome="error")
+        metrics.SYNC_FILES.inc(listed - len(files), outcome="unchanged")
+
+        # Позицию ленты изменений двигаем только после полностью успешного прохода,
+        # иначе упавшие файлы не попадут в следующий changes.list
+        if next_page_token and not errors:
+            async with self.session_factory() as db:
+                await DriveWatermarks(db).set_page_token(next_page_token)
+
+        return {
+            "success": True,
+            "processed": len(results),
+            "unchanged": listed - len(files),
+            "files": results,
+            "errors": errors,
+        }
+
+    async def _list_files(self) -> tuple[list[dict], Optional[str]]:
+        """
+        Кандидаты на синхронизацию и page token, который нужно сохранить после прохода.
+        С лентой изменений — только файлы, изменённые после сохранённого token;
+        при первом запуске — полный список папок.
+        """
+        drive = self.drive_factory()
+        if not self.changes_feed:
+            return await asyncio.to_thread(drive.list_excel_files), None
+
+        async with self.session_factory() as db:
+            page_token = await DriveWatermarks(db).get_page_token()
+        if page_token:
+            return await asyncio.to_thread(drive.list_changes, page_token)
+
+        # Token берём до перечисления, чтобы не потерять изменения, сделанные во время прохода
+        start_token = await asyncio.to_thread(drive.get_start_page_token)
+        return await asyncio.to_thread(drive.list_excel_files), start_token
+
+    async def _mark_synced(self, file_info: dict, result: dict):
+        async with self.session_factory() as db:
+            await DriveWatermarks(db).mark_synced(file_info, result.get("processed_file_id"))
+
+    async def _process(self, file_info: dict) -> dict:
+        file_id, filename = file_info["id"], file_info["name"]
+        async with self._in_flight:
+            content = await self._download(file_id)
+            content_hash = await asyncio.to_thread(lambda: hashlib.md5(content).hexdigest())
+
+            async with self.session_factory() as db:
+                if await ReportParser(db).is_duplicate(filename, content_hash):
+                    logger.info(f"SKIP: {filename} - дубликат (хеш совпадает)")
+                    metrics.INGEST_FILES.inc(report_type="skipped", status="duplicate")
+                    await self._mark_synced(file_info, ReportParser.DUPLICATE_RESULT)
+                    return self._file_result(filename, ReportParser.DUPLICATE_RESULT)
+
+            # Разбор — до блокировки объекта и слота писателя: пачки ждут записи в spool на диске
+            async with self._parse_sem:
+                report = await parse_report(
+                    content, default_type=ReportParser._detect_report_type(filename, "auto"),
+                    chunk_size=self.chunk_size, executor=self._executor,
+                )
+            del content
+
+        # Слот in-flight уже свободен: файл, ожидающий блокировку объекта, не держит содержимое в памяти
+        object_name = ReportParser._extract_object_name(filename)
+        try:
+            async with self._object_locks[object_name], self._write_sem:
+                result = await self._save(report, filename, content_hash, object_name, file_id)
+        finally:
+            report.discard()
+        await self._mark_synced(file_info, result)
+        self._files_done += 1
+        if self.on_progress is not None:
+            await self.on_progress("sync", self._files_done)
+        return self._file_result(filename, result)
+
+    async def _download(self, file_id: str) -> bytes:
+        async with self._download_sem:
+            drive = await self._drives.get()
+            try:
+                return await asyncio.to_thread(drive.download_file, file_id)
+            finally:
+                self._drives.put_nowait(drive)
+
+    async def _save(self, report: SpooledReport, filename, content_hash, object_name, file_id) -> dict:
+        # Конфликтов записи между писателями нет: сотрудники создаются через ON CONFLICT DO NOTHING,
+        # а файлы одного объекта пишутся по очереди (здесь и блокировкой объекта в save_normalized)
+        async with self.session_factory() as db:
+            return await ReportParser(db).save_normalized(
+                report,
+                filename=filename,
+                content_hash=content_hash,
+                report_type=report.report_type,
+                object_name=object_name,
+                drive_file_id=file_id,
+                timings=report.timings,
+            )
+
+    @staticmethod
+    def _file_result(filename: str, result: dict) -> dict:
+        return {
+            "filename": filename,
+            "report_type": result["report_type"],
+            "records": result["records_count"],
+            "status": result.get("status", "unknown"),
+        }
+
+
+async def run_drive_sync(sync_refs: bool = True, on_progress=None) -> dict:
+    """Полная синхронизация Drive через конвейер + справочники один раз в конце"""
+    started = time.perf_counter()
+    result = await SyncPipeline(on_progress=on_progress).run()
+    metrics.SYNC_SECONDS.observe(time.perf_counter() - started, kind="drive")
+    metrics.SYNC_RUNS.inc(kind="drive", status="success" if result["success"] else "error")
+    if not result["success"] or not sync_refs:
+        return result
+
+    async with async_session() as db:
+        try:
+            result["references"] = await ReportParser(db).sync_reference_data()
+        except Exception as e:
+            metrics.SYNC_RUNS.inc(kind="references", status="error")
+            result["errors"].append({"action": "sync_reference_data", "error": str(e)})
+    return result
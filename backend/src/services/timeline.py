@@ -0,0 +1,271 @@
+"""
+Восстановление таймлайна смены из минут логов BLE (правила — aa_ble_docs.md, раздел 4).
+Минуты читаются через ble_store — из ble_logs или развёрнутых серий ble_intervals.
+
+ble_logs хранит время как shift_day + время суток, поэтому минуты ночной смены
+после полуночи оказываются в начале того же дня. Движок для каждой пары
+(сотрудник, день смены) находит начало смены — точку после наибольшего
+разрыва на суточном круге — и переносит минуты раньше неё на следующие сутки.
+
+Дальше подряд идущие минуты одной зоны склеиваются в интервалы:
+  - новый интервал — при смене зоны или разрыве данных больше GAP_SECONDS;
+  - длительность округляется до минут по правилу 0.51 (вверх, если остаток
+    не меньше 0.51 минуты, т.е. 30.6 секунды);
+  - метка 0 — зона OUTSIDE_ZONE («вне зоны BLE-маячков»); больше
+    TAG0_WARNING_ROWS таких минут за смену — предупреждение.
+
+Интервалы сохраняются в timeline_intervals (а переходы между зонами — в
+zone_transitions, см. services/movement.py) и пересобираются при каждой
+загрузке/перезаписи файла Report 11.
+"""
+import asyncio
+import logging
+from datetime import date
+from typing import Iterator, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import ProcessedFile, TimelineInterval, ZoneTransition
+from src.services import ble_store
+from src.services.movement import build_transitions
+from src.services.bulk_loader import BulkLoader
+
+logger = logging.getLogger(__name__)
+
+ROUNDING_THRESHOLD = 0.51  # Доля минуты, с которой остаток округляется вверх
+GAP_SECONDS = 60  # Разрыв между отметками больше минуты — подозрительный
+TAG0_WARNING_ROWS = 100  # Больше стольких минут с меткой 0 за смену — предупреждение
+OUTSIDE_ZONE = 0
+SAMPLE_SECONDS = 60  # Одна строка лога покрывает минуту
+DAY_SECONDS = 24 * 3600
+
+# Минутных строк за один проход: ограничивает память и время одного шага пересборки.
+# Сотрудники целиком (все их смены) попадают в одну пачку
+BATCH_ROWS = 100_000
+
+INTERVAL_COLUMNS = [
+    "employee_id", "shift_day", "start_at", "end_at",
+    "zone_id", "minutes", "samples", "gap_before_seconds",
+]
+SHIFT_KEY = ["employee_id", "shift_day"]
+
+
+def round_minutes(seconds) -> np.ndarray:
+    """Секунды -> целые минуты: остаток от 0.51 минуты округляется вверх"""
+    minutes = np.asarray(seconds, dtype="float64") / 60
+    return np.floor(minutes + (1 - ROUNDING_THRESHOLD) + 1e-9).astype("int64")
+
+
+def stitch_midnight(logs: pd.DataFrame) -> pd.Series:
+    """
+    Фактическое время каждой строки с учётом перехода смены через полночь.
+    logs: employee_id, shift_day, time_only (shift_day + время суток).
+    """
+    seconds = (logs["time_only"] - logs["time_only"].dt.normalize()).dt.total_seconds()
+    frame = pd.DataFrame({
+        "employee_id": logs["employee_id"].to_numpy(),
+        "shift_day": logs["shift_day"].to_numpy(),
+        "tod": seconds.to_numpy(),
+    }, index=logs.index).sort_values(SHIFT_KEY + ["tod"])
+
+    groups = frame.groupby(SHIFT_KEY, sort=False)["tod"]
+    next_tod = groups.shift(-1)
+    # У последней отметки «следующая» — первая отметка следующих суток
+    next_tod = next_tod.fillna(groups.transform("first") + DAY_SECONDS)
+    frame["gap"] = next_tod - frame["tod"]
+    frame["next_tod"] = next_tod % DAY_SECONDS
+
+    # Смена начинается сразу после наибольшего разрыва на суточном круге
+    widest = frame.loc[frame.groupby(SHIFT_KEY, sort=False)["gap"].idxmax(), SHIFT_KEY + ["next_tod"]]
+    start_tod = frame[SHIFT_KEY].merge(
+        widest.rename(columns={"next_tod": "start_tod"}), on=SHIFT_KEY, how="left"
+    )["start_tod"].to_numpy()
+
+    rolled = (frame["tod"].to_numpy() < start_tod).astype("int64")
+    day_start = pd.to_datetime(frame["shift_day"])
+    stitched = day_start + pd.to_timedelta(frame["tod"].to_numpy() + rolled * DAY_SECONDS, unit="s")
+    return pd.Series(stitched.to_numpy(), index=frame.index).reindex(logs.index)
+
+
+def build_intervals(logs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Минуты логов -> интервалы зон (колонки INTERVAL_COLUMNS).
+    logs: employee_id, shift_day, time_only, ble_tag, zone_id.
+    """
+    if logs.empty:
+        return pd.DataFrame(columns=INTERVAL_COLUMNS)
+
+    frame = pd.DataFrame({
+        "employee_id": logs["employee_id"].to_numpy(),
+        "shift_day": pd.to_datetime(logs["shift_day"]).to_numpy(),
+        "ts": stitch_midnight(logs).to_numpy(),
+        "zone_id": np.where(
+            logs["ble_tag"].to_numpy() == 0,
+            OUTSIDE_ZONE,
+            logs["zone_id"].fillna(OUTSIDE_ZONE).to_numpy(),
+        ).astype("int64"),
+    }).sort_values(SHIFT_KEY + ["ts"], kind="stable").reset_index(drop=True)
+
+    same_shift = (
+        (frame["employee_id"] == frame["employee_id"].shift())
+        & (frame["shift_day"] == frame["shift_day"].shift())
+    )
+    delta = (frame["ts"] - frame["ts"].shift()).dt.total_seconds().where(same_shift)
+    gap = delta > GAP_SECONDS
+    new_interval = ~same_shift | gap | (frame["zone_id"] != frame["zone_id"].shift())
+    frame["interval"] = new_interval.cumsum()
+    frame["gap_before"] = np.where(gap, delta, 0)
+
+    # Отметка длится до следующей (если та без разрыва), иначе — одну минуту
+    next_ts = frame["ts"].shift(-1)
+    continues = same_shift.shift(-1, fill_value=False) & ~gap.shift(-1, fill_value=False)
+    frame["row_end"] = next_ts.where(continues, frame["ts"] + pd.Timedelta(seconds=SAMPLE_SECONDS))
+
+    intervals = frame.groupby("interval", sort=False).agg(
+        employee_id=("employee_id", "first"),
+        shift_day=("shift_day", "first"),
+        start_at=("ts", "first"),
+        end_at=("row_end", "last"),
+        zone_id=("zone_id", "first"),
+        samples=("ts", "size"),
+        gap_before_seconds=("gap_before", "first"),
+    ).reset_index(drop=True)
+    intervals["minutes"] = round_minutes((intervals["end_at"] - intervals["start_at"]).dt.total_seconds())
+    intervals["gap_before_seconds"] = intervals["gap_before_seconds"].round().astype("int64")
+    return intervals[INTERVAL_COLUMNS]
+
+
+def shift_flags(intervals: pd.DataFrame) -> pd.DataFrame:
+    """Проверки по сменам: минуты с меткой 0 и разрывы данных. Индекс — (employee_id, shift_day)"""
+    outside = intervals["samples"].where(intervals["zone_id"] == OUTSIDE_ZONE, 0)
+    flags = intervals.assign(tag0_rows=outside, has_gap=intervals["gap_before_seconds"] > 0).groupby(SHIFT_KEY).agg(
+        tag0_rows=("tag0_rows", "sum"),
+        gaps=("has_gap", "sum"),
+        gap_seconds=("gap_before_seconds", "sum"),
+    )
+    flags["tag0_warning"] = flags["tag0_rows"] > TAG0_WARNING_ROWS
+    return flags
+
+
+def _log_flags(flags: pd.DataFrame, processed_file_id: int):
+    warned = flags[flags["tag0_warning"]]
+    if not warned.empty:
+        sample = [f"{e}/{d:%Y-%m-%d}" for e, d in warned.index[:10]]
+        logger.warning(
+            f"Таймлайн файла {processed_file_id}: {len(warned)} смен с более чем "
+            f"{TAG0_WARNING_ROWS} минутами метки 0, например {sample}"
+        )
+    gapped = flags[flags["gaps"] > 0]
+    if not gapped.empty:
+        logger.warning(
+            f"Таймлайн файла {processed_file_id}: разрывы данных > {GAP_SECONDS} с "
+            f"в {len(gapped)} сменах ({int(gapped['gaps'].sum())} разрывов)"
+        )
+
+
+def employee_batches(minutes: dict[int, int], max_rows: int = BATCH_ROWS) -> Iterator[list[int]]:
+    """Сотрудники пачками примерно по max_rows минутных строк (сотрудник больше лимита — отдельной пачкой)"""
+    batch, rows = [], 0
+    for employee_id, count in minutes.items():
+        if batch and rows + count > max_rows:
+            yield batch
+            batch, rows = [], 0
+        batch.append(employee_id)
+        rows += count
+    if batch:
+        yield batch
+
+
+def _build_batch(logs: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Интервалы, переходы и проверки смен пачки сотрудников (CPU, выполняется вне event loop)"""
+    intervals = build_intervals(logs)
+    if intervals.empty:
+        return intervals, pd.DataFrame(), pd.DataFrame()
+    return intervals, build_transitions(intervals), shift_flags(intervals)
+
+
+async def rebuild_file_timeline(db: AsyncSession, processed_file_id: int) -> int:
+    """
+    Пересобирает timeline_intervals и zone_transitions файла Report 11 из его ble_logs.
+    Работает в транзакции вызывающего (commit делает он). Возвращает число интервалов.
+    Пачки считаются в отдельном потоке: запросы API и heartbeat задач не ждут пересборку.
+    """
+    await db.execute(delete(TimelineInterval).where(TimelineInterval.processed_file_id == processed_file_id))
+    await db.execute(delete(ZoneTransition).where(ZoneTransition.processed_file_id == processed_file_id))
+
+    minutes = await ble_store.file_employee_minutes(db, processed_file_id)
+
+    total = 0
+    loader = BulkLoader(db)
+    for employee_ids in employee_batches(minutes):
+        logs = await ble_store.load_file_minutes(db, processed_file_id, employee_ids)
+        intervals, transitions, flags = await asyncio.to_thread(_build_batch, logs)
+        del logs
+        if intervals.empty:
+            continue
+        _log_flags(flags, processed_file_id)
+        total += await loader.load(TimelineInterval, intervals, processed_file_id=processed_file_id)
+        await loader.load(ZoneTransition, transitions, processed_file_id=processed_file_id)
+
+    logger.info(f"Таймлайн файла {processed_file_id}: {total} интервалов")
+    return total
+
+
+async def rebuild_all_timelines(db: AsyncSession) -> int:
+    """Пересборка таймлайнов всех загруженных файлов Report 11"""
+    file_ids = (await db.execute(
+        select(ProcessedFile.id).where(ProcessedFile.report_type == "report11")
+    )).scalars().all()
+    total = 0
+    for file_id in file_ids:
+        total += await rebuild_file_timeline(db, file_id)
+        await db.commit()
+    return total
+
+
+async def get_shift_timeline(
+    db: AsyncSession, employee_id: int, shift_day: Optional[date] = None,
+) -> Optional[dict]:
+    """Интервалы и проверки одной смены (по умолчанию — последней загруженной)"""
+    if shift_day is None:
+        shift_day = (await db.execute(
+            select(TimelineInterval.shift_day)
+            .where(TimelineInterval.employee_id == employee_id)
+            .order_by(TimelineInterval.shift_day.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        if shift_day is None:
+            return None
+
+    rows = (await db.execute(
+        select(*(TimelineInterval.__table__.c[name] for name in INTERVAL_COLUMNS))
+        .where(TimelineInterval.employee_id == employee_id, TimelineInterval.shift_day == shift_day)
+        .order_by(TimelineInterval.start_at)
+    )).all()
+    if not rows:
+        return None
+
+    intervals = pd.DataFrame(rows, columns=INTERVAL_COLUMNS)
+    flags = shift_flags(intervals).iloc[0]
+    return {
+        "shift_day": shift_day.isoformat(),
+        "start_at": rows[0].start_at.isoformat(),
+        "end_at": rows[-1].end_at.isoformat(),
+        "intervals": [
+            {
+                "start_at": r.start_at.isoformat(),
+                "end_at": r.end_at.isoformat(),
+                "zone_id": r.zone_id,
+                "minutes": r.minutes,
+                "gap_before_seconds": r.gap_before_seconds,
+            }
+            for r in rows
+        ],
+        "flags": {
+            "tag0_rows": int(flags["tag0_rows"]),
+            "tag0_warning": bool(flags["tag0_warning"]),
+            "gaps": int(flags["gaps"]),
+            "gap_seconds": int(flags["gap_seconds"]),
+        },
+    }
@@ -0,0 +1,145 @@
+"""
+Потоковое чтение листа Excel фиксированными пачками строк.
+
+openpyxl в режиме read_only разбирает XML листа по мере итерации, поэтому
+в памяти одновременно находится только текущая пачка строк, а не весь лист
+целиком, и из каждой строки берутся только нужные колонки. Старый формат
+.xls (не zip) так читать нельзя — для него лист читается через pandas
+полностью и отдаётся теми же пачками.
+"""
+import io
+import logging
+from itertools import islice
+from operator import itemgetter
+from typing import Iterator, Optional, Sequence, Union
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Все отчёты (8, 10, 11) содержат данные на ВТОРОМ листе (index 1).
+# Если второго листа нет, берём первый.
+DEFAULT_SHEET_INDEX = 1
+
+_ZIP_SIGNATURE = b"PK\x03\x04"
+
+
+def _pick_sheet(sheet_names: list[str], sheet_index: int) -> str:
+    return sheet_names[sheet_index] if len(sheet_names) > sheet_index else sheet_names[0]
+
+
+def _header_names(header_row: tuple) -> list[str]:
+    """Имена колонок как у pandas.read_excel: пустые -> 'Unnamed: i', повторы -> 'name.1'"""
+    names = []
+    seen = {}
+    for i, value in enumerate(header_row):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+class SheetReader:
+    """
+    Лист книги, открытый один раз: заголовок (columns) доступен сразу после
+    открытия — по нему выбирается схема отчёта, — а строки читаются пачками
+    только по нужным колонкам (usecols).
+
+    streaming=False (и старый .xls) — лист разбирается pandas целиком, одной пачкой.
+    """
+
+    def __init__(
+        self,
+        content: Union[bytes, io.BytesIO],
+        sheet_index: int = DEFAULT_SHEET_INDEX,
+        streaming: bool = True,
+    ):
+        buffer = content if isinstance(content, io.BytesIO) else io.BytesIO(content)
+        self._workbook = None
+        self._rows = None
+        self._excel = None
+        if streaming and buffer.getbuffer()[:4].tobytes() == _ZIP_SIGNATURE:
+            from openpyxl import load_workbook
+
+            self._workbook = load_workbook(buffer, read_only=True, data_only=True)
+            self.sheet_name = _pick_sheet(self._workbook.sheetnames, sheet_index)
+            logger.info(f"Streaming sheet '{self.sheet_name}' (index {sheet_index})")
+            self._rows = self._workbook[self.sheet_name].iter_rows(values_only=True)
+            header = next(self._rows, None)
+            self.columns = _header_names(header) if header is not None else []
+        else:
+            self._excel = pd.ExcelFile(buffer)
+            self.sheet_name = _pick_sheet(self._excel.sheet_names, sheet_index)
+            logger.info(f"Reading sheet '{self.sheet_name}' (index {sheet_index}) целиком")
+            self.columns = [str(c) for c in self._excel.parse(self.sheet_name, nrows=0).columns]
+
+    def chunks(self, chunk_size: Optional[int], usecols: Optional[Sequence[int]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Пачки по chunk_size строк (None — весь лист одной пачкой) с колонками
+        usecols (номера в листе, по возрастанию; None — все). Индекс DataFrame
+        сквозной по всему листу (0 — первая строка данных).
+        """
+        if self._excel is not None:
+            df = self._excel.parse(self.sheet_name, usecols=list(usecols) if usecols is not None else None)
+            step = chunk_size or max(len(df), 1)
+            for start in range(0, len(df), step):
+                yield df.iloc[start:start + step]
+            return
+        if not self.columns:
+            return
+
+        width = len(self.columns)
+        indices = list(range(width)) if usecols is None else list(usecols)
+        names = [self.columns[i] for i in indices]
+        pick = _row_picker(indices, width)
+
+        # Пустые строки (по всем колонкам листа) пропускаются, как в pandas.read_excel
+        data_rows = (row for row in self._rows if any(v is not None for v in row))
+        offset = 0
+        while True:
+            batch = [pick(row) for row in islice(data_rows, chunk_size)]
+            if not batch:
+                break
+            yield pd.DataFrame(batch, columns=names, index=pd.RangeIndex(offset, offset + len(batch)))
+            offset += len(batch)
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def __enter__(self) -> "SheetReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _row_picker(indices: list[int], width: int):
+    """Строка листа -> значения колонок indices (короткие строки дополняются None)"""
+    if indices == list(range(width)):
+        return lambda row: row[:width] if len(row) >= width else row + (None,) * (width - len(row))
+    if not indices:
+        return lambda row: ()
+    last = max(indices)
+    if len(indices) == 1:
+        (index,) = indices
+        return lambda row: (row[index] if index < len(row) else None,)
+    take = itemgetter(*indices)
+    return lambda row: take(row) if len(row) > last else take(row + (None,) * (last + 1 - len(row)))
+
+
+def iter_sheet_chunks(
+    content: Union[bytes, io.BytesIO],
+    chunk_size: int,
+    sheet_index: int = DEFAULT_SHEET_INDEX,
+) -> Iterator[pd.DataFrame]:
+    """
+    Итерирует лист книги пачками по chunk_size строк (все колонки).
+    Индекс DataFrame сквозной по всему листу (0 — первая строка данных).
+    """
+    with SheetReader(content, sheet_index) as sheet:
+        yield from sheet.chunks(chunk_size)
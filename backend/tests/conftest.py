@@ -0,0 +1,88 @@
+"""Общие фикстуры: SQLite-база на тест, Google Drive в памяти, сборка xlsx-отчётов"""
+import hashlib
+import io
+from datetime import datetime, timedelta
+import pytest
+import pytest_asyncio
+from openpyxl import Workbook
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import src.models  # noqa: F401 — регистрирует таблицы в Base.metadata
+from src.database import Base
+
+REPORT10_HEADERS = ["ТН", "ФИО", "Начало простоя", "Конец простоя", "Длительность", "chosen_ble_tag_number"]
+
+
+def xlsx(headers: list, rows) -> bytes:
+    """Книга как у выгрузок: данные на втором листе"""
+    wb = Workbook()
+    wb.active.title = "Сводка"
+    sheet = wb.create_sheet("Данные")
+    sheet.append(headers)
+    for row in rows:
+        sheet.append(list(row))
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def downtime_rows(count: int, first_tn: int = 1000, start: datetime = datetime(2025, 3, 3, 9, 0)) -> list[list]:
+    """Строки Report 10: по простою на сотрудника, каждый следующий на 10 минут позже"""
+    rows = []
+    for i in range(count):
+        begin = start + timedelta(minutes=10 * i)
+        rows.append([first_tn + i, f"Сотрудник {i}", begin, begin + timedelta(minutes=5), 5, 1001])
+    return rows
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+class FakeDrive:
+    """
+    DriveService в памяти: файлы папок, лента изменений и журнал скачиваний.
+    Page token — позиция в ленте (число изменений до него).
+    """
+
+    def __init__(self):
+        self.files: dict[str, dict] = {}
+        self.contents: dict[str, bytes] = {}
+        self.changes: list[str] = []
+        self.downloads: list[str] = []
+        self._clock = datetime(2025, 3, 3, 12, 0)
+
+    def put(self, file_id: str, name: str, content: bytes):
+        """Создаёт или заменяет файл (новые md5Checksum и modifiedTime, запись в ленте)"""
+        self._clock += timedelta(minutes=1)
+        self.files[file_id] = {
+            "id": file_id,
+            "name": name,
+            "modifiedTime": self._clock.isoformat() + "Z",
+            "md5Checksum": hashlib.md5(content).hexdigest(),
+        }
+        self.contents[file_id] = content
+        self.changes.append(file_id)
+
+    def list_excel_files(self) -> list[dict]:
+        return list(self.files.values())
+
+    def get_start_page_token(self) -> str:
+        return str(len(self.changes))
+
+    def list_changes(self, page_token: str) -> tuple[list[dict], str]:
+        changed = {file_id: self.files[file_id] for file_id in self.changes[int(page_token):]}
+        return list(changed.values()), str(len(self.changes))
+
+    def download_file(self, file_id: str) -> bytes:
+        self.downloads.append(file_id)
+        return self.contents[file_id]
+
+
+@pytest.fixture
+def drive() -> FakeDrive:
+    return FakeDrive()
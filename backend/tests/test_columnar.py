@@ -0,0 +1,81 @@
+"""Колоночная нормализация Report 11 совпадает с прежним построчным разбором"""
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from src.services.columnar import normalize_report11, parse_date, parse_datetime, to_int
+
+
+def legacy_report11(df: pd.DataFrame) -> list[tuple]:
+    """Прежний ReportParser._parse_report11: цикл по df.to_dict('records') без записи в БД"""
+    rows = []
+    for row in df.to_dict("records"):
+        try:
+            tn = to_int(row["tn"]) if pd.notna(row.get("tn")) else None
+            if not tn:
+                continue
+            shift_day = parse_date(row.get("shift_day"))
+            time_only = parse_datetime(row.get("time_only"))
+            if not shift_day or not time_only:
+                continue
+            ble_tag = to_int(row.get("ble_tag"))
+            if ble_tag is None:
+                continue
+            zone_id = to_int(row.get("zone_id")) or 1
+            rows.append((tn, shift_day, datetime.combine(shift_day, time_only.time()), ble_tag, zone_id))
+        except Exception:
+            continue
+    return rows
+
+
+def _rows(frame: pd.DataFrame) -> list[tuple]:
+    return [
+        (int(tn), day.date(), ts.to_pydatetime(), int(tag), int(zone))
+        for tn, day, ts, tag, zone in frame[["tn", "shift_day", "time_only", "ble_tag", "zone_id"]].itertuples(index=False)
+    ]
+
+
+MIXED = pd.DataFrame({
+    "tn": [101, "102", 103.0, None, "abc", 0, 104, 105, 106, "107", 108, 109, 110, 111],
+    "shift_day": [
+        datetime(2025, 3, 3), "04.03.2025", "2025-03-05", "03.03.2025", None, "03.03.2025",
+        "garbage", "03.03.2025", "03.03.2025", "03.03.2025", "03.03.2025", "03.03.2025", "13.03.2025", "03.03.2025",
+    ],
+    "time_only": [
+        "08:15", datetime(2025, 3, 3, 23, 59, 30), "9:05", "03.03.2025 10:00", "10:00", "10:00",
+        "10:00", None, "xx", "10:00", "10:00", "10:00", "1:00", datetime(2024, 1, 1, 0, 0),
+    ],
+    "ble_tag": [1001, "1002", 1003.0, 1, 1, 1, 1, 1, 1, None, "x", 5, "0", 7.9],
+    "zone_id": [1, None, "3", 2, 2, 2, 2, 2, 2, 2, 2, 0, "4.0", -1],
+}, dtype=object)
+
+TYPED = pd.DataFrame({
+    "tn": np.array([201, 202, 0, 203], dtype="float64"),
+    "shift_day": pd.to_datetime(["2025-03-03", "2025-03-03", "2025-03-03", None]),
+    "time_only": pd.to_datetime([
+        datetime(2025, 3, 3, 22), datetime(2025, 3, 4, 1, 30, 15), datetime(2025, 3, 3, 22), datetime(2025, 3, 3, 22),
+    ]),
+    "ble_tag": np.array([0, 1001, 1001, 1001], dtype="int64"),
+    "zone_id": np.array([np.nan, 2, 3, 4], dtype="float64"),
+})
+
+
+@pytest.mark.parametrize("df", [MIXED, TYPED], ids=["mixed", "typed"])
+def test_matches_row_by_row_parser(df):
+    expected = legacy_report11(df)
+    normalized = normalize_report11(df)
+
+    assert _rows(normalized.frame) == expected
+    assert normalized.rejected_summary()["total"] == len(df) - len(expected)
+
+
+def test_rejected_rows_keep_sheet_index_and_reason():
+    df = MIXED.set_axis(pd.RangeIndex(100, 100 + len(MIXED)))
+    rejected = normalize_report11(df).rejected.set_index("row")["reason"].to_dict()
+
+    assert rejected[103] == "tn"  # пустой ТН
+    assert rejected[104] == "tn"  # не число
+    assert rejected[105] == "tn"  # ТН 0
+    assert rejected[106] == "shift_day"
+    assert rejected[107] == "time_only"
+    assert rejected[109] == "ble_tag"
@@ -0,0 +1,52 @@
+"""Почасовая раскладка простоев для тепловой карты"""
+from datetime import datetime
+import pandas as pd
+from src.services.downtime_hours import split_by_hour
+
+
+def _downtimes(*spans, employee_id: int = 1, ble_tag_id=1001) -> pd.DataFrame:
+    return pd.DataFrame({
+        "employee_id": employee_id,
+        "ble_tag_id": ble_tag_id,
+        "dt_start": [start for start, _ in spans],
+        "dt_end": [end for _, end in spans],
+    })
+
+
+def _buckets(frame: pd.DataFrame) -> dict:
+    return {(row.day.date().isoformat(), row.hour): row.seconds for row in frame.itertuples()}
+
+
+def test_downtime_is_split_at_hour_boundaries():
+    frame = split_by_hour(_downtimes((datetime(2025, 3, 3, 9, 50), datetime(2025, 3, 3, 10, 20))))
+    assert _buckets(frame) == {("2025-03-03", 9): 600, ("2025-03-03", 10): 1200}
+
+
+def test_downtime_across_midnight_goes_to_both_days():
+    frame = split_by_hour(_downtimes((datetime(2025, 3, 3, 23, 30), datetime(2025, 3, 4, 1, 15))))
+    assert _buckets(frame) == {("2025-03-03", 23): 1800, ("2025-03-04", 0): 3600, ("2025-03-04", 1): 900}
+
+
+def test_downtime_ending_on_the_hour_does_not_touch_next_hour():
+    frame = split_by_hour(_downtimes((datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 10, 0))))
+    assert _buckets(frame) == {("2025-03-03", 9): 3600}
+
+
+def test_same_bucket_is_summed_and_empty_downtimes_are_skipped():
+    frame = split_by_hour(_downtimes(
+        (datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 9, 10)),
+        (datetime(2025, 3, 3, 9, 30), datetime(2025, 3, 3, 9, 45)),
+        (datetime(2025, 3, 3, 11, 0), datetime(2025, 3, 3, 11, 0)),
+        (datetime(2025, 3, 3, 12, 0), datetime(2025, 3, 3, 11, 0)),
+    ))
+    assert _buckets(frame) == {("2025-03-03", 9): 1500}
+    assert frame["seconds"].sum() == 1500
+
+
+def test_downtime_without_tag_keeps_its_own_bucket():
+    frame = split_by_hour(pd.concat([
+        _downtimes((datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 9, 10))),
+        _downtimes((datetime(2025, 3, 3, 9, 0), datetime(2025, 3, 3, 9, 5)), ble_tag_id=None),
+    ], ignore_index=True))
+    by_tag = {(None if pd.isna(tag) else int(tag)): seconds for tag, seconds in zip(frame["ble_tag_id"], frame["seconds"])}
+    assert by_tag == {1001: 600, None: 300}
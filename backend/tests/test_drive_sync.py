@@ -0,0 +1,103 @@
+"""Инкрементальная синхронизация Drive: водяные знаки файлов и page token ленты изменений"""
+import pytest
+from sqlalchemy import select
+from src.models import DriveFileState, ProcessedFile
+from src.services.drive_watermarks import DriveWatermarks
+from src.services.sync_pipeline import SyncPipeline
+from tests.conftest import REPORT10_HEADERS, downtime_rows, xlsx
+
+pytestmark = pytest.mark.asyncio
+
+FIRST = "10_отчет по простоям_OBJ_A_first.xlsx"
+SECOND = "10_отчет по простоям_OBJ_A_second.xlsx"
+THIRD = "10_отчет по простоям_OBJ_B_third.xlsx"
+
+
+def _report(rows: int, first_tn: int = 1000) -> bytes:
+    return xlsx(REPORT10_HEADERS, downtime_rows(rows, first_tn))
+
+
+async def _sync(drive, session_factory, changes_feed: bool = False) -> dict:
+    pipeline = SyncPipeline(
+        download_workers=1, parse_workers=1, db_writers=1,
+        drive_factory=lambda: drive, session_factory=session_factory,
+    )
+    pipeline.incremental = True
+    pipeline.changes_feed = changes_feed
+    drive.downloads.clear()
+    return await pipeline.run()
+
+
+async def test_unchanged_files_are_not_downloaded(drive, session_factory):
+    drive.put("f1", FIRST, _report(3))
+    drive.put("f2", SECOND, _report(4, first_tn=2000))
+
+    result = await _sync(drive, session_factory)
+    assert result["processed"] == 2 and not result["errors"]
+    assert sorted(drive.downloads) == ["f1", "f2"]
+
+    result = await _sync(drive, session_factory)
+    assert (result["processed"], result["unchanged"]) == (0, 2)
+    assert drive.downloads == []
+
+    drive.put("f2", SECOND, _report(5, first_tn=2000))
+    result = await _sync(drive, session_factory)
+    assert (result["processed"], result["unchanged"]) == (1, 1)
+    assert drive.downloads == ["f2"]
+    assert result["files"][0]["records"] == 5
+
+
+async def test_watermark_advances_only_for_synced_files(drive, session_factory):
+    drive.put("f1", FIRST, _report(3))
+    drive.put("f2", SECOND, b"PK\x03\x04not a workbook")
+
+    result = await _sync(drive, session_factory)
+    assert result["processed"] == 1
+    assert [error["filename"] for error in result["errors"]] == [SECOND]
+
+    async with session_factory() as db:
+        states = {s.file_id: s for s in (await db.execute(select(DriveFileState))).scalars()}
+        processed_id = (await db.execute(
+            select(ProcessedFile.id).where(ProcessedFile.filename == FIRST)
+        )).scalar_one()
+    assert set(states) == {"f1"}
+    assert states["f1"].md5_checksum == drive.files["f1"]["md5Checksum"]
+    assert states["f1"].modified_time == drive.files["f1"]["modifiedTime"]
+    assert states["f1"].processed_file_id == processed_id
+
+    # Упавший файл не получил водяной знак и скачивается снова
+    drive.put("f2", SECOND, _report(2, first_tn=2000))
+    result = await _sync(drive, session_factory)
+    assert (result["processed"], result["unchanged"]) == (1, 1)
+    assert drive.downloads == ["f2"]
+
+
+async def test_changes_feed_resumes_from_saved_page_token(drive, session_factory):
+    drive.put("f1", FIRST, _report(3))
+
+    # Первый запуск: токена ещё нет — полный обход папок, позиция ленты запоминается
+    result = await _sync(drive, session_factory, changes_feed=True)
+    assert result["processed"] == 1
+    async with session_factory() as db:
+        assert await DriveWatermarks(db).get_page_token() == "1"
+
+    drive.put("f2", SECOND, _report(4, first_tn=2000))
+    result = await _sync(drive, session_factory, changes_feed=True)
+    assert result["processed"] == 1
+    assert drive.downloads == ["f2"]
+    async with session_factory() as db:
+        assert await DriveWatermarks(db).get_page_token() == "2"
+
+    # С ошибкой позиция не двигается: следующий проход снова увидит это изменение
+    drive.put("f3", THIRD, b"PK\x03\x04not a workbook")
+    result = await _sync(drive, session_factory, changes_feed=True)
+    assert len(result["errors"]) == 1
+    async with session_factory() as db:
+        assert await DriveWatermarks(db).get_page_token() == "2"
+
+    drive.put("f3", THIRD, _report(2, first_tn=3000))
+    result = await _sync(drive, session_factory, changes_feed=True)
+    assert result["processed"] == 1 and not result["errors"]
+    assert drive.downloads == ["f3"]
+    async with session_factory() as db:
+        assert await DriveWatermarks(db).get_page_token() == "4"
@@ -0,0 +1,57 @@
+"""Построчный diff при перезаписи файла: счётчики added / removed / unchanged"""
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+from src.models import Downtime
+from src.services.report_parser import ReportParser
+from src.services.row_diff import RowDiff, fingerprint
+from tests.conftest import REPORT10_HEADERS, downtime_rows, xlsx
+
+FILENAME = "10_отчет по простоям_OBJ_A_diff.xlsx"
+
+
+def _downtimes(starts: list[int]) -> pd.DataFrame:
+    """Строки downtimes (без id): простои по 5 минут, начало — минута от 09:00"""
+    begin = [datetime(2025, 3, 3, 9) + timedelta(minutes=m) for m in starts]
+    return pd.DataFrame({
+        "employee_id": [1] * len(starts),
+        "dt_start": begin,
+        "dt_end": [b + timedelta(minutes=5) for b in begin],
+        "duration_minutes": [5] * len(starts),
+        "ble_tag_id": [1001] * len(starts),
+    })
+
+
+def test_counts_added_removed_and_repeated_rows():
+    stored_rows = _downtimes([0, 10, 20, 20, 30])  # строка 20 повторяется дважды
+    stored = pd.DataFrame({"id": range(1, 6), "hash": fingerprint(stored_rows, Downtime)})
+    diff = RowDiff(Downtime, stored.astype({"id": "int64", "hash": "uint64"}))
+
+    # Пачками: 0 и 20 остались (20 — один раз из двух), 10 и 30 пропали, 40 и 50 новые
+    added = pd.concat([diff.split(_downtimes([0, 40])), diff.split(_downtimes([20, 50]))])
+
+    assert diff.summary() == {"added": 2, "removed": 3, "unchanged": 2}
+    assert sorted(added["dt_start"].dt.minute) == [40, 50]
+    assert sorted(diff.removed_ids()) == [2, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_reupload_applies_only_changed_rows(session_factory):
+    rows = downtime_rows(6)
+    async with session_factory() as db:
+        first = await ReportParser(db).parse_and_save(xlsx(REPORT10_HEADERS, rows), FILENAME, sync_refs=False)
+    assert (first["status"], first["records_count"]) == ("processed", 6)
+
+    # Две строки удалены, три добавлены, одна изменена (= удалена + добавлена)
+    changed = rows[2:] + downtime_rows(3, first_tn=5000)
+    changed[0] = changed[0][:4] + [7, changed[0][5]]
+    async with session_factory() as db:
+        second = await ReportParser(db).parse_and_save(xlsx(REPORT10_HEADERS, changed), FILENAME, sync_refs=False)
+
+    assert second["status"] == "diffed"
+    assert second["diff"] == {"added": 4, "removed": 3, "unchanged": 3}
+    assert second["processed_file_id"] == first["processed_file_id"]
+    async with session_factory() as db:
+        count = (await db.execute(select(func.count()).select_from(Downtime))).scalar()
+    assert count == len(changed)
@@ -0,0 +1,65 @@
+"""Таймлайн смены: склейка ночной смены через полночь и округление минут"""
+from datetime import date, datetime, timedelta
+import pandas as pd
+from src.services.timeline import OUTSIDE_ZONE, build_intervals, round_minutes, stitch_midnight
+
+DAY = date(2025, 3, 3)
+
+
+def _logs(employee_id: int, start: datetime, minutes: int, zone_of=lambda i: 1) -> pd.DataFrame:
+    """Минутные строки, как в ble_logs: время хранится как день смены + время суток"""
+    stamps = [start + timedelta(minutes=i) for i in range(minutes)]
+    return pd.DataFrame({
+        "employee_id": employee_id,
+        "shift_day": pd.Timestamp(DAY),
+        "time_only": [datetime.combine(DAY, ts.time()) for ts in stamps],
+        "ble_tag": 1001,
+        "zone_id": [zone_of(i) for i in range(minutes)],
+    })
+
+
+def test_night_shift_minutes_after_midnight_move_to_next_day():
+    # 22:00 -> 02:00: в ble_logs минуты после полуночи лежат в начале того же дня
+    logs = _logs(1, datetime(2025, 3, 3, 22), 240).sample(frac=1, random_state=0)
+
+    stitched = stitch_midnight(logs)
+
+    expected = [datetime(2025, 3, 3, 22) + timedelta(minutes=i) for i in range(240)]
+    assert sorted(stitched) == expected
+    assert stitched.index.equals(logs.index)
+
+
+def test_day_shift_is_not_shifted():
+    logs = _logs(1, datetime(2025, 3, 3, 8), 60)
+    assert list(stitch_midnight(logs)) == list(pd.to_datetime(logs["time_only"]))
+
+
+def test_night_shift_becomes_one_interval_per_zone():
+    # 23:30 -> 00:30, зона меняется в 00:10; у второго сотрудника дневная смена
+    logs = pd.concat([
+        _logs(1, datetime(2025, 3, 3, 23, 30), 60, zone_of=lambda i: 1 if i < 40 else 2),
+        _logs(2, datetime(2025, 3, 3, 9), 30),
+    ], ignore_index=True)
+
+    intervals = build_intervals(logs).sort_values(["employee_id", "start_at"]).reset_index(drop=True)
+
+    night = intervals[intervals["employee_id"] == 1]
+    assert list(night["zone_id"]) == [1, 2]
+    assert list(night["start_at"]) == [pd.Timestamp(2025, 3, 3, 23, 30), pd.Timestamp(2025, 3, 4, 0, 10)]
+    assert list(night["end_at"]) == [pd.Timestamp(2025, 3, 4, 0, 10), pd.Timestamp(2025, 3, 4, 0, 30)]
+    assert list(night["minutes"]) == [40, 20]
+    assert list(night["gap_before_seconds"]) == [0, 0]
+    day = intervals[intervals["employee_id"] == 2]
+    assert list(day["minutes"]) == [30]
+
+
+def test_tag_zero_is_outside_zone():
+    logs = _logs(1, datetime(2025, 3, 3, 9), 10)
+    logs.loc[5:, "ble_tag"] = 0
+    intervals = build_intervals(logs)
+    assert list(intervals["zone_id"]) == [1, OUTSIDE_ZONE]
+
+
+def test_round_minutes_uses_051_threshold():
+    # 30 с — 0.5 минуты: вниз; 31 с — 0.517: вверх
+    assert list(round_minutes([90, 91, 60, 150, 151])) == [1, 2, 1, 2, 3]
@@ -12,14 +12,105 @@ export interface Employee {
     trend?: 'up' | 'down';
 }
 
+export interface Page<T> {
+    items: T[];
+    next_cursor: string | null; // null — последняя страница
+}
+
+export interface EmployeeQuery {
+    limit?: number;
+    cursor?: string | null;
+    q?: string; // ФИО, отдел или табельный номер
+    department?: string;
+    object_name?: string;
+}
+
+export interface TimelineInterval {
+    start_at: string;
+    end_at: string;
+    zone_id: number; // 0 — вне зоны BLE
+    minutes: number;
+    gap_before_seconds: number;
+}
+
+export interface ShiftTimeline {
+    tn_number: number;
+    shift_day: string;
+    start_at: string;
+    end_at: string;
+    intervals: TimelineInterval[];
+    flags: {
+        tag0_rows: number;
+        tag0_warning: boolean;
+        gaps: number;
+        gap_seconds: number;
+    };
+}
+
+export interface EmployeeSummary {
+    tn_number: number;
+    period: { from: string; to: string };
+    kpi: {
+        shifts: number;
+        work_percent: number | null;
+        idle_percent: number | null;
+        go_percent: number | null;
+        work_seconds: number;
+        idle_seconds: number;
+        go_seconds: number;
+        downtime_count: number;
+        downtime_minutes: number;
+        log_minutes: number;
+    };
+    daily: {
+        date: string;
+        work_percent: number | null;
+        idle_percent: number | null;
+        go_percent: number | null;
+        downtime_minutes: number;
+        log_minutes: number;
+    }[];
+    zones: { zone_id: number; minutes: number }[];
+    downtime_tags: { ble_tag_id: number | null; description: string | null; count: number; minutes: number }[];
+}
+
 export const employeesService = {
-    getAll: async (): Promise<Employee[]> => {
-        const response = await api.get('/api/employees/');
+    // Одна страница справочника (keyset: следующая — по next_cursor)
+    list: async (query: EmployeeQuery = {}): Promise<Page<Employee>> => {
+        const params = Object.fromEntries(
+            Object.entries(query).filter(([, value]) => value !== undefined && value !== null && value !== '')
+        );
+        const response = await api.get('/api/employees/', { params });
         return response.data;
     },
 
+    // Все сотрудники, постранично (для небольших выборок и фильтров)
+    getAll: async (query: Omit<EmployeeQuery, 'cursor'> = {}): Promise<Employee[]> => {
+        const result: Employee[] = [];
+        let cursor: string | null = null;
+        do {
+            const page: Page<Employee> = await employeesService.list({ limit: 500, ...query, cursor });
+            result.push(...page.items);
+            cursor = page.next_cursor;
+        } while (cursor);
+        return result;
+    },
+
     getById: async (id: number): Promise<Employee> => {
         const response = await api.get(`/api/employees/${id}`);
         return response.data;
+    },
+
+    getSummary: async (
+        tnNumber: number,
+        params: { date_from?: string; date_to?: string; object_name?: string } = {}
+    ): Promise<EmployeeSummary> => {
+        const response = await api.get(`/api/employees/${tnNumber}/summary`, { params });
+        return response.data;
+    },
+
+    getTimeline: async (tnNumber: number, day?: string): Promise<ShiftTimeline> => {
+        const response = await api.get(`/api/employees/${tnNumber}/timeline`, { params: { day } });
+        return response.data;
     }
 };
@@ -12,6 +12,40 @@ export interface ActivityStats {
     start_zone: Metric;
 }
 
+export interface DowntimeHeatmap {
+    mode: 'weekday' | 'day';
+    rows: string[]; // Пн..Вс или даты
+    hours: number[]; // 0..23
+    minutes: number[][]; // minutes[row][hour]
+    worst_performers: {
+        id: number;
+        tn_number: number;
+        name: string;
+        department: string | null;
+        downtime_minutes: number;
+    }[];
+    tags: { ble_tag_id: number | null; description: string | null; downtime_minutes: number }[];
+}
+
+export interface MovementZone {
+    zone_id: number;
+    name: string | null;
+}
+
+export interface MovementStats {
+    zones: MovementZone[];
+    matrix: number[][]; // matrix[from][to] в порядке zones
+    top_routes: {
+        from_zone: number;
+        to_zone: number;
+        from_name: string | null;
+        to_name: string | null;
+        transitions: number;
+        employees: number;
+    }[];
+    dwell: (MovementZone & { visits: number; avg_minutes: number })[];
+}
+
 export const statsService = {
     getDailyStats: async (startDate?: string, endDate?: string, objectName?: string | null): Promise<any> => {
         // Keep for chart data later
@@ -42,5 +76,25 @@ export const statsService = {
 
         const response = await api.get('/api/stats/top-performers', { params });
         return response.data;
+    },
+
+    getDowntimeHeatmap: async (startDate?: string, endDate?: string, objectName?: string | null, mode: 'weekday' | 'day' = 'weekday'): Promise<DowntimeHeatmap> => {
+        const params: any = { mode };
+        if (startDate) params.date_from = startDate;
+        if (endDate) params.date_to = endDate;
+        if (objectName) params.object_name = objectName;
+
+        const response = await api.get('/api/stats/downtime/heatmap', { params });
+        return response.data;
+    },
+
+    getMovementStats: async (startDate?: string, endDate?: string, objectName?: string | null, limit: number = 10): Promise<MovementStats> => {
+        const params: any = { limit };
+        if (startDate) params.date_from = startDate;
+        if (endDate) params.date_to = endDate;
+        if (objectName) params.object_name = objectName;
+
+        const response = await api.get('/api/stats/movement', { params });
+        return response.data;
     }
 };
@@ -10,17 +10,33 @@ interface EmployeeUI extends Employee {
     trend: 'up' | 'down';
 }
 
+const PAGE_SIZE = 20;
+
 const UserTable = ({ onUserSelect }: { onUserSelect: (user: EmployeeUI) => void }) => {
     const [searchTerm, setSearchTerm] = useState('');
     const [employees, setEmployees] = useState<EmployeeUI[]>([]);
     const [loading, setLoading] = useState(true);
+    // Курсоры открытых страниц: cursors[i] — начало страницы i
+    const [cursors, setCursors] = useState<(string | null)[]>([null]);
+    const [nextCursor, setNextCursor] = useState<string | null>(null);
+
+    const page = cursors.length - 1;
+
+    useEffect(() => {
+        // Поиск выполняется на сервере — начинаем с первой страницы
+        setCursors([null]);
+    }, [searchTerm]);
 
     useEffect(() => {
         const fetchEmployees = async () => {
             try {
-                const data = await employeesService.getAll();
+                const data = await employeesService.list({
+                    limit: PAGE_SIZE,
+                    cursor: cursors[page],
+                    q: searchTerm.trim(),
+                });
                 // Transform data for UI - adding mock computed fields until backend provides them
-                const mapped: EmployeeUI[] = data.map(emp => ({
+                const mapped: EmployeeUI[] = data.items.map(emp => ({
                     ...emp,
                     activity: Math.floor(Math.random() * 100),
                     downtime: Math.floor(Math.random() * 60),
@@ -28,19 +44,16 @@ const UserTable = ({ onUserSelect }: { onUserSelect: (user: EmployeeUI) => void
                     trend: Math.random() > 0.5 ? 'up' : 'down'
                 }));
                 setEmployees(mapped);
+                setNextCursor(data.next_cursor);
             } catch (error) {
                 console.error("Failed to fetch employees", error);
             } finally {
                 setLoading(false);
             }
         };
-        fetchEmployees();
-    }, []);
-
-    const filteredUsers = employees.filter(user =>
-        user.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-        (user.department && user.department.toLowerCase().includes(searchTerm.toLowerCase()))
-    );
+        const timer = setTimeout(fetchEmployees, 300);
+        return () => clearTimeout(timer);
+    }, [cursors]);
 
     if (loading) {
         return <div className="bg-white p-6 rounded-3xl text-center text-gray-500">Загрузка сотрудников...</div>;
@@ -80,7 +93,7 @@ const UserTable = ({ onUserSelect }: { onUserSelect: (user: EmployeeUI) => void
                         </tr>
                     </thead>
                     <tbody className="divide-y divide-gray-50">
-                        {filteredUsers.map((user) => (
+                        {employees.map((user) => (
                             <tr
                                 key={user.id}
                                 className="group hover:bg-gray-50/50 transition-colors cursor-pointer"
@@ -136,10 +149,18 @@ const UserTable = ({ onUserSelect }: { onUserSelect: (user: EmployeeUI) => void
             </div>
 
             <div className="p-4 bg-gray-50/50 border-t border-gray-50 flex items-center justify-between text-xs text-gray-400 font-medium">
-                <div>Показано 1-{filteredUsers.length} из {employees.length}</div>
+                <div>Показано {page * PAGE_SIZE + 1}-{page * PAGE_SIZE + employees.length}</div>
                 <div className="flex items-center gap-2">
-                    <button className="px-3 py-1 bg-white rounded-lg border border-gray-100 hover:bg-gray-50 transition-colors disabled:opacity-50" disabled>Назад</button>
-                    <button className="px-3 py-1 bg-white rounded-lg border border-gray-100 hover:bg-gray-50 transition-colors">Вперед</button>
+                    <button
+                        className="px-3 py-1 bg-white rounded-lg border border-gray-100 hover:bg-gray-50 transition-colors disabled:opacity-50"
+                        disabled={page === 0}
+                        onClick={() => setCursors(cursors.slice(0, -1))}
+                    >Назад</button>
+                    <button
+                        className="px-3 py-1 bg-white rounded-lg border border-gray-100 hover:bg-gray-50 transition-colors disabled:opacity-50"
+                        disabled={!nextCursor}
+                        onClick={() => setCursors([...cursors, nextCursor])}
+                    >Вперед</button>
                 </div>
             </div>
         </div>